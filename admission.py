@@ -0,0 +1,235 @@
+import os
+import time
+import fcntl
+import random
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+import metrics
+
+# ---------------------- CONFIG ---------------------- #
+# Concurrency caps shared by every process on the box (gunicorn workers, the
+# report worker, batch runs). A slot is an flock on one of N small files, so a
+# process that dies gives its slots back. Callers that find every slot taken
+# wait in a bounded per-process queue for at most max_wait seconds, then get
+# Overloaded: the web routes answer 503 + Retry-After, and /submit defers an
+# upstream call it couldn't get a slot for (see DEFERRABLE in app.py).
+
+DATA_DIR = Path(os.getenv("DATA_DIR") or "data")
+ADMISSION_DIR = Path(os.getenv("ADMISSION_DIR") or DATA_DIR / "admission")
+ADMISSION_ENABLED = (os.getenv("ADMISSION_ENABLED") or "1") not in ("0", "false", "no")
+
+# Slots box-wide, waiters per process, longest wait for a slot. Every value
+# can be overridden with e.g. SUBMIT_MAX_CONCURRENCY=64.
+POOLS = {
+    # Incoming /submit requests
+    "submit": {
+        "concurrency": int(os.getenv("SUBMIT_MAX_CONCURRENCY", "32")),
+        "max_queue": int(os.getenv("SUBMIT_MAX_QUEUE", "64")),
+        "max_wait": float(os.getenv("SUBMIT_MAX_QUEUE_SECONDS", "2")),
+    },
+    # Live report streams in the web process (/reports/stream)
+    "report_stream": {
+        "concurrency": int(os.getenv("REPORT_STREAM_MAX_CONCURRENCY", "2")),
+        "max_queue": int(os.getenv("REPORT_STREAM_MAX_QUEUE", "4")),
+        "max_wait": float(os.getenv("REPORT_STREAM_MAX_QUEUE_SECONDS", "5")),
+    },
+    # Upstream calls in flight
+    "airtable": {
+        "concurrency": int(os.getenv("AIRTABLE_MAX_CONCURRENCY", "8")),
+        "max_queue": int(os.getenv("AIRTABLE_MAX_QUEUE", "200")),
+        "max_wait": float(os.getenv("AIRTABLE_MAX_QUEUE_SECONDS", "10")),
+    },
+    "ghl": {
+        "concurrency": int(os.getenv("GHL_MAX_CONCURRENCY", "16")),
+        "max_queue": int(os.getenv("GHL_MAX_QUEUE", "200")),
+        "max_wait": float(os.getenv("GHL_MAX_QUEUE_SECONDS", "10")),
+    },
+    # Reports are background work and can wait; REPORTS_OPENAI_CONCURRENCY
+    # still caps each process
+    "openai": {
+        "concurrency": int(os.getenv("OPENAI_MAX_CONCURRENCY", "6")),
+        "max_queue": int(os.getenv("OPENAI_MAX_QUEUE", "50")),
+        "max_wait": float(os.getenv("OPENAI_MAX_QUEUE_SECONDS", "120")),
+    },
+}
+
+# Shed callers are told to come back after about this long (jittered)
+ADMISSION_RETRY_AFTER_SECONDS = float(os.getenv("ADMISSION_RETRY_AFTER_SECONDS", "5"))
+# Waiters re-check for a free slot at most this far apart
+ADMISSION_POLL_MAX_SECONDS = float(os.getenv("ADMISSION_POLL_MAX_SECONDS", "0.05"))
+
+ADMISSION_IN_USE = metrics.gauge(
+    "admission_in_use",
+    "Slots held by this box's processes, per pool",
+    ("pool",),
+)
+ADMISSION_QUEUE_DEPTH = metrics.gauge(
+    "admission_queue_depth",
+    "Callers waiting for a slot, per pool",
+    ("pool",),
+)
+ADMISSION_SHED = metrics.counter(
+    "admission_shed_total",
+    "Callers turned away: wait queue full or no slot within the max wait",
+    ("pool", "reason"),
+)
+ADMISSION_WAIT = metrics.histogram(
+    "admission_wait_seconds",
+    "Time spent waiting for a slot by callers that got one",
+    ("pool",),
+)
+
+
+class Overloaded(Exception):
+    def __init__(self, pool: str, reason: str, retry_after: int):
+        super().__init__(f"{pool} is at capacity ({reason}); retry in {retry_after}s")
+        self.pool = pool
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+# ---------------------- SLOT POOL ---------------------- #
+
+class SlotPool:
+    def __init__(self, name: str, concurrency: int, max_queue: int, max_wait: float,
+                 directory: Path = ADMISSION_DIR):
+        self.name = name
+        self.concurrency = max(concurrency, 1)
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._fds: list[int] = []
+        self._pid = None
+        self._held: set[int] = set()
+        self.waiting = 0
+        self.counters = {"admitted": 0, "waited": 0, "shed_queue_full": 0, "shed_timeout": 0}
+
+    def _files(self) -> list[int]:
+        # Caller holds the lock. A forked child opens its own descriptors: the
+        # inherited ones share the parent's locks.
+        if self._pid != os.getpid():
+            self._fds = [
+                os.open(self.directory / f"{self.name}.{i}.slot", os.O_RDWR | os.O_CREAT, 0o644)
+                for i in range(self.concurrency)
+            ]
+            self._held = set()
+            self._pid = os.getpid()
+        return self._fds
+
+    def _try_acquire(self) -> int | None:
+        with self._lock:
+            fds = self._files()
+            start = random.randrange(len(fds))
+            for k in range(len(fds)):
+                i = (start + k) % len(fds)
+                # flock is per open file, so this process's own slots look free to it
+                if i in self._held:
+                    continue
+                try:
+                    fcntl.flock(fds[i], fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue
+                self._held.add(i)
+                return i
+        return None
+
+    def _shed(self, reason: str):
+        self.counters[f"shed_{reason}"] += 1
+        ADMISSION_SHED.inc(pool=self.name, reason=reason)
+        retry_after = max(1, round(ADMISSION_RETRY_AFTER_SECONDS * random.uniform(0.5, 1.5)))
+        raise Overloaded(self.name, reason, retry_after)
+
+    def acquire(self, max_wait: float | None = None) -> int:
+        # -> slot index for release(); max_wait (e.g. a request's remaining
+        # budget) can only shorten the pool's own limit
+        slot = self._try_acquire()
+        if slot is None:
+            slot = self._wait(self.max_wait if max_wait is None else min(max_wait, self.max_wait))
+        self.counters["admitted"] += 1
+        ADMISSION_IN_USE.inc(pool=self.name)
+        return slot
+
+    def _wait(self, max_wait: float) -> int:
+        with self._lock:
+            if self.waiting >= self.max_queue:
+                self._shed("queue_full")
+            self.waiting += 1
+        ADMISSION_QUEUE_DEPTH.inc(pool=self.name)
+        started = time.monotonic()
+        deadline = started + max(max_wait, 0)
+        delay = 0.005
+        try:
+            while True:
+                slot = self._try_acquire()
+                if slot is not None:
+                    self.counters["waited"] += 1
+                    ADMISSION_WAIT.observe(time.monotonic() - started, pool=self.name)
+                    return slot
+                now = time.monotonic()
+                if now >= deadline:
+                    self._shed("timeout")
+                time.sleep(min(delay, deadline - now))
+                delay = min(delay * 2, ADMISSION_POLL_MAX_SECONDS)
+        finally:
+            with self._lock:
+                self.waiting -= 1
+            ADMISSION_QUEUE_DEPTH.dec(pool=self.name)
+
+    def release(self, slot: int):
+        with self._lock:
+            if slot in self._held and self._pid == os.getpid():
+                fcntl.flock(self._fds[slot], fcntl.LOCK_UN)
+                self._held.discard(slot)
+        ADMISSION_IN_USE.dec(pool=self.name)
+
+    @contextmanager
+    def slot(self, max_wait: float | None = None):
+        slot = self.acquire(max_wait)
+        try:
+            yield
+        finally:
+            self.release(slot)
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "concurrency": self.concurrency,
+            "held_here": len(self._held),
+            "waiting_here": self.waiting,
+            "max_queue": self.max_queue,
+            "max_wait_seconds": self.max_wait,
+        }
+
+
+_pools: dict[str, SlotPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(name: str) -> SlotPool | None:
+    if not ADMISSION_ENABLED:
+        return None
+    with _pools_lock:
+        if name not in _pools:
+            _pools[name] = SlotPool(name, **POOLS[name])
+        return _pools[name]
+
+
+@contextmanager
+def admit(name: str, max_wait: float | None = None):
+    # Holds a slot in the named pool for the block; raises Overloaded
+    pool = get_pool(name)
+    if pool is None:
+        yield
+        return
+    with pool.slot(max_wait):
+        yield
+
+
+def stats() -> dict:
+    if not ADMISSION_ENABLED:
+        return {"enabled": False}
+    return {name: get_pool(name).stats() for name in POOLS}
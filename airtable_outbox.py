@@ -0,0 +1,331 @@
+import os
+import json
+import time
+import atexit
+import sqlite3
+import threading
+import urllib.parse
+from pathlib import Path
+
+import http_client
+import logs
+from circuit_breaker import CircuitOpen
+from jobs import retry_delay
+from survey_mirror import SURVEY_TABLE, get_mirror
+
+log = logs.get_logger("airtable_outbox")
+
+# ---------------------- CONFIG ---------------------- #
+# Write-behind queue for single-record Airtable PATCHes. Updates to the same
+# record are merged while they wait, and up to 10 records go out in one
+# batch PATCH (Airtable's limit). Pending writes live in SQLite under
+# DATA_DIR, so they survive a crash and any process can send them.
+
+DATA_DIR = Path(os.getenv("DATA_DIR") or "data")
+
+AIRTABLE_API_KEY = os.getenv("AIRTABLE_API_KEY")
+AIRTABLE_BASE_ID = os.getenv("AIRTABLE_BASE_ID")
+AIRTABLE_API_URL = os.getenv("AIRTABLE_API_URL") or "https://api.airtable.com/v0"
+
+AIRTABLE_OUTBOX_PATH = Path(os.getenv("AIRTABLE_OUTBOX_PATH") or DATA_DIR / "airtable_outbox.sqlite3")
+AIRTABLE_OUTBOX_ENABLED = (os.getenv("AIRTABLE_OUTBOX_ENABLED") or "1") not in ("0", "false", "no")
+# Longest a write waits for others to share its request. Every batch is a token
+# the next /submit upsert can't use; readers see queued fields through the
+# mirror straight away, so a few seconds' delay costs nothing.
+AIRTABLE_OUTBOX_FLUSH_SECONDS = float(os.getenv("AIRTABLE_OUTBOX_FLUSH_SECONDS", "5"))
+AIRTABLE_OUTBOX_BATCH_SIZE = min(int(os.getenv("AIRTABLE_OUTBOX_BATCH_SIZE", "10")), 10)
+AIRTABLE_OUTBOX_MAX_ATTEMPTS = int(os.getenv("AIRTABLE_OUTBOX_MAX_ATTEMPTS", "8"))
+# A batch claimed by a process that died is retried after this long
+AIRTABLE_OUTBOX_LEASE_SECONDS = float(os.getenv("AIRTABLE_OUTBOX_LEASE_SECONDS", "60"))
+# Time allowed for sending what's left when a process exits
+AIRTABLE_OUTBOX_EXIT_SECONDS = float(os.getenv("AIRTABLE_OUTBOX_EXIT_SECONDS", "10"))
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pending (
+    table_name    TEXT NOT NULL,
+    record_id     TEXT NOT NULL,
+    fields        TEXT NOT NULL,
+    version       INTEGER NOT NULL,
+    queued_at     REAL NOT NULL,
+    attempts      INTEGER NOT NULL DEFAULT 0,
+    not_before    REAL NOT NULL DEFAULT 0,
+    claimed_until REAL NOT NULL DEFAULT 0,
+    last_error    TEXT,
+    PRIMARY KEY (table_name, record_id)
+);
+CREATE INDEX IF NOT EXISTS pending_queued ON pending (queued_at);
+"""
+
+
+def _airtable_headers():
+    return {
+        "Authorization": f"Bearer {AIRTABLE_API_KEY}",
+        "Content-Type": "application/json",
+    }
+
+
+def _send_batch(table: str, records: list[dict]):
+    url = f"{AIRTABLE_API_URL}/{AIRTABLE_BASE_ID}/{urllib.parse.quote(table)}"
+    return http_client.airtable.patch(url, headers=_airtable_headers(), json={"records": records},
+                                      idempotent=True, op="batch_patch")
+
+
+# ---------------------- OUTBOX ---------------------- #
+
+class AirtableOutbox:
+    # send(table, records) -> response of a batch PATCH; on_sent(table, body)
+    # is called with each successful response (mirror write-through).
+
+    def __init__(self, path: Path | str = AIRTABLE_OUTBOX_PATH, send=_send_batch, on_sent=None,
+                 flush_seconds: float = AIRTABLE_OUTBOX_FLUSH_SECONDS,
+                 batch_size: int = AIRTABLE_OUTBOX_BATCH_SIZE):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.send = send
+        self.on_sent = on_sent
+        self.flush_seconds = flush_seconds
+        self.batch_size = batch_size
+        self._local = threading.local()
+        self._wake = threading.Event()
+        self._thread = None
+        self._thread_pid = None
+        self._start_lock = threading.Lock()
+        self.counters = {"queued": 0, "merged": 0, "batches": 0, "records_sent": 0,
+                         "retries": 0, "dropped": 0}
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    # ---- producers ---- #
+
+    def queue(self, table: str, record_id: str, fields: dict):
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT fields FROM pending WHERE table_name = ? AND record_id = ?", (table, record_id)
+            ).fetchone()
+            if row:
+                # Later values win; fields already in flight are simply sent again
+                conn.execute(
+                    "UPDATE pending SET fields = ?, version = version + 1"
+                    " WHERE table_name = ? AND record_id = ?",
+                    (json.dumps({**json.loads(row[0]), **fields}), table, record_id),
+                )
+            else:
+                conn.execute(
+                    "INSERT INTO pending (table_name, record_id, fields, version, queued_at)"
+                    " VALUES (?, ?, ?, 1, ?)",
+                    (table, record_id, json.dumps(fields), now),
+                )
+            ready = conn.execute(
+                "SELECT COUNT(*) FROM pending WHERE claimed_until < ? AND not_before <= ?", (now, now)
+            ).fetchone()[0]
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        self.counters["merged" if row else "queued"] += 1
+        self.start()
+        if ready >= self.batch_size:
+            self._wake.set()
+
+    # ---- sending ---- #
+
+    def _claim(self) -> tuple[str | None, list]:
+        # Oldest ready write picks the table; up to batch_size of its records ride along
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            first = conn.execute(
+                "SELECT table_name FROM pending WHERE claimed_until < ? AND not_before <= ?"
+                " ORDER BY queued_at LIMIT 1",
+                (now, now),
+            ).fetchone()
+            if first is None:
+                conn.execute("COMMIT")
+                return None, []
+            rows = conn.execute(
+                "SELECT record_id, fields, version, attempts FROM pending"
+                " WHERE table_name = ? AND claimed_until < ? AND not_before <= ?"
+                " ORDER BY queued_at LIMIT ?",
+                (first[0], now, now, self.batch_size),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE pending SET claimed_until = ? WHERE table_name = ? AND record_id = ?",
+                [(now + AIRTABLE_OUTBOX_LEASE_SECONDS, first[0], r[0]) for r in rows],
+            )
+            conn.execute("COMMIT")
+            return first[0], rows
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _done(self, table: str, rows: list):
+        # A record updated while in flight keeps its (merged) row and goes out again
+        self._conn().executemany(
+            "DELETE FROM pending WHERE table_name = ? AND record_id = ? AND version = ?",
+            [(table, record_id, version) for record_id, _, version, _ in rows],
+        )
+        self._conn().executemany(
+            "UPDATE pending SET claimed_until = 0 WHERE table_name = ? AND record_id = ?",
+            [(table, record_id) for record_id, _, _, _ in rows],
+        )
+
+    def _failed(self, table: str, rows: list, error: str, permanent: bool = False):
+        now = time.time()
+        conn = self._conn()
+        for record_id, fields, version, attempts in rows:
+            if permanent or attempts + 1 >= AIRTABLE_OUTBOX_MAX_ATTEMPTS:
+                # Like _done: fields merged in while this batch was in flight haven't
+                # been tried yet, so that row stays and goes out again
+                dropped = conn.execute(
+                    "DELETE FROM pending WHERE table_name = ? AND record_id = ? AND version = ?",
+                    (table, record_id, version),
+                ).rowcount
+                if not dropped:
+                    conn.execute(
+                        "UPDATE pending SET claimed_until = 0 WHERE table_name = ? AND record_id = ?",
+                        (table, record_id),
+                    )
+                    continue
+                log.error("Dropping Airtable write", extra={
+                    "table": table, "record_id": record_id, "attempts": attempts + 1,
+                    "error": error, "fields": json.loads(fields),
+                })
+                self.counters["dropped"] += 1
+            else:
+                conn.execute(
+                    "UPDATE pending SET attempts = attempts + 1, not_before = ?, claimed_until = 0,"
+                    " last_error = ? WHERE table_name = ? AND record_id = ?",
+                    (now + retry_delay(attempts + 1), error[:500], table, record_id),
+                )
+                self.counters["retries"] += 1
+
+    def _send(self, table: str, rows: list):
+        records = [{"id": record_id, "fields": json.loads(fields)} for record_id, fields, _, _ in rows]
+        try:
+            r = self.send(table, records)
+        except CircuitOpen as e:
+            # Airtable is known to be down; wait for the breaker without using up attempts
+            self._conn().executemany(
+                "UPDATE pending SET not_before = ?, claimed_until = 0 WHERE table_name = ? AND record_id = ?",
+                [(time.time() + max(e.retry_in, 1), table, record_id) for record_id, _, _, _ in rows],
+            )
+            return
+        except Exception as e:
+            self._failed(table, rows, str(e))
+            return
+        self.counters["batches"] += 1
+
+        if r.ok:
+            self._done(table, rows)
+            self.counters["records_sent"] += len(rows)
+            if self.on_sent:
+                try:
+                    self.on_sent(table, r.json())
+                except Exception as e:
+                    log.warning("Airtable outbox on_sent failed", extra={"error": str(e)})
+            return
+
+        error = f"{r.status_code}: {r.text[:300]}"
+        rejected = 400 <= r.status_code < 500 and r.status_code != 429
+        if rejected and len(rows) > 1:
+            # One bad record (deleted row, invalid field) rejects the whole
+            # batch; send them one by one so the rest still land
+            for row in rows:
+                self._send(table, [row])
+            return
+        log.error("Airtable batch PATCH failed", extra={"table": table, "records": len(rows), "error": error})
+        # A rejected single record won't succeed on retry
+        self._failed(table, rows, error, permanent=rejected)
+
+    def flush(self, timeout: float | None = None) -> int:
+        # Send every ready write now; -> records attempted
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        attempted = 0
+        while deadline is None or time.monotonic() < deadline:
+            table, rows = self._claim()
+            if not rows:
+                break
+            self._send(table, rows)
+            attempted += len(rows)
+        return attempted
+
+    # ---- background flusher ---- #
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is not None and self._thread_pid == os.getpid():
+                return
+            self._thread_pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="airtable-outbox", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                log.error("Airtable outbox flush failed", extra={"error": str(e)})
+
+    def stats(self) -> dict:
+        pending, oldest, failing = self._conn().execute(
+            "SELECT COUNT(*), MIN(queued_at), COUNT(last_error) FROM pending"
+        ).fetchone()
+        writes = self.counters["queued"] + self.counters["merged"]
+        batches = self.counters["batches"]
+        return {
+            **self.counters,
+            # How many single-record PATCHes each request replaced (this process)
+            "writes_per_request": round(writes / batches, 2) if batches else None,
+            "pending": pending,
+            "pending_with_errors": failing,
+            "oldest_pending_seconds": round(time.time() - oldest, 1) if oldest else None,
+        }
+
+
+_outbox = None
+_outbox_lock = threading.Lock()
+
+
+def _mirror_write_through(table: str, body: dict):
+    mirror = get_mirror()
+    if mirror and table == SURVEY_TABLE:
+        mirror.write_through(body)
+
+
+def get_outbox() -> AirtableOutbox | None:
+    global _outbox
+    if not AIRTABLE_OUTBOX_ENABLED:
+        return None
+    if _outbox is None:
+        with _outbox_lock:
+            if _outbox is None:
+                _outbox = AirtableOutbox(on_sent=_mirror_write_through)
+                atexit.register(flush_on_exit)
+    return _outbox
+
+
+def flush_on_exit(timeout: float = AIRTABLE_OUTBOX_EXIT_SECONDS):
+    # atexit, gunicorn's worker_exit and report_worker shutdown all land here
+    if _outbox is None:
+        return
+    try:
+        sent = _outbox.flush(timeout)
+        if sent:
+            log.info("Flushed pending Airtable writes on exit", extra={"records": sent})
+    except Exception as e:
+        log.error("Airtable outbox exit flush failed", extra={"error": str(e)})
@@ -1,16 +1,45 @@
-from flask import Flask, request, jsonify, render_template
-import requests
+from flask import (
+    Flask, Response, g, request, jsonify, render_template, send_from_directory, stream_with_context,
+)
 import os
+import json
+import time
 import datetime
+import uuid
+import threading
 import urllib.parse
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 from flask_cors import CORS
 
+import admission
+import http_client
+import logs
+import metrics
+from admission import Overloaded
+from airtable_outbox import get_outbox
+from circuit_breaker import CircuitOpen
+from contact_cache import MISSING, assigned_user, get_contact_cache
+from idempotency import IdempotencyStore, derive_key
+from jobs import JobQueue, WorkerPool
+from rate_limit import RateLimitTimeout
+from operator_directory import OperatorDirectory
+from report_jobs import (
+    REPORT_JOB_KIND, REPORT_PRIORITIES, REPORT_PRIORITY_FRESH, REPORTS_AUTO_ENQUEUE, enqueue_report,
+    get_report_queue, report_queue_stats,
+)
+from report_retention import REPORTS_DIR, start_retention_thread
+from survey_mirror import get_mirror
+
 app = Flask(__name__)
 CORS(app, resources={r"/*": {"origins": "*"}})
 
+log = logs.get_logger("app")
+
 # ---------------------- CONFIG ---------------------- #
 AIRTABLE_API_KEY = os.getenv("AIRTABLE_API_KEY")
 AIRTABLE_BASE_ID = os.getenv("AIRTABLE_BASE_ID")
+AIRTABLE_API_URL = os.getenv("AIRTABLE_API_URL") or "https://api.airtable.com/v0"
 
 # ✔️ One-table architecture — all survey data lives in Survey Responses
 HQ_TABLE = os.getenv("AIRTABLE_PROSPECTS_TABLE") or "Survey Responses"
@@ -18,7 +47,7 @@ USERS_TABLE = os.getenv("AIRTABLE_USERS_TABLE") or "Users"
 
 GHL_API_KEY = os.getenv("GHL_API_KEY")
 GHL_LOCATION_ID = os.getenv("GHL_LOCATION_ID")
-GHL_BASE_URL = "https://rest.gohighlevel.com/v1"
+GHL_BASE_URL = os.getenv("GHL_BASE_URL") or "https://rest.gohighlevel.com/v1"
 
 LEGACY_SURVEY_REDIRECT_URL = (
     os.getenv("LEGACY_SURVEY_REDIRECT_URL")
@@ -29,6 +58,32 @@ LEGACY_SURVEY_REDIRECT_URL = (
 # Legacy Survey = 24 questions (Q7–Q30)
 LEGACY_SURVEY_QUESTION_COUNT = int(os.getenv("LEGACY_SURVEY_QUESTION_COUNT", "24"))
 
+# "sync" = do all upstream writes inside the request (original behaviour)
+# "async" = persist to the local job queue and let background workers sync it
+SUBMIT_MODE = (os.getenv("SUBMIT_MODE") or "sync").lower()
+SUBMIT_WORKERS = int(os.getenv("SUBMIT_WORKERS", "4"))
+# Threads running the Airtable and GHL branches of each submission side by side.
+# Under the gevent worker these are greenlets, so size for every open connection.
+SUBMIT_FANOUT_WORKERS = int(
+    os.getenv("SUBMIT_FANOUT_WORKERS")
+    or (2 * int(os.getenv("WEB_WORKER_CONNECTIONS", "500")) if http_client.cooperative_io() else 8)
+)
+
+# Time /submit may spend on Airtable and GHL. Whatever hasn't finished by then
+# (or is skipped because a circuit breaker is open) moves to the submit queue.
+SUBMIT_BUDGET_SECONDS = float(os.getenv("SUBMIT_BUDGET_SECONDS", "8"))
+# Deferred work waits out upstream outages, so it gets more attempts than usual
+SUBMIT_DEFER_MAX_ATTEMPTS = int(os.getenv("SUBMIT_DEFER_MAX_ATTEMPTS", "12"))
+
+# /reports/enqueue answers 503 once this many report jobs are waiting
+REPORTS_MAX_QUEUED = int(os.getenv("REPORTS_MAX_QUEUED", "1000"))
+
+# Generated PDFs are served from REPORTS_DIR (see report_retention.py)
+REPORTS_CACHE_MAX_AGE = int(os.getenv("REPORTS_CACHE_MAX_AGE", str(365 * 24 * 3600)))
+
+# Shared secret for operational endpoints (cache invalidation etc.); unset = disabled
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
 # ---------------------- AIRTABLE HELPERS ---------------------- #
 def _h():
     return {
@@ -37,296 +92,852 @@ def _h():
     }
 
 def _url(table, rec_id=None, params=None):
-    base = f"https://api.airtable.com/v0/{AIRTABLE_BASE_ID}/{urllib.parse.quote(table)}"
+    base = f"{AIRTABLE_API_URL}/{AIRTABLE_BASE_ID}/{urllib.parse.quote(table)}"
     if rec_id:
         return f"{base}/{rec_id}"
     if params:
         return f"{base}?{urllib.parse.urlencode(params)}"
     return base
 
+def _mirror_write_through(response_json: dict):
+    # Keep the local Survey Responses copy current with our own writes
+    mirror = get_mirror()
+    if mirror:
+        mirror.write_through(response_json)
+
+def _patch_prospect(rec_id: str, fields: dict, op: str, deadline: float | None = None):
+    # Small follow-up writes go through the outbox: merged per record and sent
+    # ten records per request (airtable_outbox.py)
+    outbox = get_outbox()
+    if outbox:
+        outbox.queue(HQ_TABLE, rec_id, fields)
+        mirror = get_mirror()
+        if mirror:
+            mirror.apply_fields(rec_id, fields)
+        return
+
+    r = http_client.airtable.patch(
+        _url(HQ_TABLE, rec_id),
+        headers=_h(),
+        json={"fields": fields},
+        idempotent=True,
+        op=op,
+        deadline=deadline,
+    )
+    r.raise_for_status()
+    _mirror_write_through(r.json())
+
 # ---------------------- OPERATOR LOOKUP ---------------------- #
+def _fetch_users_page(params):
+    r = http_client.airtable.get(_url(USERS_TABLE, params=params), headers=_h(), op="operator_lookup")
+    r.raise_for_status()
+    return r.json()
+
+
+operators = OperatorDirectory(_fetch_users_page)
+
+
 def get_operator_info(ghl_user_id: str):
     try:
-        formula = f"{{GHL User ID}} = '{ghl_user_id}'"
-        search_url = _url(
-            USERS_TABLE, params={"filterByFormula": formula, "maxRecords": 1}
-        )
-        r = requests.get(search_url, headers=_h())
-        r.raise_for_status()
-        data = r.json()
-
-        if data.get("records"):
-            fields = data["records"][0].get("fields", {})
-            return fields.get("Legacy Code"), fields.get("Email")
+        return operators.get(ghl_user_id)
     except Exception as e:
-        print(f"Error looking up operator info: {e}")
+        log.warning("Operator lookup failed", extra={"ghl_user_id": ghl_user_id, "error": str(e)})
 
     return None, None
 
 
+def operator_fields(ghl_user_id: str) -> dict:
+    update_fields = {"GHL User ID": ghl_user_id}
+
+    op_legacy_code, op_email = get_operator_info(ghl_user_id)
+
+    if op_legacy_code:
+        update_fields["Assigned Op Legacy Code"] = op_legacy_code
+    if op_email:
+        update_fields["Assigned Op Email"] = op_email
+    return update_fields
+
+
 def update_prospect_with_operator_info(prospect_id: str, ghl_user_id: str):
     try:
-        update_fields = {"GHL User ID": ghl_user_id}
+        _patch_prospect(prospect_id, operator_fields(ghl_user_id), "operator_backfill")
+    except Exception as e:
+        log.warning("Operator backfill failed", extra={"prospect_id": prospect_id, "error": str(e)})
+
+
+# ---------------------- LEGACY SURVEY FIELDS ---------------------- #
+LEGACY_SURVEY_FIELDS = [
+    "Q7 Where do you show up online right now?",
+    "Q8 Social Presence Snapshot",
+    "Q9 Content Confidence",
+    "Q10 90-Day Definition of This WORKED",
+    "Q11 Desired Outcome",
+    "Q12 Why That Outcome Matters",
+    "Q13 Weekly Schedule Reality",
+    "Q14 Highest Energy Windows",
+    "Q15 Commitments We Must Build Around",
+    "Q16 What Helps You Stay Consistent?",
+    "Q17 What Usually Pulls You Off Track?",
+    "Q18 Stress/Discouragement Response",
+    "Q19 Strengths You Bring",
+    "Q20 Skill You Want the MOST Help With",
+    "Q21 System-Following Confidence",
+    "Q22 What Would $300–$800/month Support Right Now?",
+    "Q23 Biggest Fear or Hesitation",
+    "Q24 If Nothing Changes in 6 Months, What Worries You Most?",
+    "Q25 Who You Want to Become in 12 Months",
+    "Q26 One Feeling You NEVER Want Again",
+    "Q27 One Feeling You WANT as Your Baseline",
+    "Q28 Preferred Accountability Style",
+    "Q29 Preferred Tracking Style",
+    "Q30 Why is NOW the right time to build something?"
+]
+
+
+def legacysurvey_fields(answers: list) -> dict:
+    fields = {"Date Submitted": datetime.datetime.utcnow().isoformat()}
 
-        op_legacy_code, op_email = get_operator_info(ghl_user_id)
+    for idx, value in enumerate(answers):
+        fields[LEGACY_SURVEY_FIELDS[idx]] = value
 
-        if op_legacy_code:
-            update_fields["Assigned Op Legacy Code"] = op_legacy_code
-        if op_email:
-            update_fields["Assigned Op Email"] = op_email
+    return fields
 
-        requests.patch(
-            _url(HQ_TABLE, prospect_id),
-            headers=_h(),
-            json={"fields": update_fields},
-        )
-    except Exception as e:
-        print(f"Error updating prospect with operator info: {e}")
 
+def legacy_code_from_autonum(auto) -> str:
+    return f"Legacy-X25-OP{1000 + int(auto)}"
 
-# ---------------------- PROSPECT HANDLING (FIND BY EMAIL, NO NEW ROW) ---------------------- #
-def get_or_create_prospect(email: str):
-    formula = f"{{Prospect Email}} = '{email}'"
-    search_url = _url(HQ_TABLE, params={"filterByFormula": formula, "maxRecords": 1})
-    r = requests.get(search_url, headers=_h())
-    r.raise_for_status()
-    data = r.json()
-
-    # ✔️ Record exists — use this row
-    if data.get("records"):
-        rec = data["records"][0]
-        rec_id = rec["id"]
-        fields = rec.get("fields", {})
-        legacy_code = fields.get("Legacy Code")
-
-        # Missing LC? Generate one.
-        if not legacy_code:
-            auto = fields.get("AutoNum")
-            if auto is None:
-                auto_data = requests.get(_url(HQ_TABLE, rec_id), headers=_h()).json()
-                auto = auto_data.get("fields", {}).get("AutoNum")
-
-            legacy_code = f"Legacy-X25-OP{1000 + int(auto)}"
-            requests.patch(
-                _url(HQ_TABLE, rec_id),
-                headers=_h(),
-                json={"fields": {"Legacy Code": legacy_code}},
-            )
 
-        return legacy_code, rec_id
+# ---------------------- PROSPECT UPSERT (MERGE ON EMAIL, NO NEW ROW IF IT EXISTS) ---------------------- #
+def _formula_str(value: str) -> str:
+    return "'" + str(value).replace("\\", "\\\\").replace("'", "\\'") + "'"
+
 
-    # ❗ Record does NOT exist, create it (only if truly missing)
-    payload = {"fields": {"Prospect Email": email}}
-    r = requests.post(_url(HQ_TABLE), headers=_h(), json=payload)
+def _patch_first_prospect(email: str, fields: dict, deadline: float | None = None) -> dict | None:
+    # performUpsert refuses (422) when several rows share the email; write to
+    # the oldest of them instead, which is the one that got the Legacy Code
+    params = {
+        "filterByFormula": f"{{Prospect Email}} = {_formula_str(email)}",
+        "sort[0][field]": "AutoNum",
+        "maxRecords": 1,
+    }
+    r = http_client.airtable.get(_url(HQ_TABLE, params=params), headers=_h(), op="prospect_find",
+                                 deadline=deadline)
     r.raise_for_status()
-    rec = r.json()
+    records = r.json().get("records") or []
+    if not records:
+        return None
+
+    r = http_client.airtable.patch(_url(HQ_TABLE, records[0]["id"]), headers=_h(), json={"fields": fields},
+                                   idempotent=True, op="prospect_patch", deadline=deadline)
+    r.raise_for_status()
+    return r.json()
+
+
+def get_or_create_prospect(email: str, fields: dict | None = None, deadline: float | None = None):
+    # One PATCH both finds-or-creates the row and writes the survey answers
+    payload = {
+        "performUpsert": {"fieldsToMergeOn": ["Prospect Email"]},
+        "records": [{"fields": {"Prospect Email": email, **(fields or {})}}],
+    }
+    r = http_client.airtable.patch(_url(HQ_TABLE), headers=_h(), json=payload, idempotent=True,
+                                   op="prospect_upsert", deadline=deadline)
+    rec = None
+    if r.status_code == 422:
+        log.warning("Prospect upsert rejected, patching first match", extra={"email": email, "body": r.text[:300]})
+        rec = _patch_first_prospect(email, fields or {}, deadline)
+    if rec is None:
+        r.raise_for_status()
+        rec = r.json()["records"][0]
+    _mirror_write_through(rec)
     rec_id = rec["id"]
+    rec_fields = rec.get("fields", {})
 
-    # Assign legacy code
-    auto = rec.get("fields", {}).get("AutoNum")
+    # ✔️ Existing row with a code — nothing else to do
+    legacy_code = rec_fields.get("Legacy Code")
+    if legacy_code:
+        return legacy_code, rec_id
+
+    # ❗ New row (or an old one that never got a code) — assign one
+    auto = rec_fields.get("AutoNum")
     if auto is None:
-        auto_data = requests.get(_url(HQ_TABLE, rec_id), headers=_h()).json()
+        auto_data = http_client.airtable.get(_url(HQ_TABLE, rec_id), headers=_h(), op="autonum_read",
+                                             deadline=deadline).json()
         auto = auto_data.get("fields", {}).get("AutoNum")
 
-    legacy_code = f"Legacy-X25-OP{1000 + int(auto)}"
-    requests.patch(
-        _url(HQ_TABLE, rec_id),
-        headers=_h(),
-        json={"fields": {"Legacy Code": legacy_code}},
-    )
+    legacy_code = legacy_code_from_autonum(auto)
+    _patch_prospect(rec_id, {"Legacy Code": legacy_code}, "legacy_code_patch", deadline)
 
     return legacy_code, rec_id
 
 
-# ---------------------- SAVE LEGACY SURVEY — ORIGINAL AIRTABLE LOGIC ---------------------- #
-def save_legacysurvey_to_airtable(legacy_code: str, prospect_id: str, answers: list):
-    legacy_fields = [
-        "Q7 Where do you show up online right now?",
-        "Q8 Social Presence Snapshot",
-        "Q9 Content Confidence",
-        "Q10 90-Day Definition of This WORKED",
-        "Q11 Desired Outcome",
-        "Q12 Why That Outcome Matters",
-        "Q13 Weekly Schedule Reality",
-        "Q14 Highest Energy Windows",
-        "Q15 Commitments We Must Build Around",
-        "Q16 What Helps You Stay Consistent?",
-        "Q17 What Usually Pulls You Off Track?",
-        "Q18 Stress/Discouragement Response",
-        "Q19 Strengths You Bring",
-        "Q20 Skill You Want the MOST Help With",
-        "Q21 System-Following Confidence",
-        "Q22 What Would $300–$800/month Support Right Now?",
-        "Q23 Biggest Fear or Hesitation",
-        "Q24 If Nothing Changes in 6 Months, What Worries You Most?",
-        "Q25 Who You Want to Become in 12 Months",
-        "Q26 One Feeling You NEVER Want Again",
-        "Q27 One Feeling You WANT as Your Baseline",
-        "Q28 Preferred Accountability Style",
-        "Q29 Preferred Tracking Style",
-        "Q30 Why is NOW the right time to build something?"
-    ]
-
-    fields = {
-        "Legacy Code": legacy_code,
-        "Date Submitted": datetime.datetime.utcnow().isoformat(),
+# ---------------------- GHL SYNC — LEGACY SURVEY ---------------------- #
+def _ghl_headers():
+    return {
+        "Authorization": f"Bearer {GHL_API_KEY}",
+        "Content-Type": "application/json",
     }
 
-    for idx, value in enumerate(answers):
-        fields[legacy_fields[idx]] = value
 
-    r = requests.patch(
-        _url(HQ_TABLE, prospect_id),
-        headers=_h(),
-        json={"fields": fields},
+def legacysurvey_custom_fields(answers: list) -> dict:
+    # Same keys you had when it worked
+    return {
+        "07_where_do_you_show_up_online_right_now": str(answers[0]),
+        "q8_social_presence_snapshot": str(answers[1]),
+        "q9_content_confidence_110": str(answers[2]),
+        "q10_90day_definition_of_this_worked": str(answers[3]),
+        "q11_desired_outcome": str(answers[4]),
+        "q12_why_that_outcome_matters": str(answers[5]),
+        "q13_weekly_schedule_reality": str(answers[6]),
+        "q14_highest_energy_windows": str(answers[7]),
+        "q15_commitments_we_must_build_around": str(answers[8]),
+        "q16_what_helps_you_stay_consistent": str(answers[9]),
+        "q17_what_usually_pulls_you_off_track": str(answers[10]),
+        "q18_stressdiscouragement_response": str(answers[11]),
+        "q19_strengths_you_bring": str(answers[12]),
+        "q20_skill_you_want_the_most_help_with": str(answers[13]),
+        "q21__systemfollowing_confidence_110": str(answers[14]),
+        "q22_what_would_300800month_support_right_now": str(answers[15]),
+        "q23__biggest_fear_or_hesitation": str(answers[16]),
+        "q24__if_nothing_changes_in_6_months_what_worries_you_most": str(answers[17]),
+        "q25_who_you_want_to_become_in_12_months": str(answers[18]),
+        "q26__one_feeling_you_never_want_again": str(answers[19]),
+        "q27__one_feeling_you_want_as_your_baseline": str(answers[20]),
+        "q28_preferred_accountability_style": str(answers[21]),
+        "q29_preferred_tracking_style": str(answers[22]),
+        "q30_why_is_now_the_right_time_to_build_something": str(answers[23]),
+    }
+
+
+# Answers that retrying won't change: unknown contact or a payload GHL rejects
+GHL_DEFINITIVE_STATUSES = {400, 404, 422}
+
+
+class GHLError(Exception):
+    # GHL failed in a way a later retry may fix (5xx, auth, garbled body)
+    pass
+
+
+def lookup_ghl_contact(email: str, use_cache: bool = True, deadline: float | None = None):
+    cache = get_contact_cache()
+    if cache and use_cache:
+        cached = cache.get(email)
+        if cached is not MISSING:
+            return cached
+
+    r = http_client.ghl.get(
+        f"{GHL_BASE_URL}/contacts/lookup",
+        headers=_ghl_headers(),
+        params={"email": email, "locationId": GHL_LOCATION_ID},
+        op="contact_lookup",
+        deadline=deadline,
+    )
+    if r.status_code != 200 and r.status_code not in GHL_DEFINITIVE_STATUSES:
+        raise GHLError(f"contact lookup returned {r.status_code}")
+    try:
+        lookup = r.json()
+    except ValueError:
+        raise GHLError(f"contact lookup returned non-JSON body ({r.status_code})")
+
+    contact = None
+    if "contacts" in lookup and lookup["contacts"]:
+        contact = lookup["contacts"][0]
+    elif "contact" in lookup:
+        contact = lookup["contact"]
+
+    if not contact:
+        log.info("No GHL contact for email", extra={"email": email, "status": r.status_code})
+        # GHL answers 422 for an unknown email
+        if cache and r.status_code in (200, 404, 422):
+            cache.put(email, None)
+        return None, None
+
+    ghl_id = contact.get("id")
+    assigned = assigned_user(contact)
+    if cache and ghl_id:
+        cache.put(email, ghl_id, assigned)
+
+    log.info("GHL contact found", extra={"contact_id": ghl_id})
+    return ghl_id, assigned
+
+
+def update_ghl_contact(ghl_id: str, answers: list, deadline: float | None = None):
+    # Tag + all 24 custom fields in a single contact update
+    field_response = http_client.ghl.put(
+        f"{GHL_BASE_URL}/contacts/{ghl_id}",
+        headers=_ghl_headers(),
+        json={
+            "tags": ["legacy survey submitted"],
+            "customField": legacysurvey_custom_fields(answers),
+        },
+        op="contact_update",
+        deadline=deadline,
     )
-    r.raise_for_status()
-    return prospect_id
 
+    if field_response.status_code == 200:
+        log.info("GHL contact updated", extra={"contact_id": ghl_id})
+    else:
+        # GHL echoes the whole payload back on errors; the start says what went wrong
+        log.warning("GHL contact update failed", extra={
+            "contact_id": ghl_id,
+            "status": field_response.status_code,
+            "body": field_response.text[:300],
+        })
 
-# ---------------------- GHL SYNC — LEGACY SURVEY ---------------------- #
-def push_legacysurvey_to_ghl(email: str, answers: list, legacy_code: str, prospect_id: str):
+    return field_response
+
+
+def push_legacysurvey_to_ghl(email: str, answers: list, timings: dict | None = None,
+                             deadline: float | None = None):
+    timings = {} if timings is None else timings
     try:
-        headers = {
-            "Authorization": f"Bearer {GHL_API_KEY}",
-            "Content-Type": "application/json",
-        }
-
-        # Look up the contact
-        lookup = requests.get(
-            f"{GHL_BASE_URL}/contacts/lookup",
-            headers=headers,
-            params={"email": email, "locationId": GHL_LOCATION_ID},
-        ).json()
-
-        contact = None
-        if "contacts" in lookup and lookup["contacts"]:
-            contact = lookup["contacts"][0]
-        elif "contact" in lookup:
-            contact = lookup["contact"]
-
-        if not contact:
-            print(f"No GHL contact found for email: {email}")
+        with _timed(timings, "ghl_lookup"):
+            ghl_id, assigned = lookup_ghl_contact(email, deadline=deadline)
+        if not ghl_id:
             return None
 
-        ghl_id = contact.get("id")
-        assigned = (
-            contact.get("assignedUserId")
-            or contact.get("userId")
-            or contact.get("assignedTo")
-        )
+        with _timed(timings, "ghl_update"):
+            response = update_ghl_contact(ghl_id, answers, deadline)
 
-        print(f"Found contact ID: {ghl_id} for email: {email}")
+        if response.status_code == 404:
+            # Cached id for a contact that was merged or deleted; resolve it again
+            cache = get_contact_cache()
+            if cache:
+                cache.invalidate(email=email)
+            with _timed(timings, "ghl_lookup_retry"):
+                ghl_id, assigned = lookup_ghl_contact(email, use_cache=False, deadline=deadline)
+            if not ghl_id:
+                return None
+            with _timed(timings, "ghl_update_retry"):
+                response = update_ghl_contact(ghl_id, answers, deadline)
 
-        # Tag for Legacy Survey completion
-        tag_response = requests.put(
-            f"{GHL_BASE_URL}/contacts/{ghl_id}",
-            headers=headers,
-            json={"tags": ["legacy survey submitted"]},
-        )
-        print(f"Tag Update Status: {tag_response.status_code}")
-
-        # BATCH UPDATE — using same keys you had when it worked
-        all_custom_fields = {
-            "07_where_do_you_show_up_online_right_now": str(answers[0]),
-            "q8_social_presence_snapshot": str(answers[1]),
-            "q9_content_confidence_110": str(answers[2]),
-            "q10_90day_definition_of_this_worked": str(answers[3]),
-            "q11_desired_outcome": str(answers[4]),
-            "q12_why_that_outcome_matters": str(answers[5]),
-            "q13_weekly_schedule_reality": str(answers[6]),
-            "q14_highest_energy_windows": str(answers[7]),
-            "q15_commitments_we_must_build_around": str(answers[8]),
-            "q16_what_helps_you_stay_consistent": str(answers[9]),
-            "q17_what_usually_pulls_you_off_track": str(answers[10]),
-            "q18_stressdiscouragement_response": str(answers[11]),
-            "q19_strengths_you_bring": str(answers[12]),
-            "q20_skill_you_want_the_most_help_with": str(answers[13]),
-            "q21__systemfollowing_confidence_110": str(answers[14]),
-            "q22_what_would_300800month_support_right_now": str(answers[15]),
-            "q23__biggest_fear_or_hesitation": str(answers[16]),
-            "q24__if_nothing_changes_in_6_months_what_worries_you_most": str(answers[17]),
-            "q25_who_you_want_to_become_in_12_months": str(answers[18]),
-            "q26__one_feeling_you_never_want_again": str(answers[19]),
-            "q27__one_feeling_you_want_as_your_baseline": str(answers[20]),
-            "q28_preferred_accountability_style": str(answers[21]),
-            "q29_preferred_tracking_style": str(answers[22]),
-            "q30_why_is_now_the_right_time_to_build_something": str(answers[23]),
-        }
-
-        field_response = requests.put(
-            f"{GHL_BASE_URL}/contacts/{ghl_id}",
-            headers=headers,
-            json={"customField": all_custom_fields}
-        )
+        if response.status_code != 200 and response.status_code not in GHL_DEFINITIVE_STATUSES:
+            raise GHLError(f"contact update returned {response.status_code}")
 
-        if field_response.status_code == 200:
-            print("✓ Successfully updated all 24 Legacy Survey fields in GHL")
-        else:
-            print(f"Failed to update fields: {field_response.status_code}")
-            print(f"Response: {field_response.text}")
+        return assigned
 
-        if field_response.status_code == 400:
-            print("Batch update failed. Error details:", field_response.json())
+    except DEFERRABLE:
+        # The caller moves the sync to the submit queue
+        raise
+    except Exception as e:
+        log.error("GHL sync failed", extra={"error": str(e)})
+        if deadline is None or _defer_reason(e):
+            # From the submit queue this fails the job so it is retried; inline,
+            # a 5xx or connection error moves the sync to a ghl_sync job
+            raise
+        return None
 
-        if assigned:
-            update_prospect_with_operator_info(prospect_id, assigned)
 
-        return assigned
+# ---------------------- SUBMIT PIPELINE ---------------------- #
+# Airtable upsert ─┐
+#                  ├─> redirect URL   (critical path = slower of the two branches)
+# GHL lookup → GHL update ─┘
+#                  └─> operator back-fill (background, needs both results)
+#
+# Both branches share one deadline. A branch that runs out of time, hits an
+# open circuit breaker or still gets a 5xx / connection error after its retries
+# is re-run from the submit queue instead of failing the request: Airtable as
+# a whole "legacy_survey" job, GHL as a "ghl_sync" job.
+
+# Upstream is down, slow, saturated or over budget; the work is fine to retry later
+DEFERRABLE = (CircuitOpen, http_client.DeadlineExceeded, RateLimitTimeout, Overloaded)
+
+SUBMIT_DEFERRED = metrics.counter(
+    "submit_deferred_total",
+    "Submit branches moved to the job queue instead of finishing in the request",
+    ("branch", "reason"),
+)
+_fanout_pool = ThreadPoolExecutor(max_workers=SUBMIT_FANOUT_WORKERS, thread_name_prefix="submit-fanout")
+_background_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="submit-background")
+
+
+@contextmanager
+def _timed(timings: dict | None, stage: str):
+    # Per-request timings (Server-Timing) plus the shared /metrics histogram
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - t0
+        metrics.STAGE_LATENCY.observe(elapsed, pipeline="submit", stage=stage)
+        if timings is not None:
+            timings[stage] = round(elapsed * 1000, 1)
+
+
+def _operator_backfill(prospect_id: str, ghl_user_id: str):
+    with _timed(None, "operator_backfill"):
+        update_prospect_with_operator_info(prospect_id, ghl_user_id)
+
+
+def normalize_answers(answers) -> list:
+    if not isinstance(answers, list):
+        answers = []
+
+    answers = list(answers)
+    while len(answers) < LEGACY_SURVEY_QUESTION_COUNT:
+        answers.append("No response")
+    return answers[:LEGACY_SURVEY_QUESTION_COUNT]
+
 
+def _airtable_branch(email: str, answers: list, timings: dict, deadline: float | None = None):
+    with _timed(timings, "airtable_upsert"):
+        return get_or_create_prospect(email, legacysurvey_fields(answers), deadline)
+
+
+def _defer_reason(e: Exception) -> str | None:
+    # -> why a failed branch is worth retrying from the queue, or None if it isn't
+    if isinstance(e, DEFERRABLE):
+        return {CircuitOpen: "breaker_open", RateLimitTimeout: "rate_limited",
+                Overloaded: "busy"}.get(type(e), "deadline")
+
+    import requests
+
+    if isinstance(e, requests.HTTPError):
+        # Retries already ran out; a 5xx or a 429 may well pass later, a 4xx won't
+        status = e.response.status_code if e.response is not None else None
+        return "upstream_error" if status is None or status >= 500 or status == 429 else None
+    if isinstance(e, (requests.ConnectionError, requests.Timeout, GHLError)):
+        return "upstream_error"
+    return None
+
+
+def _branch_result(future, branch: str, deferred: dict, deadline: float | None):
+    try:
+        return future.result()
     except Exception as e:
-        print(f"GHL Legacy Survey Sync Error: {e}")
+        reason = _defer_reason(e)
+        if reason is None or deadline is None:
+            # A bad request, or already running from the queue (fail the job so it is retried)
+            raise
+        log.warning("Submit branch deferred", extra={"branch": branch, "reason": reason, "error": str(e)})
+        SUBMIT_DEFERRED.inc(branch=branch, reason=reason)
+        deferred[branch] = reason
         return None
 
 
+def _defer_submit(email: str, answers: list, deferred: dict, prospect_id: str | None):
+    queue = get_submit_queue()
+    if "airtable" in deferred:
+        # Re-runs both branches; the GHL update is a PUT, so repeating it is harmless
+        queue.enqueue("legacy_survey", {"email": email, "answers": answers},
+                      max_attempts=SUBMIT_DEFER_MAX_ATTEMPTS)
+    elif "ghl" in deferred:
+        queue.enqueue("ghl_sync", {"email": email, "answers": answers, "prospect_id": prospect_id},
+                      max_attempts=SUBMIT_DEFER_MAX_ATTEMPTS)
+
+
+def sync_ghl(email: str, answers: list, prospect_id: str) -> dict:
+    # Deferred GHL branch of a submission whose Airtable write already landed.
+    # Runs from the queue, so failures raise (push_legacysurvey_to_ghl without
+    # a deadline does too) and the job is retried; the GHL update is a PUT.
+    with _timed(None, "ghl_sync_deferred"):
+        assigned_user_id = push_legacysurvey_to_ghl(email, answers)
+    if assigned_user_id:
+        with _timed(None, "operator_backfill"):
+            _patch_prospect(prospect_id, operator_fields(assigned_user_id), "operator_backfill")
+    return {"assigned_user_id": assigned_user_id}
+
+
+def process_legacy_survey(email: str, answers: list, deadline: float | None = None) -> dict:
+    # deadline (time.monotonic()) is set for in-request runs; queued runs have none
+    timings = {}
+    deferred = {}
+    with metrics.STAGE_IN_FLIGHT.track(pipeline="submit"), _timed(timings, "total"):
+        # wrap(): log lines from the branches carry this request's id
+        airtable_future = _fanout_pool.submit(logs.wrap(_airtable_branch), email, answers, timings, deadline)
+        ghl_future = _fanout_pool.submit(logs.wrap(push_legacysurvey_to_ghl), email, answers, timings, deadline)
+
+        assigned_user_id = _branch_result(ghl_future, "ghl", deferred, deadline)
+        legacy_code, prospect_id = _branch_result(airtable_future, "airtable", deferred, deadline) or (None, None)
+
+    if deferred:
+        _defer_submit(email, answers, deferred, prospect_id)
+
+    if assigned_user_id and prospect_id:
+        _background_pool.submit(logs.wrap(_operator_backfill), prospect_id, assigned_user_id)
+        redirect_url = f"{LEGACY_SURVEY_REDIRECT_URL}?uid={assigned_user_id}"
+    else:
+        redirect_url = LEGACY_SURVEY_REDIRECT_URL
+
+    log.info("Submit finished", extra={"timings_ms": timings, "deferred": sorted(deferred)})
+
+    # A deferred Airtable branch enqueues the report itself once the row exists
+    if REPORTS_AUTO_ENQUEUE and "airtable" not in deferred:
+        try:
+            # Email only (one row per email after the upsert), so a manual
+            # enqueue for the same prospect lands on the same job
+            enqueue_report(email, priority=REPORT_PRIORITY_FRESH)
+        except Exception as e:
+            log.error("Report enqueue failed", extra={"error": str(e)})
+
+    return {
+        "redirect_url": redirect_url,
+        "legacy_code": legacy_code,
+        "prospect_id": prospect_id,
+        "timings_ms": timings,
+        "deferred": sorted(deferred),
+    }
+
+
+# ---------------------- SUBMIT QUEUE ---------------------- #
+_submit_queue = None
+_submit_pool = None
+
+
+_init_lock = threading.Lock()
+
+
+def get_submit_queue() -> JobQueue:
+    global _submit_queue, _submit_pool
+    with _init_lock:
+        if _submit_queue is None:
+            _submit_queue = JobQueue()
+            _submit_pool = WorkerPool(
+                _submit_queue,
+                {"legacy_survey": process_legacy_survey, "ghl_sync": sync_ghl},
+                concurrency=SUBMIT_WORKERS,
+                name="submit",
+            )
+            _submit_pool.start()
+    return _submit_queue
+
+
 # ---------------------- ROUTES ---------------------- #
+@app.before_request
+def _bind_request_id():
+    # Every log line from this request (and its pool tasks) carries the id
+    g.request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex[:16]
+    g.log_token = logs.push(request_id=g.request_id)
+
+
+@app.after_request
+def _request_id_header(response):
+    if g.get("request_id"):
+        response.headers["X-Request-ID"] = g.request_id
+    return response
+
+
+@app.teardown_request
+def _unbind_request_id(exc):
+    if g.get("log_token"):
+        logs.pop(g.log_token)
+
+
 @app.route("/")
 def index():
     return render_template("chat.html")
 
 
-@app.route("/submit", methods=["POST"])
-def submit():
-    try:
-        data = request.json or {}
-        email = str(data.get("email", "")).strip()
-        answers = data.get("answers")
+_idempotency = None
 
-        if not isinstance(answers, list):
-            answers = []
 
-        while len(answers) < LEGACY_SURVEY_QUESTION_COUNT:
-            answers.append("No response")
-        answers = answers[:LEGACY_SURVEY_QUESTION_COUNT]
+def get_idempotency_store() -> IdempotencyStore:
+    global _idempotency
+    with _init_lock:
+        if _idempotency is None:
+            _idempotency = IdempotencyStore()
+    return _idempotency
 
-        legacy_code, prospect_id = get_or_create_prospect(email)
 
-        save_legacysurvey_to_airtable(legacy_code, prospect_id, answers)
+def _overloaded(e: Overloaded):
+    # Shed before doing any work, so retrying is always safe
+    response = jsonify({"error": "busy", "retry_after": e.retry_after})
+    response.status_code = 503
+    response.headers["Retry-After"] = str(e.retry_after)
+    return response
 
-        assigned_user_id = push_legacysurvey_to_ghl(
-            email=email,
-            answers=answers,
-            legacy_code=legacy_code,
-            prospect_id=prospect_id
+
+def _execute_submit(email: str, answers: list):
+    g.submit_executed = True
+
+    if SUBMIT_MODE == "async":
+        job_id = get_submit_queue().enqueue(
+            "legacy_survey", {"email": email, "answers": answers}
         )
+        return {
+            "redirect_url": LEGACY_SURVEY_REDIRECT_URL,
+            "job_id": job_id,
+            "status_url": f"/submit/status/{job_id}",
+        }, 202
 
-        if assigned_user_id:
-            redirect_url = f"{LEGACY_SURVEY_REDIRECT_URL}?uid={assigned_user_id}"
-        else:
-            redirect_url = LEGACY_SURVEY_REDIRECT_URL
+    result = process_legacy_survey(email, answers, deadline=time.monotonic() + SUBMIT_BUDGET_SECONDS)
+    g.submit_timings = result["timings_ms"]
+    if result["deferred"]:
+        # Saved for the submit queue; the visitor carries on either way
+        return {"redirect_url": result["redirect_url"], "deferred": result["deferred"]}, 202
+    return {"redirect_url": result["redirect_url"]}, 200
 
-        return jsonify({"redirect_url": redirect_url})
 
+@app.route("/submit", methods=["POST"])
+def submit():
+    try:
+        data = request.json or {}
+        email = str(data.get("email", "")).strip()
+        answers = normalize_answers(data.get("answers"))
+
+        # Double-clicks and client retries share a key, so only the first one
+        # touches Airtable/GHL; the rest wait for it or replay its response.
+        key = (
+            request.headers.get("Idempotency-Key")
+            or data.get("idempotency_key")
+            or derive_key(email, answers)
+        )
+        # Past SUBMIT_MAX_CONCURRENCY in flight (box-wide) requests wait briefly,
+        # then get 503 + Retry-After instead of everyone slowing down together.
+        # Only the request that owns the key takes a slot; duplicates replay
+        # or wait without holding one.
+        body, status = get_idempotency_store().run(
+            f"submit:{key}", lambda: _execute_submit(email, answers),
+            gate=lambda: admission.admit("submit"),
+        )
+
+        response = jsonify(body)
+        response.status_code = status
+        if not g.get("submit_executed"):
+            response.headers["Idempotent-Replayed"] = "true"
+        if g.get("submit_timings"):
+            response.headers["Server-Timing"] = ", ".join(
+                f"{stage};dur={ms}" for stage, ms in g.submit_timings.items()
+            )
+        return response
+
+    except Overloaded as e:
+        return _overloaded(e)
     except Exception as e:
-        print(f"Legacy Survey Submit Error: {e}")
+        log.error("Submit failed", extra={"error": str(e)}, exc_info=True)
         return jsonify({"error": str(e)}), 500
 
 
+@app.route("/submit/status/<job_id>")
+def submit_status(job_id):
+    job = get_submit_queue().get(job_id)
+    if not job:
+        return jsonify({"error": "unknown job"}), 404
+
+    body = {
+        "job_id": job["id"],
+        "status": job["status"],
+        "attempts": job["attempts"],
+    }
+    if job["result"]:
+        body["redirect_url"] = job["result"].get("redirect_url")
+        body["legacy_code"] = job["result"].get("legacy_code")
+    if job["error"]:
+        body["error"] = job["error"]
+    return jsonify(body)
+
+
+@app.route("/reports/stream")
+def reports_stream():
+    if not _is_admin():
+        return jsonify({"error": "not found"}), 404
+
+    email = (request.args.get("email") or "").strip() or None
+    legacy_code = (request.args.get("legacy_code") or "").strip() or None
+    if not (email or legacy_code):
+        return jsonify({"error": "email or legacy_code required"}), 400
+    force = request.args.get("force") in ("1", "true", "yes")
+
+    # Report generation pulls in OpenAI and Playwright; keep it out of the
+    # web process until someone actually asks for a report.
+    import reports
+
+    pool = admission.get_pool("report_stream")
+    try:
+        slot = pool.acquire() if pool else None
+    except Overloaded as e:
+        return _overloaded(e)
+
+    def events():
+        for event in reports.generate_reports_streaming(
+            prospect_email=email,
+            legacy_code=legacy_code,
+            force_regenerate=force,
+        ):
+            yield f"event: {event['stage']}\ndata: {json.dumps(event)}\n\n"
+
+    response = Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    if slot is not None:
+        # Held until the stream ends or the client goes away
+        response.call_on_close(lambda: pool.release(slot))
+    return response
+
+
+@app.route("/reports/enqueue", methods=["POST"])
+def reports_enqueue():
+    if not _is_admin():
+        return jsonify({"error": "not found"}), 404
+
+    data = request.get_json(silent=True) or {}
+    email = str(data.get("email") or "").strip() or None
+    legacy_code = str(data.get("legacy_code") or "").strip() or None
+    if not (email or legacy_code):
+        return jsonify({"error": "email or legacy_code required"}), 400
+    priority = REPORT_PRIORITIES.get(data.get("priority") or "backfill")
+    if priority is None:
+        return jsonify({"error": f"priority must be one of {sorted(REPORT_PRIORITIES)}"}), 400
+
+    if report_queue_stats()["depth"].get("queued", 0) >= REPORTS_MAX_QUEUED:
+        admission.ADMISSION_SHED.inc(pool="report_queue", reason="queue_full")
+        return _overloaded(Overloaded("report_queue", "queue_full", 60))
+
+    job_id, created = enqueue_report(email, legacy_code, bool(data.get("force")), priority)
+    return jsonify({
+        "job_id": job_id,
+        "deduplicated": not created,
+        "status_url": f"/reports/jobs/{job_id}",
+    }), 202
+
+
+@app.route("/reports/jobs/<job_id>")
+def reports_job_status(job_id):
+    if not _is_admin():
+        return jsonify({"error": "not found"}), 404
+
+    job = get_report_queue().get(job_id)
+    if not job or job["kind"] != REPORT_JOB_KIND:
+        return jsonify({"error": "unknown job"}), 404
+    return jsonify({
+        "job_id": job_id,
+        "status": job["status"],
+        "attempts": job["attempts"],
+        "priority": job["priority"],
+        "age_seconds": round(time.time() - job["created_at"], 1),
+        "result": job["result"],
+        "error": job["error"],
+    })
+
+
+@app.route("/reports/<path:name>")
+def report_file(name):
+    if not name.endswith(".pdf"):
+        return jsonify({"error": "not found"}), 404
+
+    # File names carry a timestamp, so a given URL never changes content.
+    # conditional=True gives ETag/If-None-Match and Range support, and the
+    # file body goes out through wsgi.file_wrapper (sendfile under gunicorn).
+    response = send_from_directory(
+        REPORTS_DIR.resolve(), name,
+        mimetype="application/pdf",
+        conditional=True,
+        etag=True,
+        max_age=REPORTS_CACHE_MAX_AGE,
+    )
+    response.headers["Cache-Control"] = f"public, max-age={REPORTS_CACHE_MAX_AGE}, immutable"
+    return response
+
+
 @app.route("/health")
 def health():
     return jsonify({"status": "healthy"})
 
 
+@app.route("/health/pool")
+def health_pool():
+    return jsonify(http_client.pool_stats())
+
+
+@app.route("/health/breakers")
+def health_breakers():
+    # Breakers are per process; deferral counts are summed over every worker
+    deferred = metrics.collect().get(SUBMIT_DEFERRED.name, {}).get("values", {})
+    return jsonify({
+        **http_client.breaker_stats(),
+        "submit_deferred": {"/".join(json.loads(k)): v for k, v in deferred.items()},
+        "submit_queue": get_submit_queue().stats(["legacy_survey", "ghl_sync"]),
+    })
+
+
+@app.route("/health/idempotency")
+def health_idempotency():
+    return jsonify(get_idempotency_store().stats())
+
+
+@app.route("/metrics")
+def metrics_endpoint():
+    # Prometheus text format, summed over every worker process
+    return Response(metrics.render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/health/reports")
+def health_reports():
+    return jsonify(report_queue_stats())
+
+
+@app.route("/health/survey-mirror")
+def health_survey_mirror():
+    mirror = get_mirror()
+    return jsonify(mirror.stats() if mirror else {"enabled": False})
+
+
+@app.route("/health/contacts")
+def health_contacts():
+    cache = get_contact_cache()
+    return jsonify(cache.stats() if cache else {"enabled": False})
+
+
+@app.route("/health/outbox")
+def health_outbox():
+    outbox = get_outbox()
+    return jsonify(outbox.stats() if outbox else {"enabled": False})
+
+
+@app.route("/health/admission")
+def health_admission():
+    return jsonify(admission.stats())
+
+
+@app.route("/health/logs")
+def health_logs():
+    return jsonify(logs.stats())
+
+
+@app.route("/health/operators")
+def health_operators():
+    return jsonify(operators.stats())
+
+
+def _is_admin() -> bool:
+    # EventSource can't send headers, so the token may also come as ?token=
+    supplied = request.headers.get("X-Admin-Token") or request.args.get("token")
+    return bool(ADMIN_TOKEN) and supplied == ADMIN_TOKEN
+
+
+@app.route("/operators/invalidate", methods=["POST"])
+def operators_invalidate():
+    if not _is_admin():
+        return jsonify({"error": "not found"}), 404
+
+    ghl_user_id = (request.get_json(silent=True) or {}).get("ghl_user_id")
+    operators.invalidate(ghl_user_id)
+    return jsonify({"ok": True, "invalidated": ghl_user_id or "all"})
+
+
+# Publish this worker's metrics for /metrics in the other workers
+metrics.start_flusher()
+
+# Keep the reports directory inside its age and disk budget
+start_retention_thread()
+
+# Warm the operator directory in the background; lookups fall back to Airtable until it lands
+operators.start()
+
+# Keep the Survey Responses mirror current; one process across the box does the pulling
+if get_mirror():
+    get_mirror().start()
+
+# Send Airtable writes that an earlier process queued but never got to flush
+if get_outbox():
+    get_outbox().start()
+
+# Start draining whatever a previous process left in the queue: async
+# submissions, and in sync mode the work deferred past the submit budget
+get_submit_queue()
+
+
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))
     app.run(host="0.0.0.0", port=port)
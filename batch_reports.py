@@ -0,0 +1,181 @@
+"""
+Regenerate blueprint/briefing PDFs for many Survey Responses rows.
+
+    python batch_reports.py                       # rows with answers but no Blueprint PDF
+    python batch_reports.py --formula "{Legacy Code} = 'Legacy-X25-OP1042'"
+    python batch_reports.py --concurrency 8 --limit 200
+    python batch_reports.py --keys prospects.txt  # one email or Legacy Code per line
+
+Finished record ids are appended to a checkpoint file, so re-running the
+same command after an interruption skips everything already done.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+import metrics
+import reports
+import report_cache
+
+# ---------------------- CONFIG ---------------------- #
+
+DATA_DIR = Path(os.getenv("DATA_DIR") or "data")
+
+DEFAULT_FORMULA = "AND({Date Submitted}, NOT({90 Day Blueprint PDF}))"
+DEFAULT_CHECKPOINT = DATA_DIR / "batch_reports.checkpoint.jsonl"
+
+
+# ---------------------- CHECKPOINT ---------------------- #
+
+class Checkpoint:
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self.done: set[str] = set()
+        self.failed: set[str] = set()
+
+        if self.path.exists():
+            for line in self.path.read_text().splitlines():
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # half-written last line from a killed run
+                if entry.get("ok"):
+                    self.done.add(entry["record_id"])
+                    self.failed.discard(entry["record_id"])
+                else:
+                    self.failed.add(entry["record_id"])
+
+    def record(self, record_id: str, result: dict):
+        entry = {"record_id": record_id, "ok": result.get("ok", False),
+                 "reason": result.get("reason"), "ts": time.time()}
+        with self._lock, open(self.path, "a") as fh:
+            fh.write(json.dumps(entry) + "\n")
+            fh.flush()
+            os.fsync(fh.fileno())
+        if entry["ok"]:
+            self.done.add(record_id)
+
+
+# ---------------------- RUNNER ---------------------- #
+
+def _rows_for_keys(keys: list[str]) -> list[dict]:
+    # Resolved with a handful of OR queries instead of one search per prospect
+    emails = [k for k in keys if "@" in k]
+    codes = [k for k in keys if "@" not in k]
+    found = reports.find_survey_rows(emails, codes)
+    missing = [k for k in keys if k not in found]
+    if missing:
+        print(f"⚠️ No Survey Responses row for {len(missing)} key(s): {', '.join(missing[:10])}")
+    records = {}
+    for key in keys:
+        if key in found:
+            records.setdefault(found[key]["id"], found[key])
+    return list(records.values())
+
+
+def _process(record: dict, public_base_url: str | None, force: bool) -> dict:
+    try:
+        return reports.generate_reports_for_record(
+            record, public_base_url=public_base_url, force_regenerate=force
+        )
+    except Exception as e:
+        return {"ok": False, "reason": f"exception: {e}"}
+
+
+def run_batch(formula: str = DEFAULT_FORMULA,
+              concurrency: int = 4,
+              checkpoint_path: Path = DEFAULT_CHECKPOINT,
+              limit: int | None = None,
+              retry_failed: bool = True,
+              public_base_url: str | None = None,
+              force: bool = False,
+              keys: list[str] | None = None) -> dict:
+    checkpoint = Checkpoint(checkpoint_path)
+    outcomes: Counter = Counter()
+    started = time.perf_counter()
+
+    # Snapshot the matching rows first: rows drop out of the default formula as
+    # soon as their PDFs are attached, which would shift Airtable's pagination.
+    todo = []
+    rows = _rows_for_keys(keys) if keys else reports.iter_survey_rows(formula)
+    for record in rows:
+        if record["id"] in checkpoint.done:
+            outcomes["skipped_done"] += 1
+        elif not retry_failed and record["id"] in checkpoint.failed:
+            outcomes["skipped_failed"] += 1
+        elif limit is None or len(todo) < limit:
+            todo.append(record)
+    print(f"Batch: {len(todo)} records to process ({outcomes['skipped_done']} already done)")
+
+    # Worker count bounds records in flight; the per-stage semaphores in
+    # reports.py cap OpenAI and Chromium, and the shared limiter caps Airtable.
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch-report") as pool:
+        futures = {pool.submit(_process, record, public_base_url, force): record["id"] for record in todo}
+        for future in as_completed(futures):
+            record_id = futures[future]
+            result = future.result()
+            checkpoint.record(record_id, result)
+            outcomes["ok" if result.get("ok") else (result.get("reason") or "failed")] += 1
+            print(f"{'✅' if result.get('ok') else '❌'} {record_id}: {result.get('reason') or 'ok'}")
+
+    elapsed = time.perf_counter() - started
+    processed = len(todo)
+    return {
+        "processed": processed,
+        "ok": outcomes["ok"],
+        "failed": processed - outcomes["ok"],
+        "failures_by_reason": {k: v for k, v in outcomes.items()
+                               if k not in ("ok", "skipped_done", "skipped_failed")},
+        "skipped_done": outcomes["skipped_done"],
+        "skipped_failed": outcomes["skipped_failed"],
+        "elapsed_seconds": round(elapsed, 1),
+        "records_per_minute": round(processed / elapsed * 60, 2) if elapsed else None,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Batch-generate Legacy reports")
+    parser.add_argument("--formula", default=DEFAULT_FORMULA,
+                        help="Airtable filterByFormula selecting the rows to process")
+    parser.add_argument("--keys", type=Path, default=None,
+                        help="file of emails / Legacy Codes to process instead of --formula")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--checkpoint", type=Path, default=DEFAULT_CHECKPOINT)
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--skip-failed", action="store_true",
+                        help="don't retry records that failed in an earlier run")
+    parser.add_argument("--public-base-url", default=None)
+    parser.add_argument("--force", action="store_true",
+                        help="bypass the report text cache and call the model again")
+    args = parser.parse_args(argv)
+
+    # Batch runs show up on the web app's /metrics alongside the workers
+    metrics.start_flusher()
+
+    summary = run_batch(
+        formula=args.formula,
+        concurrency=args.concurrency,
+        checkpoint_path=args.checkpoint,
+        limit=args.limit,
+        retry_failed=not args.skip_failed,
+        public_base_url=args.public_base_url,
+        force=args.force,
+        keys=[k.strip() for k in args.keys.read_text().splitlines() if k.strip()] if args.keys else None,
+    )
+    cache = report_cache.get_cache()
+    if cache:
+        summary["text_cache"] = cache.stats()
+    print(json.dumps(summary, indent=2))
+    return 0 if summary["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+import json
+import platform
+import subprocess
+import datetime
+from pathlib import Path
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+
+def percentile(values: list[float], pct: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def latency_summary(seconds: list[float]) -> dict:
+    def ms(v):
+        return round(v * 1000, 1) if v is not None else None
+
+    return {
+        "n": len(seconds),
+        "p50_ms": ms(percentile(seconds, 50)),
+        "p90_ms": ms(percentile(seconds, 90)),
+        "p99_ms": ms(percentile(seconds, 99)),
+        "max_ms": ms(max(seconds) if seconds else None),
+    }
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+            cwd=Path(__file__).resolve().parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save(name: str, params: dict, results: dict, path: Path | None = None) -> Path:
+    # One JSON file per run; the params block says what was measured so two
+    # files are only compared like-for-like
+    path = path or RESULTS_DIR / f"{name}-{datetime.datetime.utcnow():%Y%m%d-%H%M%S}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({
+        "benchmark": name,
+        "commit": _git_commit(),
+        "recorded_at": datetime.datetime.utcnow().isoformat() + "Z",
+        "host": {"python": platform.python_version(), "machine": platform.machine()},
+        "params": params,
+        "results": results,
+    }, indent=2))
+    return path
+
+
+def _flatten(d: dict, prefix: str = "") -> dict:
+    out = {}
+    for k, v in d.items():
+        key = f"{prefix}{k}"
+        if isinstance(v, dict):
+            out.update(_flatten(v, key + "."))
+        elif isinstance(v, (int, float)) and not isinstance(v, bool):
+            out[key] = v
+    return out
+
+
+def compare(results: dict, baseline_path: Path, params: dict | None = None) -> list[str]:
+    baseline = json.loads(Path(baseline_path).read_text())
+    old, new = _flatten(baseline["results"]), _flatten(results)
+    lines = [f"vs {baseline_path} (commit {baseline.get('commit')}):"]
+    if params is not None:
+        for key in sorted(set(params) | set(baseline.get("params", {}))):
+            if params.get(key) != baseline.get("params", {}).get(key):
+                lines.append(f"  ! param {key}: {baseline.get('params', {}).get(key)!r} -> {params.get(key)!r}")
+    for key in sorted(new):
+        if key not in old:
+            continue
+        before, after = old[key], new[key]
+        change = f"{(after - before) / before * 100:+.1f}%" if before else "n/a"
+        lines.append(f"  {key:<40} {before:>10} -> {after:>10}  ({change})")
+    return lines
@@ -0,0 +1,71 @@
+"""
+PDFs per second: a fresh Chromium per PDF (the old html_to_pdf) versus the
+warm shared renderer in pdf_renderer.py.
+
+    python benchmarks/bench_pdf_render.py [--n 20] [--concurrency 2]
+
+Needs Playwright's Chromium (`python -m playwright install chromium`).
+"""
+import sys
+import time
+import argparse
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from playwright.sync_api import sync_playwright
+
+import reports
+from pdf_renderer import PdfRenderer
+
+
+def sample_html(i: int) -> str:
+    body = "\n\n".join(
+        f"# Section {s}\n\n" + " ".join(["Concrete weekly action for the next ninety days."] * 40)
+        for s in range(1, 7)
+    )
+    return reports.html_shell("90-Day Business Blueprint", f"Legacy-X25-OP{1000 + i}",
+                              reports.markdownish_to_html(body))
+
+
+def cold(html: str, output_path: Path):
+    with sync_playwright() as p:
+        browser = p.chromium.launch()
+        page = browser.new_page()
+        page.set_content(html, wait_until="networkidle")
+        page.pdf(path=str(output_path), format="A4", print_background=True)
+        browser.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=2)
+    args = parser.parse_args()
+
+    out = Path(tempfile.mkdtemp(prefix="pdf-bench-"))
+    docs = [sample_html(i) for i in range(args.n)]
+
+    t0 = time.perf_counter()
+    for i, html in enumerate(docs):
+        cold(html, out / f"cold_{i}.pdf")
+    cold_elapsed = time.perf_counter() - t0
+
+    renderer = PdfRenderer(concurrency=args.concurrency)
+    renderer.render(docs[0], out / "warmup.pdf")  # launch outside the timed window
+    t0 = time.perf_counter()
+    # Pairs, like generate_reports_for_record (blueprint + briefing)
+    for i in range(0, args.n, 2):
+        renderer.render_many([(html, out / f"warm_{i + j}.pdf") for j, html in enumerate(docs[i:i + 2])])
+    warm_elapsed = time.perf_counter() - t0
+    stats = renderer.stats()
+    renderer.close()
+
+    print(f"cold: {args.n / cold_elapsed:.2f} PDFs/s ({cold_elapsed / args.n * 1000:.0f} ms each)")
+    print(f"warm: {args.n / warm_elapsed:.2f} PDFs/s ({warm_elapsed / args.n * 1000:.0f} ms each), "
+          f"{stats['launches']} browser launch(es)")
+
+
+if __name__ == "__main__":
+    main()
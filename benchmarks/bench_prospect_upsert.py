@@ -0,0 +1,96 @@
+"""
+Airtable round trips and latency for one /submit write, before vs. after
+the merge-on-email upsert.
+
+    python benchmarks/bench_prospect_upsert.py [--latency 0.08] [--n 20]
+
+"before" replays the request sequence the old get_or_create_prospect +
+save_legacysurvey_to_airtable pair sent; "after" calls the current
+app.get_or_create_prospect. Both run against a local fake Airtable with a
+fixed per-request latency.
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.fake_upstreams import FakeAirtable
+
+
+def before(app, email: str, fields: dict):
+    at, url, h = app.http_client.airtable, app._url, app._h
+    formula = f"{{Prospect Email}} = '{email}'"
+    data = at.get(url(app.HQ_TABLE, params={"filterByFormula": formula, "maxRecords": 1}), headers=h()).json()
+    if data.get("records"):
+        rec = data["records"][0]
+        rec_id, legacy_code = rec["id"], rec["fields"].get("Legacy Code")
+        if not legacy_code:
+            auto = at.get(url(app.HQ_TABLE, rec_id), headers=h()).json()["fields"]["AutoNum"]
+            legacy_code = app.legacy_code_from_autonum(auto)
+            at.patch(url(app.HQ_TABLE, rec_id), headers=h(), json={"fields": {"Legacy Code": legacy_code}})
+    else:
+        rec = at.post(url(app.HQ_TABLE), headers=h(), json={"fields": {"Prospect Email": email}}).json()
+        rec_id = rec["id"]
+        # The original code re-read the row whenever AutoNum was not echoed back
+        auto = at.get(url(app.HQ_TABLE, rec_id), headers=h()).json()["fields"]["AutoNum"]
+        legacy_code = app.legacy_code_from_autonum(auto)
+        at.patch(url(app.HQ_TABLE, rec_id), headers=h(), json={"fields": {"Legacy Code": legacy_code}})
+    at.patch(url(app.HQ_TABLE, rec_id), headers=h(), json={"fields": {"Legacy Code": legacy_code, **fields}})
+    return legacy_code, rec_id
+
+
+def after(app, email: str, fields: dict):
+    return app.get_or_create_prospect(email, fields)
+
+
+def run(app, fake: FakeAirtable, strategy, label: str, n: int) -> dict:
+    fields = app.legacysurvey_fields(["benchmark answer"] * app.LEGACY_SURVEY_QUESTION_COUNT)
+    results = {}
+    for case in ("new", "existing"):
+        timings, trips = [], []
+        for i in range(n):
+            email = f"{label}-{i}@bench.local"
+            if case == "existing":
+                strategy(app, email, fields)
+            fake.reset_calls()
+            t0 = time.perf_counter()
+            strategy(app, email, fields)
+            timings.append(time.perf_counter() - t0)
+            trips.append(len(fake.calls))
+        results[case] = {
+            "round_trips": statistics.mean(trips),
+            "p50_ms": statistics.median(timings) * 1000,
+            "max_ms": max(timings) * 1000,
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.08, help="seconds per fake Airtable request")
+    parser.add_argument("--n", type=int, default=20)
+    args = parser.parse_args()
+
+    fake = FakeAirtable(latency=args.latency).start()
+    os.environ["AIRTABLE_API_URL"] = f"{fake.url}/v0"
+    os.environ.setdefault("AIRTABLE_BASE_ID", "appBench")
+    os.environ.setdefault("AIRTABLE_API_KEY", "bench")
+    import app
+
+    try:
+        for label, strategy in (("before", before), ("after", after)):
+            for case, r in run(app, fake, strategy, label, args.n).items():
+                print(
+                    f"{label:>6} {case:>8}: {r['round_trips']:.1f} round trips, "
+                    f"p50 {r['p50_ms']:.0f} ms, max {r['max_ms']:.0f} ms"
+                )
+    finally:
+        fake.stop()
+
+
+if __name__ == "__main__":
+    main()
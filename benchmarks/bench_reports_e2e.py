@@ -0,0 +1,156 @@
+"""
+End-to-end time for reports.generate_reports_for_email_or_legacy_code
+against local fake Airtable and OpenAI servers.
+
+    python benchmarks/bench_reports_e2e.py [--n 10] [--concurrency 2]
+        [--openai-latency 3] [--profile clean|errors|throttled|degraded]
+        [--skip-pdf] [--save] [--compare benchmarks/results/reports_e2e-....json]
+
+Each record is generated twice: "cold" with an empty report text cache,
+then "warm" when the model calls are served from it. The per-stage
+breakdown comes from the pipeline_stage_duration_seconds histogram.
+
+PDFs need Playwright's Chromium. With --skip-pdf the renderer is replaced by
+a stub that writes empty files, so only lookup, model and attach time is
+measured.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks import baseline
+from benchmarks.fake_upstreams import PROFILES, FakeAirtable, FakeOpenAI
+
+
+def seed_survey_rows(airtable: FakeAirtable, n: int, run_id: str) -> list[str]:
+    emails = []
+    for i in range(n):
+        email = f"report-{run_id}-{i}@bench.local"
+        fields = {
+            "Prospect Email": email,
+            "Prospect Name": f"Bench Prospect {i}",
+            "Legacy Code": f"Legacy-X25-OP{5000 + i}",
+            "Date Submitted": "2025-01-01",
+        }
+        for q in range(7, 31):
+            fields[f"Q{q} Benchmark question"] = f"Answer {q} for prospect {i}"
+        airtable.insert("Survey Responses", fields)
+        emails.append(email)
+    return emails
+
+
+def stage_means(metrics) -> dict:
+    out = {}
+    for key, value in metrics.STAGE_LATENCY.snapshot().items():
+        pipeline, stage = json.loads(key)
+        count = sum(value[:-1])
+        if pipeline == "report" and count:
+            out[stage] = round(value[-1] / count * 1000, 1)
+    return out
+
+
+def run_pass(reports, emails: list[str], concurrency: int, base_url: str) -> dict:
+    def one(email: str):
+        t0 = time.perf_counter()
+        result = reports.generate_reports_for_email_or_legacy_code(
+            prospect_email=email, public_base_url=base_url
+        )
+        return result, time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(one, emails))
+    wall = time.perf_counter() - t0
+
+    reasons: dict[str, int] = {}
+    for result, _ in outcomes:
+        reason = "ok" if result.get("ok") else result.get("reason") or "error"
+        reasons[reason] = reasons.get(reason, 0) + 1
+    return {
+        "wall_seconds": round(wall, 2),
+        "reports_per_minute": round(len(emails) / wall * 60, 2) if wall else None,
+        "latency": baseline.latency_summary([elapsed for _, elapsed in outcomes]),
+        "outcomes": reasons,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=2)
+    parser.add_argument("--airtable-latency", type=float, default=0.08)
+    parser.add_argument("--openai-latency", type=float, default=3.0,
+                        help="seconds per fake chat completion")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="clean",
+                        help="failure profile applied to both fakes")
+    parser.add_argument("--airtable-rps", type=float, default=None,
+                        help="override AIRTABLE_RATE_LIMIT_RPS (default 5 req/s per base)")
+    parser.add_argument("--skip-pdf", action="store_true")
+    parser.add_argument("--save", action="store_true")
+    parser.add_argument("--compare", type=Path, default=None)
+    args = parser.parse_args()
+
+    airtable = FakeAirtable(latency=args.airtable_latency, **PROFILES[args.profile]).start()
+    openai_fake = FakeOpenAI(latency=args.openai_latency, **PROFILES[args.profile]).start()
+
+    data_dir = tempfile.mkdtemp(prefix="reports-e2e-")
+    os.environ.update({
+        "AIRTABLE_API_URL": f"{airtable.url}/v0",
+        "AIRTABLE_BASE_ID": "appBench",
+        "AIRTABLE_API_KEY": "bench",
+        "OPENAI_BASE_URL": f"{openai_fake.url}/v1",
+        "OPENAI_API_KEY": "bench",
+        "DATA_DIR": data_dir,
+        "REPORTS_DIR": os.path.join(data_dir, "reports"),
+    })
+    if args.airtable_rps:
+        os.environ["AIRTABLE_RATE_LIMIT_RPS"] = str(args.airtable_rps)
+        os.environ["AIRTABLE_RATE_LIMIT_BURST"] = str(max(args.airtable_rps / 2, 2))
+    import metrics
+    import reports
+
+    if args.skip_pdf:
+        def write_empty(jobs, timeout=None):
+            for _, path in jobs:
+                Path(path).parent.mkdir(parents=True, exist_ok=True)
+                Path(path).write_bytes(b"")
+        reports.renderer.render_many = write_empty
+
+    emails = seed_survey_rows(airtable, args.n, str(int(time.time())))
+    results = {}
+    try:
+        for label in ("cold", "warm"):
+            before = len(openai_fake.prompts)
+            metrics.STAGE_LATENCY._values.clear()
+            results[label] = run_pass(reports, emails, args.concurrency, "http://bench.local")
+            results[label]["openai_calls"] = len(openai_fake.prompts) - before
+            results[label]["stages_mean_ms"] = stage_means(metrics)
+    finally:
+        airtable.stop()
+        openai_fake.stop()
+        if not args.skip_pdf:
+            reports.renderer.close()
+
+    for label, r in results.items():
+        lat = r["latency"]
+        print(f"{label:>5}: {r['reports_per_minute']} reports/min, p50 {lat['p50_ms']} ms, "
+              f"p99 {lat['p99_ms']} ms, {r['openai_calls']} model calls, outcomes {r['outcomes']}")
+        print(f"       stages (mean ms): {r['stages_mean_ms']}")
+
+    params = {k: str(v) if isinstance(v, Path) else v
+              for k, v in vars(args).items() if k not in ("save", "compare")}
+    if args.compare:
+        print("\n".join(baseline.compare(results, args.compare, params)))
+    if args.save:
+        print(f"saved {baseline.save('reports_e2e', params, results)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Cold-start time: gunicorn spawn to first /health, per-worker boot time, and
+report worker startup.
+
+    python benchmarks/bench_startup.py [--runs 5] [--workers 2]
+        [--worker-class gevent|sync] [--save] [--compare <baseline.json>]
+
+Per-worker boot (fork -> app imported) comes from the "Worker <pid> ready in
+<n> ms" line that gunicorn.conf.py prints. Every run uses a fresh DATA_DIR
+and points Airtable at a closed port so nothing waits on the network.
+"""
+import os
+import re
+import sys
+import time
+import socket
+import argparse
+import statistics
+import tempfile
+import threading
+import subprocess
+from pathlib import Path
+
+import requests
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from benchmarks import baseline
+
+READY_LINE = re.compile(r"Worker (\d+) ready in (\d+) ms")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def base_env(worker_class: str) -> dict:
+    return {
+        **os.environ,
+        "DATA_DIR": tempfile.mkdtemp(prefix="startup-"),
+        "AIRTABLE_API_URL": "http://127.0.0.1:9/v0",
+        "WEB_WORKER_CLASS": worker_class,
+        "REPORT_WORKER_EMBEDDED": "0",
+        "PYTHONUNBUFFERED": "1",
+    }
+
+
+def web_run(workers: int, worker_class: str, timeout: float = 60) -> dict:
+    port = free_port()
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "app:app", "-w", str(workers), "-b", f"127.0.0.1:{port}"],
+        cwd=ROOT, env=base_env(worker_class), stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+    )
+    boots = []
+
+    def read():
+        for line in proc.stdout:
+            m = READY_LINE.search(line)
+            if m:
+                boots.append(int(m.group(2)))
+
+    reader = threading.Thread(target=read, daemon=True)
+    reader.start()
+
+    first_health = None
+    session = requests.Session()
+    try:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if first_health is None:
+                try:
+                    if session.get(f"http://127.0.0.1:{port}/health", timeout=1).ok:
+                        first_health = time.perf_counter() - t0
+                except (requests.ConnectionError, requests.Timeout):
+                    pass
+            if first_health is not None and len(boots) >= workers:
+                break
+            time.sleep(0.005)
+    finally:
+        session.close()
+        proc.terminate()
+        try:
+            proc.wait(timeout=40)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        reader.join(5)
+
+    return {"first_health_s": first_health, "worker_boot_ms": boots}
+
+
+def report_worker_run(timeout: float = 60) -> float | None:
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "report_worker.py"],
+        cwd=ROOT, env=base_env("sync"), stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+    )
+    elapsed = None
+    try:
+        deadline = time.monotonic() + timeout
+        for line in proc.stdout:
+            if "Report worker started" in line:
+                elapsed = time.perf_counter() - t0
+                break
+            if time.monotonic() > deadline:
+                break
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=40)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--worker-class", choices=("gevent", "sync"), default="gevent")
+    parser.add_argument("--save", action="store_true")
+    parser.add_argument("--compare", type=Path, default=None)
+    args = parser.parse_args()
+
+    health, boots, report = [], [], []
+    for _ in range(args.runs):
+        run = web_run(args.workers, args.worker_class)
+        if run["first_health_s"] is not None:
+            health.append(run["first_health_s"])
+        boots.extend(run["worker_boot_ms"])
+        r = report_worker_run()
+        if r is not None:
+            report.append(r)
+
+    def med_ms(values, scale=1000):
+        return round(statistics.median(values) * scale, 1) if values else None
+
+    results = {
+        "first_health_ms": {"median": med_ms(health), "max": med_ms([max(health)]) if health else None},
+        "worker_boot_ms": {"median": med_ms(boots, 1), "max": max(boots) if boots else None, "n": len(boots)},
+        "report_worker_ready_ms": {"median": med_ms(report)},
+    }
+    print(f"{args.runs} runs, {args.workers} {args.worker_class} worker(s)")
+    print(f"  spawn -> first /health: median {results['first_health_ms']['median']} ms, "
+          f"max {results['first_health_ms']['max']} ms")
+    print(f"  worker boot (fork -> ready): median {results['worker_boot_ms']['median']} ms, "
+          f"max {results['worker_boot_ms']['max']} ms")
+    print(f"  report worker spawn -> polling: median {results['report_worker_ready_ms']['median']} ms")
+
+    params = {k: v for k, v in vars(args).items() if k not in ("save", "compare")}
+    if args.compare:
+        print("\n".join(baseline.compare(results, args.compare, params)))
+    if args.save:
+        print(f"saved {baseline.save('startup', params, results)}")
+
+
+if __name__ == "__main__":
+    main()
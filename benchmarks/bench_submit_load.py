@@ -0,0 +1,241 @@
+"""
+/submit throughput and latency under gunicorn, against local fake Airtable
+and GHL servers.
+
+    python benchmarks/bench_submit_load.py [--requests 300] [--concurrency 16]
+        [--workers 2] [--latency 0.08] [--profile clean|errors|throttled|degraded]
+        [--ghl-profile down|hanging|...] [--stalled-stdout]
+        [--rate 3 --max-deferred 0.05] [--expect-breaker-open ghl]
+        [--save] [--compare benchmarks/results/submit_load-....json]
+
+Starts the fakes in this process, launches `gunicorn app:app` pointed at
+them with a throwaway DATA_DIR, then fires POST /submit from --concurrency
+client threads. Every request uses a new email, so nothing is replayed from
+the idempotency store. --stalled-stdout hands gunicorn a stdout pipe that
+is never read, as when a log shipper falls behind.
+
+The Airtable limiter in rate_limit.py still applies (5 req/s per base by
+default), which is usually what bounds throughput. Pass --airtable-rps to
+measure the app without it.
+
+Closed-loop runs (the default) offer far more than that quota, so most
+submits are deferred (202) by design: an in-request Airtable call waits at
+most DEADLINE_MAX_QUEUE_SECONDS for a token. --rate sends requests open-loop
+at a fixed number per second instead; --max-deferred then fails the run
+(exit 1) if a larger share than that was deferred. Below the quota, e.g.
+
+    python benchmarks/bench_submit_load.py --requests 60 --rate 3 --max-deferred 0.05
+
+everything should finish inline.
+
+--expect-breaker-open fails the run unless that upstream's circuit breaker
+opened. Breakers are per process, so use a single worker; the submit
+queue's workers are switched off so only calls made inside /submit count.
+Against a GHL that never answers, submits time out at their deadline; those
+still count as breaker failures, so the breaker should open after a handful:
+
+    python benchmarks/bench_submit_load.py --requests 8 --concurrency 1 --workers 1 \
+        --ghl-profile hanging --expect-breaker-open ghl
+"""
+import os
+import sys
+import time
+import socket
+import argparse
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import requests
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from benchmarks import baseline
+from benchmarks.fake_upstreams import PROFILES, FakeAirtable, FakeGHL
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_gunicorn(env: dict, workers: int, port: int, extra_args: list[str],
+                   stalled_stdout: bool = False) -> subprocess.Popen:
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "app:app", "-w", str(workers),
+         "-b", f"127.0.0.1:{port}", "--log-level", "warning", *extra_args],
+        cwd=ROOT, env=env, stdout=subprocess.PIPE if stalled_stdout else subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with {proc.returncode}")
+        try:
+            if requests.get(f"http://127.0.0.1:{port}/health", timeout=1).ok:
+                return proc
+        except (requests.ConnectionError, requests.Timeout):
+            pass
+        time.sleep(0.1)
+    proc.terminate()
+    raise RuntimeError("gunicorn did not become healthy within 30s")
+
+
+def drive(base_url: str, n: int, concurrency: int, run_id: str, answer_count: int,
+          rate: float | None = None) -> dict:
+    answers = ["load test answer"] * answer_count
+    sessions = {}
+    start = time.perf_counter()
+
+    def one(i: int):
+        if rate:
+            # Open loop: request i goes out at i / rate whatever the others are doing
+            time.sleep(max(start + i / rate - time.perf_counter(), 0))
+        session = sessions.setdefault(i % concurrency, requests.Session())
+        t0 = time.perf_counter()
+        try:
+            r = session.post(f"{base_url}/submit",
+                             json={"email": f"load-{run_id}-{i}@bench.local", "answers": answers},
+                             timeout=120)
+            status = r.status_code
+        except requests.RequestException:
+            status = "exception"
+        return status, time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(one, range(n)))
+    wall = time.perf_counter() - t0
+    # Idle keep-alive connections would hold up gunicorn's graceful shutdown
+    for session in sessions.values():
+        session.close()
+
+    statuses: dict[str, int] = {}
+    for status, _ in outcomes:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    ok = [elapsed for status, elapsed in outcomes if status in (200, 202)]
+    return {
+        "wall_seconds": round(wall, 2),
+        "throughput_rps": round(len(ok) / wall, 2) if wall else None,
+        "success_rate": round(len(ok) / n, 4) if n else None,
+        "latency": baseline.latency_summary(ok),
+        "latency_all": baseline.latency_summary([elapsed for _, elapsed in outcomes]),
+        "statuses": statuses,
+        "deferred_rate": round(statuses.get("202", 0) / n, 4) if n else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn worker processes")
+    parser.add_argument("--gunicorn-args", default="", help="extra gunicorn flags, space separated")
+    parser.add_argument("--latency", type=float, default=0.08, help="seconds per fake upstream request")
+    parser.add_argument("--jitter", type=float, default=0.04)
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="clean")
+    parser.add_argument("--ghl-profile", choices=sorted(PROFILES), default=None,
+                        help="profile for GHL only (default: --profile)")
+    parser.add_argument("--known-contacts", type=float, default=0.8,
+                        help="fraction of emails that already exist in GHL")
+    parser.add_argument("--airtable-rps", type=float, default=None,
+                        help="override AIRTABLE_RATE_LIMIT_RPS for the app")
+    parser.add_argument("--submit-mode", choices=("sync", "async"), default="sync")
+    parser.add_argument("--rate", type=float, default=None,
+                        help="open loop: submits per second (default: closed loop at --concurrency)")
+    parser.add_argument("--max-deferred", type=float, default=None,
+                        help="exit 1 if more than this fraction of submits got 202")
+    parser.add_argument("--expect-breaker-open", choices=("airtable", "ghl"), default=None,
+                        help="exit 1 unless this upstream's breaker opened (use --workers 1)")
+    parser.add_argument("--stalled-stdout", action="store_true",
+                        help="give gunicorn a stdout pipe that is never read")
+    parser.add_argument("--save", action="store_true", help="write a baseline under benchmarks/results/")
+    parser.add_argument("--compare", type=Path, default=None, help="baseline JSON to diff against")
+    args = parser.parse_args()
+
+    profile = {"latency": args.latency, "jitter": args.jitter, **PROFILES[args.profile]}
+    airtable = FakeAirtable(**profile).start()
+    ghl = FakeGHL(**{"latency": args.latency, "jitter": args.jitter,
+                     **PROFILES[args.ghl_profile or args.profile]}).start()
+
+    run_id = str(int(time.time()))
+    for i in range(int(args.requests * args.known_contacts)):
+        ghl.add_contact(f"load-{run_id}-{i}@bench.local", f"user{i % 5}")
+    for i in range(5):
+        airtable.insert("Users", {"GHL User ID": f"user{i}", "Legacy Code": f"Legacy-X25-OP{2000 + i}",
+                                  "Email": f"op{i}@bench.local"})
+
+    data_dir = tempfile.mkdtemp(prefix="submit-load-")
+    env = {
+        **os.environ,
+        "AIRTABLE_API_URL": f"{airtable.url}/v0",
+        "AIRTABLE_BASE_ID": "appBench",
+        "AIRTABLE_API_KEY": "bench",
+        "GHL_BASE_URL": f"{ghl.url}/v1",
+        "GHL_API_KEY": "bench",
+        "GHL_LOCATION_ID": "locBench",
+        "DATA_DIR": data_dir,
+        "REPORTS_DIR": os.path.join(data_dir, "reports"),
+        "SUBMIT_MODE": args.submit_mode,
+    }
+    if args.expect_breaker_open:
+        env["SUBMIT_WORKERS"] = "0"
+    if args.airtable_rps:
+        env["AIRTABLE_RATE_LIMIT_RPS"] = str(args.airtable_rps)
+        env["AIRTABLE_RATE_LIMIT_BURST"] = str(max(args.airtable_rps / 2, 2))
+
+    port = free_port()
+    proc = start_gunicorn(env, args.workers, port, args.gunicorn_args.split(), args.stalled_stdout)
+    results = None
+    try:
+        base_url = f"http://127.0.0.1:{port}"
+        results = drive(base_url, args.requests, args.concurrency, run_id, 24, args.rate)
+        results["breakers"] = {name: {k: b[k] for k in ("state", "opened", "failures")}
+                               for name, b in requests.get(f"{base_url}/health/breakers", timeout=5).json().items()
+                               if name in ("airtable", "ghl")}
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=40)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        # Counted after shutdown so writes flushed from the outbox on exit are included
+        if results:
+            results["upstream_calls"] = {"airtable": len(airtable.calls), "ghl": len(ghl.calls)}
+            results["upstream_responses"] = {"airtable": airtable.responses, "ghl": ghl.responses}
+        airtable.stop()
+        ghl.stop()
+
+    lat = results["latency"]
+    print(f"{args.requests} requests, " + (f"{args.rate}/s" if args.rate else f"concurrency {args.concurrency}")
+          + f", {args.workers} worker(s), profile {args.profile}"
+          + (f", ghl {args.ghl_profile}" if args.ghl_profile else ""))
+    print(f"  throughput {results['throughput_rps']} req/s, success {results['success_rate']:.1%}")
+    print(f"  latency p50 {lat['p50_ms']} ms, p90 {lat['p90_ms']} ms, p99 {lat['p99_ms']} ms, "
+          f"max {lat['max_ms']} ms")
+    print(f"  statuses {results['statuses']} (deferred {results['deferred_rate']:.1%})")
+    calls = results["upstream_calls"]
+    print(f"  upstream calls: airtable {calls['airtable']} "
+          f"({calls['airtable'] / args.requests:.2f}/submit), ghl {calls['ghl']}")
+    print("  breakers: " + ", ".join(f"{name} {b['state']} (opened {b['opened']}x, {b['failures']} failures)"
+                                     for name, b in results["breakers"].items()))
+
+    params = {k: v for k, v in vars(args).items() if k not in ("save", "compare")}
+    if args.stalled_stdout and proc.stdout:
+        proc.stdout.close()
+    if args.compare:
+        print("\n".join(baseline.compare(results, args.compare, params)))
+    if args.save:
+        print(f"saved {baseline.save('submit_load', params, results)}")
+    if args.max_deferred is not None and results["deferred_rate"] > args.max_deferred:
+        print(f"FAIL: {results['deferred_rate']:.1%} deferred, expected at most {args.max_deferred:.1%}")
+        sys.exit(1)
+    if args.expect_breaker_open and not results["breakers"][args.expect_breaker_open]["opened"]:
+        print(f"FAIL: {args.expect_breaker_open} breaker never opened")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
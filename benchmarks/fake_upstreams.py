@@ -0,0 +1,371 @@
+import re
+import json
+import time
+import random
+import datetime
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ---------------------- BASE SERVER ---------------------- #
+
+class SSE(list):
+    # Return SSE([...events]) from handle() to answer with a text/event-stream
+    pass
+
+
+class FakeUpstream:
+    # A local HTTP stand-in for one upstream API. Subclasses implement
+    # handle(method, path, query, body) -> (status, payload).
+    #
+    # Failure profile (see set_profile): error_rate of requests answer
+    # error_status, throttle_rate answer 429 with Retry-After. Both are
+    # decided before handle() runs, so a failed request changes no state.
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, throttle_rate: float = 0.0,
+                 error_status: int = 500, retry_after: float | None = 1.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.calls: list[tuple[str, str]] = []
+        self.responses: dict[int, int] = {}
+        self._lock = threading.Lock()
+        self._server = None
+
+    def set_profile(self, **settings) -> "FakeUpstream":
+        # e.g. set_profile(latency=0.2, throttle_rate=0.05)
+        for name, value in settings.items():
+            if not hasattr(self, name):
+                raise AttributeError(name)
+            setattr(self, name, value)
+        return self
+
+    def _injected_failure(self):
+        roll = random.random()
+        if roll < self.throttle_rate:
+            headers = {"Retry-After": str(self.retry_after)} if self.retry_after is not None else {}
+            return 429, {"error": {"type": "RATE_LIMIT_REACHED"}}, headers
+        if roll < self.throttle_rate + self.error_rate:
+            return self.error_status, {"error": {"type": "SERVER_ERROR"}}, {}
+        return None
+
+    # ---- lifecycle ---- #
+
+    def start(self) -> "FakeUpstream":
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def _dispatch(self):
+                parsed = urllib.parse.urlsplit(self.path)
+                query = dict(urllib.parse.parse_qsl(parsed.query))
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                body = json.loads(raw) if raw else None
+
+                with fake._lock:
+                    fake.calls.append((self.command, parsed.path))
+
+                delay = fake.latency + random.uniform(0, fake.jitter)
+                if delay:
+                    time.sleep(delay)
+
+                headers = {}
+                failure = fake._injected_failure()
+                if failure:
+                    status, payload, headers = failure
+                else:
+                    status, payload = fake.handle(
+                        self.command, urllib.parse.unquote(parsed.path), query, body
+                    )
+                with fake._lock:
+                    fake.responses[status] = fake.responses.get(status, 0) + 1
+
+                if isinstance(payload, SSE):
+                    out = "".join(f"data: {json.dumps(e)}\n\n" for e in payload)
+                    out = (out + "data: [DONE]\n\n").encode()
+                    content_type = "text/event-stream"
+                else:
+                    out = json.dumps(payload).encode()
+                    content_type = "application/json"
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(out)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(out)
+
+            do_GET = do_POST = do_PATCH = do_PUT = do_DELETE = _dispatch
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def reset_calls(self):
+        with self._lock:
+            self.calls = []
+            self.responses = {}
+
+    def handle(self, method: str, path: str, query: dict, body):
+        raise NotImplementedError
+
+
+# ---------------------- AIRTABLE ---------------------- #
+
+_CLAUSE = re.compile(r"\{([^}]+)\}\s*=\s*'((?:[^'\\]|\\.)*)'")
+_MODIFIED_AFTER = re.compile(r"IS_AFTER\(LAST_MODIFIED_TIME\(\),\s*DATETIME_PARSE\('([^']+)'\)\)")
+
+
+def _formula_matcher(formula: str):
+    # Understands the formulas this repo sends: {Field} = 'value' clauses,
+    # optionally wrapped in AND(...) or OR(...), and the survey mirror's
+    # IS_AFTER(LAST_MODIFIED_TIME(), ...) filter. Matchers take (fields, modified_at).
+    since = _MODIFIED_AFTER.search(formula)
+    if since:
+        ts = datetime.datetime.strptime(since.group(1), "%Y-%m-%dT%H:%M:%S.%fZ")
+        cutoff = ts.replace(tzinfo=datetime.timezone.utc).timestamp()
+        return lambda fields, modified_at: modified_at > cutoff
+    clauses = [(f, v.replace("\\'", "'")) for f, v in _CLAUSE.findall(formula)]
+    combine = any if formula.strip().upper().startswith("OR(") else all
+    return lambda fields, modified_at: combine(str(fields.get(f, "")) == v for f, v in clauses)
+
+
+class FakeAirtable(FakeUpstream):
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, **profile):
+        super().__init__(latency, jitter, **profile)
+        self.tables: dict[str, dict[str, dict]] = {}
+        self.modified: dict[str, float] = {}
+        self._autonum: dict[str, int] = {}
+
+    # ---- state helpers ---- #
+
+    def _table(self, name: str) -> dict:
+        return self.tables.setdefault(name, {})
+
+    def insert(self, table: str, fields: dict) -> dict:
+        with self._lock:
+            n = self._autonum.get(table, 0) + 1
+            self._autonum[table] = n
+            rec_id = f"rec{table[:3].upper()}{n:08d}"
+            self._table(table)[rec_id] = {**fields, "AutoNum": n}
+            self.modified[rec_id] = time.time()
+        return self._record(rec_id, self._table(table)[rec_id])
+
+    @staticmethod
+    def _record(rec_id: str, fields: dict) -> dict:
+        return {"id": rec_id, "createdTime": "2025-01-01T00:00:00.000Z", "fields": dict(fields)}
+
+    # ---- routing ---- #
+
+    def handle(self, method, path, query, body):
+        parts = [p for p in path.split("/") if p]
+        # /v0/{base}/{table}[/{record}]
+        if len(parts) < 3:
+            return 404, {"error": "NOT_FOUND"}
+        table = parts[2]
+        rec_id = parts[3] if len(parts) > 3 else None
+        rows = self._table(table)
+
+        if method == "GET" and rec_id:
+            if rec_id not in rows:
+                return 404, {"error": "NOT_FOUND"}
+            return 200, self._record(rec_id, rows[rec_id])
+
+        if method == "GET":
+            match = _formula_matcher(query.get("filterByFormula", "")) if query.get("filterByFormula") else None
+            found = [self._record(i, f) for i, f in rows.items()
+                     if match is None or match(f, self.modified.get(i, 0))]
+            if query.get("maxRecords"):
+                found = found[: int(query["maxRecords"])]
+            page_size = int(query.get("pageSize") or 100)
+            start = int(query.get("offset") or 0)
+            page = found[start:start + page_size]
+            payload = {"records": page}
+            if start + page_size < len(found):
+                payload["offset"] = str(start + page_size)
+            return 200, payload
+
+        if method == "POST":
+            if "records" in body:
+                return 200, {"records": [self.insert(table, r["fields"]) for r in body["records"]]}
+            return 200, self.insert(table, body["fields"])
+
+        if method == "PATCH" and rec_id:
+            if rec_id not in rows:
+                return 404, {"error": "NOT_FOUND"}
+            rows[rec_id].update(body["fields"])
+            self.modified[rec_id] = time.time()
+            return 200, self._record(rec_id, rows[rec_id])
+
+        if method == "PATCH":
+            return self._patch_many(table, body)
+
+        return 405, {"error": "METHOD_NOT_ALLOWED"}
+
+    def _patch_many(self, table: str, body: dict):
+        rows = self._table(table)
+        upsert = body.get("performUpsert")
+        out, created, updated = [], [], []
+
+        for rec in body["records"]:
+            fields = rec["fields"]
+            rec_id = rec.get("id")
+            if rec_id is None and upsert:
+                keys = upsert["fieldsToMergeOn"]
+                rec_id = next(
+                    (i for i, f in rows.items() if all(f.get(k) == fields.get(k) for k in keys)),
+                    None,
+                )
+                if rec_id is None:
+                    new = self.insert(table, fields)
+                    created.append(new["id"])
+                    out.append(new)
+                    continue
+            if rec_id not in rows:
+                return 404, {"error": "NOT_FOUND"}
+            rows[rec_id].update(fields)
+            self.modified[rec_id] = time.time()
+            updated.append(rec_id)
+            out.append(self._record(rec_id, rows[rec_id]))
+
+        payload = {"records": out}
+        if upsert:
+            payload["createdRecords"] = created
+            payload["updatedRecords"] = updated
+        return 200, payload
+
+
+# ---------------------- GHL ---------------------- #
+
+class FakeGHL(FakeUpstream):
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, **profile):
+        super().__init__(latency, jitter, **profile)
+        self.contacts: dict[str, dict] = {}
+
+    def add_contact(self, email: str, assigned_user_id: str | None = None) -> dict:
+        contact = {
+            "id": f"ghl{len(self.contacts) + 1:06d}",
+            "email": email,
+            "assignedTo": assigned_user_id,
+            "tags": [],
+            "customField": {},
+        }
+        with self._lock:
+            self.contacts[contact["id"]] = contact
+        return contact
+
+    def handle(self, method, path, query, body):
+        parts = [p for p in path.split("/") if p]
+        # /v1/contacts/lookup or /v1/contacts/{id}
+        if parts[-1] == "lookup" and method == "GET":
+            found = [c for c in self.contacts.values() if c["email"] == query.get("email")]
+            if not found:
+                return 422, {"email": {"message": "The email address is invalid."}}
+            return 200, {"contacts": found}
+
+        if parts[-1] == "contacts" and method == "GET":
+            # Cursor pagination like GHL v1: meta.startAfterId points at the last contact returned
+            ids = sorted(self.contacts)
+            after = query.get("startAfterId")
+            start = ids.index(after) + 1 if after in ids else 0
+            page = [self.contacts[i] for i in ids[start:start + int(query.get("limit") or 20)]]
+            meta = {"total": len(ids)}
+            if start + len(page) < len(ids):
+                meta.update(startAfterId=page[-1]["id"], startAfter=int(time.time() * 1000))
+            return 200, {"contacts": page, "meta": meta}
+
+        if len(parts) >= 3 and parts[-2] == "contacts" and method == "PUT":
+            contact = self.contacts.get(parts[-1])
+            if contact is None:
+                return 404, {"msg": "Contact not found"}
+            contact["tags"] = list(body.get("tags", contact["tags"]))
+            contact["customField"].update(body.get("customField", {}))
+            return 200, {"contact": contact}
+
+        return 404, {"msg": "Not found"}
+
+
+# ---------------------- OPENAI ---------------------- #
+
+def sample_report(sections: int = 6, words_per_section: int = 120) -> str:
+    filler = " ".join(["Concrete weekly action for the next ninety days."] * (words_per_section // 8))
+    return "\n\n".join(f"# Section {i}\n\n{filler}" for i in range(1, sections + 1))
+
+
+class FakeOpenAI(FakeUpstream):
+    # POST /v1/chat/completions, plain or stream=True. Point the SDK at it with
+    # OPENAI_BASE_URL=<url>/v1. latency applies once per request (time to
+    # first byte); the whole stream is then sent at once.
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0,
+                 text: str | None = None, **profile):
+        super().__init__(latency, jitter, **profile)
+        self.text = text if text is not None else sample_report()
+        self.prompts: list[list[dict]] = []
+
+    def handle(self, method, path, query, body):
+        if method != "POST" or not path.endswith("/chat/completions"):
+            return 404, {"error": {"message": "Not found"}}
+
+        with self._lock:
+            self.prompts.append(body.get("messages", []))
+        model = body.get("model", "gpt-4o-mini")
+        base = {"id": f"chatcmpl-{len(self.prompts)}", "created": int(time.time()), "model": model}
+
+        if body.get("stream"):
+            # ~40 chunks, split on word boundaries like real token deltas
+            words = self.text.split(" ")
+            step = max(len(words) // 40, 1)
+            chunks = [" ".join(words[i:i + step]) + (" " if i + step < len(words) else "")
+                      for i in range(0, len(words), step)]
+            events = [{**base, "object": "chat.completion.chunk",
+                       "choices": [{"index": 0, "delta": {"role": "assistant", "content": c},
+                                    "finish_reason": None}]} for c in chunks]
+            events.append({**base, "object": "chat.completion.chunk",
+                           "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+            return 200, SSE(events)
+
+        return 200, {
+            **base,
+            "object": "chat.completion",
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": self.text}}],
+            "usage": {"prompt_tokens": 900, "completion_tokens": len(self.text) // 4,
+                      "total_tokens": 900 + len(self.text) // 4},
+        }
+
+
+# ---------------------- PROFILES ---------------------- #
+# Named failure profiles shared by the load drivers (--profile NAME)
+
+PROFILES = {
+    "clean": {},
+    "errors": {"error_rate": 0.05},
+    "throttled": {"throttle_rate": 0.10, "retry_after": 1.0},
+    "degraded": {"error_rate": 0.02, "throttle_rate": 0.05, "jitter": 0.25},
+    # Outages: every call fails fast, or every call takes longer than any timeout
+    "down": {"error_rate": 1.0, "error_status": 503},
+    "hanging": {"latency": 30.0},
+}
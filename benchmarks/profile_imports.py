@@ -0,0 +1,67 @@
+"""
+Import-time profile of the web and report entry points.
+
+    python benchmarks/profile_imports.py [--top 15] [app reports report_worker ...]
+
+Runs `python -X importtime -c "import <module>"` in a fresh interpreter per
+module and prints the total plus the slowest imports by cumulative and by
+self time. Cumulative time is inclusive of everything a module pulls in, so
+the first lines usually point at the dependency worth deferring.
+"""
+import os
+import sys
+import argparse
+import subprocess
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def profile(module: str) -> list[tuple[int, int, str]]:
+    env = {
+        **os.environ,
+        "DATA_DIR": tempfile.mkdtemp(prefix="importtime-"),
+        # Keep the operator directory's background refresh from reaching out
+        "AIRTABLE_API_URL": os.getenv("AIRTABLE_API_URL") or "http://127.0.0.1:9/v0",
+    }
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    if out.returncode != 0:
+        raise RuntimeError(out.stderr.strip().splitlines()[-1])
+
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(self_us), int(cumulative_us), name.rstrip()))
+    # Drop interpreter startup (encodings, site and whatever .pth files load)
+    site = max((i for i, r in enumerate(rows) if r[2].strip() == "site"), default=-1)
+    return rows[site + 1:]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("modules", nargs="*", default=["app", "reports", "report_worker"])
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    for module in args.modules:
+        rows = profile(module)
+        total = next(c for s, c, n in reversed(rows) if n.strip() == module)
+        print(f"== {module}: {total / 1000:.0f} ms")
+        print("  slowest (cumulative):")
+        for s, c, name in [r for r in sorted(rows, key=lambda r: -r[1]) if r[2].strip() != module][:args.top]:
+            print(f"    {c / 1000:8.1f} ms  {name}")
+        print("  slowest (self):")
+        for s, c, name in sorted(rows, key=lambda r: -r[0])[:args.top + 1]:
+            if name.strip() == module:
+                continue
+            print(f"    {s / 1000:8.1f} ms  {name.strip()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+import os
+import time
+import threading
+
+import logs
+import metrics
+
+log = logs.get_logger("circuit_breaker")
+
+# ---------------------- CONFIG ---------------------- #
+# One breaker per upstream per process. After BREAKER_FAILURE_THRESHOLD
+# failures in a row (network errors and 5xx; 4xx is the caller's problem)
+# calls are refused without touching the network. After BREAKER_RESET_SECONDS
+# one probe call goes through: success closes the breaker, failure re-opens it.
+
+BREAKER_ENABLED = (os.getenv("BREAKER_ENABLED") or "1") not in ("0", "false", "no")
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+# Calls let through at once while half-open
+BREAKER_HALF_OPEN_PROBES = int(os.getenv("BREAKER_HALF_OPEN_PROBES", "1"))
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+BREAKER_STATE = metrics.gauge(
+    "upstream_breaker_state",
+    "Processes whose breaker for the upstream is in each state",
+    ("upstream", "state"),
+)
+BREAKER_REJECTIONS = metrics.counter(
+    "upstream_breaker_rejections_total",
+    "Upstream calls refused by an open circuit breaker",
+    ("upstream",),
+)
+BREAKER_TRANSITIONS = metrics.counter(
+    "upstream_breaker_transitions_total",
+    "Circuit breaker state changes",
+    ("upstream", "state"),
+)
+
+
+class CircuitOpen(Exception):
+    def __init__(self, upstream: str, retry_in: float):
+        super().__init__(f"{upstream} circuit open; next probe in {retry_in:.0f}s")
+        self.upstream = upstream
+        self.retry_in = retry_in
+
+
+# ---------------------- BREAKER ---------------------- #
+
+class CircuitBreaker:
+    # Callers pair before_call() with exactly one of record_success(),
+    # record_failure() or release() (no verdict: the call never reached the
+    # upstream, or the caller cut it short).
+
+    def __init__(self, name: str, failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 reset_seconds: float = BREAKER_RESET_SECONDS,
+                 half_open_probes: int = BREAKER_HALF_OPEN_PROBES):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.half_open_probes = half_open_probes
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probes = 0
+        self.counters = {"rejected": 0, "opened": 0, "probes": 0, "failures": 0}
+        self._publish()
+
+    def _publish(self):
+        for state in (CLOSED, OPEN, HALF_OPEN):
+            BREAKER_STATE.set(1 if state == self.state else 0, upstream=self.name, state=state)
+
+    def _transition(self, state: str) -> bool:
+        # Caller holds the lock, and logs a True (state changed) once it lets go
+        if state == self.state:
+            return False
+        self.state = state
+        if state == OPEN:
+            self.opened_at = time.monotonic()
+            self.counters["opened"] += 1
+        BREAKER_TRANSITIONS.inc(upstream=self.name, state=state)
+        self._publish()
+        return True
+
+    def _reject(self, retry_in: float):
+        self.counters["rejected"] += 1
+        BREAKER_REJECTIONS.inc(upstream=self.name)
+        raise CircuitOpen(self.name, max(retry_in, 0))
+
+    def before_call(self):
+        with self._lock:
+            if self.state == OPEN:
+                retry_in = self.opened_at + self.reset_seconds - time.monotonic()
+                if retry_in > 0:
+                    self._reject(retry_in)
+                self._transition(HALF_OPEN)
+                self._probes = 0
+            if self.state == HALF_OPEN:
+                if self._probes >= self.half_open_probes:
+                    self._reject(0)
+                self._probes += 1
+                self.counters["probes"] += 1
+
+    def record_success(self):
+        with self._lock:
+            self.consecutive_failures = 0
+            closed = self._transition(CLOSED)
+        if closed:
+            log.info("Circuit closed", extra={"upstream": self.name})
+
+    def record_failure(self):
+        opened = False
+        with self._lock:
+            self.consecutive_failures += 1
+            self.counters["failures"] += 1
+            failures = self.consecutive_failures
+            if self.state == HALF_OPEN or failures >= self.failure_threshold:
+                opened = self._transition(OPEN)
+        if opened:
+            log.warning("Circuit opened", extra={"upstream": self.name, "failures": failures})
+
+    def release(self):
+        # The call says nothing about upstream health; free its probe slot
+        with self._lock:
+            if self.state == HALF_OPEN and self._probes > 0:
+                self._probes -= 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = {
+                **self.counters,
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+            }
+            if self.state == OPEN:
+                stats["next_probe_seconds"] = round(
+                    max(self.opened_at + self.reset_seconds - time.monotonic(), 0), 1
+                )
+            return stats
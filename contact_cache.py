@@ -0,0 +1,229 @@
+"""
+GHL contact resolution cache: email -> (contact id, assigned user).
+
+    python contact_cache.py            # print stats
+    python contact_cache.py --warm     # load every contact from GHL's listing
+    python contact_cache.py --clear
+
+A SQLite file under DATA_DIR shared by every gunicorn worker. "No contact
+for this email" is cached too, for a shorter time, so a burst of
+submissions from someone not yet in GHL doesn't look them up each time.
+"""
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import threading
+from pathlib import Path
+
+import http_client
+
+# ---------------------- CONFIG ---------------------- #
+
+DATA_DIR = Path(os.getenv("DATA_DIR") or "data")
+
+GHL_API_KEY = os.getenv("GHL_API_KEY")
+GHL_LOCATION_ID = os.getenv("GHL_LOCATION_ID")
+GHL_BASE_URL = os.getenv("GHL_BASE_URL") or "https://rest.gohighlevel.com/v1"
+
+CONTACT_CACHE_PATH = Path(os.getenv("CONTACT_CACHE_PATH") or DATA_DIR / "contact_cache.sqlite3")
+CONTACT_CACHE_ENABLED = (os.getenv("CONTACT_CACHE_ENABLED") or "1") not in ("0", "false", "no")
+# Assignments change when operators are rebalanced, so found contacts expire too
+CONTACT_CACHE_TTL_SECONDS = float(os.getenv("CONTACT_CACHE_TTL_SECONDS", "3600"))
+# Short: a contact usually appears in GHL shortly after its first form fill
+CONTACT_CACHE_NEGATIVE_TTL_SECONDS = float(os.getenv("CONTACT_CACHE_NEGATIVE_TTL_SECONDS", "120"))
+CONTACT_CACHE_MAX_ENTRIES = int(os.getenv("CONTACT_CACHE_MAX_ENTRIES", "100000"))
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS contacts (
+    email         TEXT PRIMARY KEY,
+    contact_id    TEXT,
+    assigned_user TEXT,
+    expires_at    REAL NOT NULL,
+    updated_at    REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS contacts_contact_id ON contacts (contact_id);
+CREATE INDEX IF NOT EXISTS contacts_updated ON contacts (updated_at);
+"""
+
+MISSING = object()
+
+
+def normalize_email(email: str) -> str:
+    # GHL matches contact emails case-insensitively
+    return (email or "").strip().lower()
+
+
+def assigned_user(contact: dict) -> str | None:
+    return contact.get("assignedUserId") or contact.get("userId") or contact.get("assignedTo")
+
+
+# ---------------------- CACHE ---------------------- #
+
+class ContactCache:
+    # Entries expire after ttl (found) or negative_ttl (not found); past
+    # max_entries the least recently written go first.
+
+    def __init__(self, path: Path | str = CONTACT_CACHE_PATH,
+                 ttl: float = CONTACT_CACHE_TTL_SECONDS,
+                 negative_ttl: float = CONTACT_CACHE_NEGATIVE_TTL_SECONDS,
+                 max_entries: int = CONTACT_CACHE_MAX_ENTRIES):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._unevicted_writes = 0
+        self.counters = {"hits": 0, "negative_hits": 0, "misses": 0, "writes": 0,
+                         "invalidations": 0, "evictions": 0, "warmed": 0}
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # Losing the last few writes on a power cut only costs a lookup
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, email: str):
+        # -> (contact_id, assigned_user), (None, None) for a cached "not in GHL", or MISSING
+        row = self._conn().execute(
+            "SELECT contact_id, assigned_user, expires_at FROM contacts WHERE email = ?",
+            (normalize_email(email),),
+        ).fetchone()
+        if row is None or row[2] < time.time():
+            self.counters["misses"] += 1
+            return MISSING
+        self.counters["hits" if row[0] else "negative_hits"] += 1
+        return row[0], row[1]
+
+    def put(self, email: str, contact_id: str | None, assigned: str | None = None):
+        self.put_many([(email, contact_id, assigned)])
+
+    def put_many(self, entries):
+        now = time.time()
+        rows = [(normalize_email(email), contact_id, assigned,
+                 now + (self.ttl if contact_id else self.negative_ttl), now)
+                for email, contact_id, assigned in entries if email]
+        if not rows:
+            return
+        self._conn().executemany(
+            "INSERT OR REPLACE INTO contacts (email, contact_id, assigned_user, expires_at, updated_at)"
+            " VALUES (?, ?, ?, ?, ?)",
+            rows,
+        )
+        self.counters["writes"] += len(rows)
+        self._unevicted_writes += len(rows)
+        if self._unevicted_writes >= 500:
+            self._unevicted_writes = 0
+            self.evict()
+
+    def invalidate(self, email: str | None = None, contact_id: str | None = None):
+        conn = self._conn()
+        if email:
+            removed = conn.execute("DELETE FROM contacts WHERE email = ?", (normalize_email(email),)).rowcount
+        elif contact_id:
+            removed = conn.execute("DELETE FROM contacts WHERE contact_id = ?", (contact_id,)).rowcount
+        else:
+            removed = conn.execute("DELETE FROM contacts").rowcount
+        self.counters["invalidations"] += removed
+
+    def evict(self):
+        conn = self._conn()
+        removed = conn.execute("DELETE FROM contacts WHERE expires_at < ?", (time.time(),)).rowcount
+        excess = conn.execute("SELECT COUNT(*) FROM contacts").fetchone()[0] - self.max_entries
+        if excess > 0:
+            removed += conn.execute(
+                "DELETE FROM contacts WHERE email IN"
+                " (SELECT email FROM contacts ORDER BY updated_at LIMIT ?)",
+                (excess,),
+            ).rowcount
+        self.counters["evictions"] += removed
+
+    def warm(self, fetch_page=None, max_pages: int | None = None) -> int:
+        # Load contacts from GHL's paginated listing; -> contacts cached
+        fetch_page = fetch_page or _fetch_contacts_page
+        cursor = {}
+        loaded = pages = 0
+        while max_pages is None or pages < max_pages:
+            page = fetch_page(cursor)
+            contacts = page.get("contacts") or []
+            self.put_many([(c.get("email"), c.get("id"), assigned_user(c)) for c in contacts])
+            loaded += len(contacts)
+            pages += 1
+            meta = page.get("meta") or {}
+            if not contacts or not meta.get("startAfterId"):
+                break
+            cursor = {"startAfterId": meta["startAfterId"], "startAfter": meta.get("startAfter")}
+        self.counters["warmed"] += loaded
+        return loaded
+
+    def stats(self) -> dict:
+        entries, negative = self._conn().execute(
+            "SELECT COUNT(*), COUNT(*) - COUNT(contact_id) FROM contacts WHERE expires_at >= ?",
+            (time.time(),),
+        ).fetchone()
+        lookups = self.counters["hits"] + self.counters["negative_hits"] + self.counters["misses"]
+        hit_rate = (self.counters["hits"] + self.counters["negative_hits"]) / lookups if lookups else None
+        return {
+            **self.counters,
+            "hit_rate": round(hit_rate, 3) if hit_rate is not None else None,
+            "entries": entries,
+            "negative_entries": negative,
+            "max_entries": self.max_entries,
+        }
+
+
+def _fetch_contacts_page(cursor: dict) -> dict:
+    r = http_client.ghl.get(
+        f"{GHL_BASE_URL}/contacts/",
+        headers={"Authorization": f"Bearer {GHL_API_KEY}"},
+        params={"locationId": GHL_LOCATION_ID, "limit": 100, **{k: v for k, v in cursor.items() if v}},
+        op="contact_list",
+    )
+    r.raise_for_status()
+    return r.json()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_contact_cache() -> ContactCache | None:
+    global _cache
+    if not CONTACT_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ContactCache()
+    return _cache
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="GHL contact cache maintenance")
+    parser.add_argument("--warm", action="store_true", help="load every contact from GHL")
+    parser.add_argument("--max-pages", type=int, default=None)
+    parser.add_argument("--clear", action="store_true", help="drop every cached entry")
+    args = parser.parse_args(argv)
+
+    cache = ContactCache()
+    if args.clear:
+        cache.invalidate()
+    if args.warm:
+        started = time.perf_counter()
+        loaded = cache.warm(max_pages=args.max_pages)
+        print(f"Cached {loaded} contacts in {time.perf_counter() - started:.1f}s")
+    print(json.dumps(cache.stats(), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+import os
+import sys
+import time
+import threading
+import subprocess
+
+# ---------------------- WEB SERVER ---------------------- #
+# Loaded automatically by `gunicorn app:app` (Procfile).
+#
+# "gevent" (default): one process serves many requests at once; every call to
+# Airtable/GHL yields to other requests instead of holding the process.
+# "sync": the original one-request-per-process model.
+#
+# gevent only yields on sockets and sleeps. A blocking call in C holds every
+# request in the worker for as long as it waits. Measured with another process
+# holding the lock for 1.5 s, each stalled the whole event loop for its full wait (~1.2 s):
+#   - sqlite3 busy handler (timeout=30 in the job/idempotency/cache stores):
+#     BEGIN IMMEDIATE behind another writer
+#   - fcntl.flock(LOCK_EX) on the rate_limit.py bucket file
+# Both critical sections are a few small reads/writes, so in practice the
+# stall is milliseconds. A slow disk or a long writer transaction stalls all
+# requests, not just the one waiting. admission.py slots poll with LOCK_NB +
+# time.sleep and don't block the loop.
+
+worker_class = os.getenv("WEB_WORKER_CLASS") or "gevent"
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+# Max simultaneous requests per gevent worker (ignored by sync workers)
+worker_connections = int(os.getenv("WEB_WORKER_CONNECTIONS", "500"))
+timeout = int(os.getenv("WEB_TIMEOUT", "30"))
+
+# Sync workers are forked from the master, so importing Flask here once lets
+# every worker (including restarts) skip ~180 ms of imports. Not for gevent:
+# it has to patch ssl/socket in the worker before they are first imported.
+if worker_class == "sync":
+    import flask  # noqa: F401
+
+
+# ---------------------- BOOT TIMING ---------------------- #
+# Fork -> app imported and ready to accept, per worker. Restarts and
+# scale-outs pay this each time; benchmarks/bench_startup.py reads it.
+
+def post_fork(server, worker):
+    worker.boot_started = time.monotonic()
+
+
+def post_worker_init(worker):
+    elapsed = (time.monotonic() - worker.boot_started) * 1000
+    print(f"🚀 Worker {worker.pid} ready in {elapsed:.0f} ms", flush=True)
+
+
+# ---------------------- SHUTDOWN ---------------------- #
+
+def worker_exit(server, worker):
+    # Send queued Airtable writes before the worker goes (airtable_outbox.py).
+    # The queue is on disk, so whatever doesn't make it goes out from another process.
+    outbox = sys.modules.get("airtable_outbox")
+    if outbox:
+        outbox.flush_on_exit()
+    # Then write out log lines still queued in memory (logs.py)
+    logs = sys.modules.get("logs")
+    if logs:
+        logs.flush()
+
+
+# ---------------------- REPORT WORKER ---------------------- #
+# The report worker (report_worker.py) runs as a sibling process of the web
+# workers so they share DATA_DIR (job queue, rate limiter, generated PDFs).
+# The master restarts it if it dies. REPORT_WORKER_EMBEDDED=0 turns this off.
+
+REPORT_WORKER_EMBEDDED = (os.getenv("REPORT_WORKER_EMBEDDED") or "1") not in ("0", "false", "no")
+
+_report_worker = {"proc": None, "stopping": False}
+
+
+# The imports it needs are at the top of this file: importing from the
+# supervisor thread while the master forks a web worker leaves the child with
+# a half-initialised module (gevent's patch_all then fails on subprocess).
+def _supervise_report_worker(server):
+    delay = 1
+    while not _report_worker["stopping"]:
+        started = time.monotonic()
+        proc = subprocess.Popen([sys.executable, "report_worker.py"], cwd=os.path.dirname(__file__) or ".")
+        _report_worker["proc"] = proc
+        code = proc.wait()
+        if _report_worker["stopping"]:
+            return
+        # Back off if it keeps crashing on startup
+        delay = 1 if time.monotonic() - started > 60 else min(delay * 2, 60)
+        server.log.warning("report worker exited with %s; restarting in %ss", code, delay)
+        time.sleep(delay)
+
+
+def when_ready(server):
+    if REPORT_WORKER_EMBEDDED:
+        threading.Thread(target=_supervise_report_worker, args=(server,),
+                         name="report-worker-supervisor", daemon=True).start()
+
+
+def on_exit(server):
+    _report_worker["stopping"] = True
+    proc = _report_worker["proc"]
+    if proc and proc.poll() is None:
+        proc.terminate()
+        try:
+            proc.wait(timeout=40)
+        except Exception:
+            proc.kill()
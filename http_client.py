@@ -0,0 +1,363 @@
+import os
+import sys
+import time
+import random
+import threading
+from typing import TYPE_CHECKING
+
+# `requests` (~60 ms with urllib3/charset detection) is imported on the first
+# call rather than at worker boot; annotations below are strings for that reason.
+if TYPE_CHECKING:
+    import requests
+
+import admission
+from circuit_breaker import BREAKER_ENABLED, CircuitBreaker
+from metrics import track_upstream
+from rate_limit import AirtableRateLimiter
+
+# ---------------------- CONFIG ---------------------- #
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, str(default)))
+
+
+# Per-service connect/read timeouts, retry budget and keep-alive pool size.
+# Every value can be overridden with e.g. AIRTABLE_READ_TIMEOUT=30.
+SERVICES = {
+    "airtable": {
+        "connect_timeout": _env_float("AIRTABLE_CONNECT_TIMEOUT", 5),
+        "read_timeout": _env_float("AIRTABLE_READ_TIMEOUT", 20),
+        "retries": int(os.getenv("AIRTABLE_RETRIES", "3")),
+        "pool_size": int(os.getenv("AIRTABLE_POOL_SIZE", "10")),
+    },
+    "ghl": {
+        "connect_timeout": _env_float("GHL_CONNECT_TIMEOUT", 5),
+        "read_timeout": _env_float("GHL_READ_TIMEOUT", 15),
+        "retries": int(os.getenv("GHL_RETRIES", "2")),
+        "pool_size": int(os.getenv("GHL_POOL_SIZE", "10")),
+    },
+    "openai": {
+        "connect_timeout": _env_float("OPENAI_CONNECT_TIMEOUT", 10),
+        "read_timeout": _env_float("OPENAI_READ_TIMEOUT", 120),
+        "retries": int(os.getenv("OPENAI_RETRIES", "2")),
+        "pool_size": int(os.getenv("OPENAI_POOL_SIZE", "4")),
+    },
+}
+
+# Under gunicorn's gevent worker every request is a greenlet, so a process
+# can have hundreds of upstream calls in flight. Pools grow to this size and
+# block (rather than open throwaway connections) when exhausted, for at most
+# the call's connect timeout (already cut down to its deadline).
+HTTP_ASYNC_POOL_SIZE = int(os.getenv("HTTP_ASYNC_POOL_SIZE", "100"))
+
+RETRY_BACKOFF_BASE = _env_float("HTTP_RETRY_BACKOFF_BASE", 0.25)
+RETRY_BACKOFF_MAX = _env_float("HTTP_RETRY_BACKOFF_MAX", 8)
+
+# A call with a deadline isn't started with less time than this left
+DEADLINE_MIN_CALL_SECONDS = _env_float("DEADLINE_MIN_CALL_SECONDS", 0.25)
+# ...and waits at most this long for the rate limiter or a concurrency slot;
+# past that the caller defers the work instead of queueing behind everyone else.
+# This is what caps inline /submit throughput: Airtable allows 5 req/s per base
+# (1.3-1.6 calls per submit), so roughly 3 submits/s finish inline and anything
+# offered beyond that is answered 202 and finished from the submit queue.
+# bench_submit_load.py --rate/--max-deferred checks both sides of that line.
+DEADLINE_MAX_QUEUE_SECONDS = _env_float("DEADLINE_MAX_QUEUE_SECONDS", 2)
+# A timeout counts against the breaker once the call has waited this long (or
+# its full configured timeout, if shorter), even if a deadline cut it short
+BREAKER_SLOW_CALL_SECONDS = _env_float("BREAKER_SLOW_CALL_SECONDS", 5)
+
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+def cooperative_io() -> bool:
+    # True when socket I/O yields to other greenlets (gunicorn -k gevent).
+    # gevent patches before the app is imported, so if it isn't loaded yet it
+    # isn't active, and there's no need to import it just to ask.
+    monkey = sys.modules.get("gevent.monkey")
+    return monkey is not None and monkey.is_module_patched("socket")
+
+
+def backoff_delay(attempt: int, retry_after: str | None = None) -> float:
+    if retry_after:
+        try:
+            return min(float(retry_after), RETRY_BACKOFF_MAX)
+        except ValueError:
+            pass
+    cap = min(RETRY_BACKOFF_MAX, RETRY_BACKOFF_BASE * (2 ** attempt))
+    return random.uniform(0, cap)
+
+
+# ---------------------- CLIENT ---------------------- #
+
+_adapter_cls = None
+
+
+def _adapter(**kwargs) -> "requests.adapters.HTTPAdapter":
+    # requests never passes pool_timeout to urllib3, so with pool_block=True a
+    # call waits forever for a free connection. These pools wait at most the
+    # connect timeout of the call; EmptyPoolError past that.
+    global _adapter_cls
+    if _adapter_cls is None:
+        from requests.adapters import HTTPAdapter
+        from urllib3 import HTTPConnectionPool, HTTPSConnectionPool
+
+        def bounded(base):
+            class BoundedWaitPool(base):
+                def urlopen(self, method, url, *args, **kw):
+                    if not args and kw.get("pool_timeout") is None:
+                        wait = getattr(kw.get("timeout"), "connect_timeout", None)
+                        if isinstance(wait, (int, float)):
+                            kw["pool_timeout"] = wait
+                    return super().urlopen(method, url, *args, **kw)
+            return BoundedWaitPool
+
+        pools = {"http": bounded(HTTPConnectionPool), "https": bounded(HTTPSConnectionPool)}
+
+        class BoundedWaitAdapter(HTTPAdapter):
+            def init_poolmanager(self, *args, **kw):
+                super().init_poolmanager(*args, **kw)
+                self.poolmanager.pool_classes_by_scheme = pools
+
+        _adapter_cls = BoundedWaitAdapter
+    return _adapter_cls(**kwargs)
+
+
+class ServiceClient:
+    def __init__(self, service: str, limiter=None, breaker: CircuitBreaker | None = None,
+                 slots: str | None = None):
+        # slots names the admission.py pool capping this service's calls in flight box-wide
+        self.service = service
+        self.limiter = limiter
+        self.breaker = breaker
+        self.slots = slots
+        self.config = SERVICES[service]
+        self._lock = threading.Lock()
+        self._session = None
+        self._pid = None
+        self.counters = {"requests": 0, "retries": 0, "errors": 0, "deadline_exceeded": 0,
+                         "pool_timeouts": 0}
+
+    @property
+    def timeout(self) -> tuple[float, float]:
+        return (self.config["connect_timeout"], self.config["read_timeout"])
+
+    @property
+    def session(self) -> "requests.Session":
+        # A session created before a fork must not be shared with the child
+        if self._session is None or self._pid != os.getpid():
+            with self._lock:
+                if self._session is None or self._pid != os.getpid():
+                    import requests
+
+                    s = requests.Session()
+                    if cooperative_io():
+                        pool_size, pool_block = max(self.config["pool_size"], HTTP_ASYNC_POOL_SIZE), True
+                    else:
+                        pool_size, pool_block = self.config["pool_size"], False
+                    adapter = _adapter(
+                        pool_connections=4,
+                        pool_maxsize=pool_size,
+                        pool_block=pool_block,
+                        max_retries=0,
+                    )
+                    s.mount("https://", adapter)
+                    s.mount("http://", adapter)
+                    self._session = s
+                    self._pid = os.getpid()
+        return self._session
+
+    def _remaining(self, deadline: float | None, what: str) -> float | None:
+        # Seconds left before the caller's deadline (time.monotonic()), or None
+        if deadline is None:
+            return None
+        remaining = deadline - time.monotonic()
+        if remaining < DEADLINE_MIN_CALL_SECONDS:
+            self.counters["deadline_exceeded"] += 1
+            raise DeadlineExceeded(f"{self.service} {what}: deadline passed")
+        return remaining
+
+    def _queue_budget(self, deadline: float) -> float:
+        return min(deadline - time.monotonic() - DEADLINE_MIN_CALL_SECONDS, DEADLINE_MAX_QUEUE_SECONDS)
+
+    def _is_failure(self, status: int) -> bool:
+        # 4xx (and 429, which the limiter handles) say nothing about upstream health
+        return status >= 500
+
+    def request(self, method: str, url: str, idempotent: bool | None = None,
+                op: str | None = None, deadline: float | None = None,
+                **kwargs) -> "requests.Response":
+        import requests
+        from urllib3.exceptions import EmptyPoolError
+
+        # op names the call in metrics (e.g. "prospect_upsert"); defaults to the method.
+        # deadline (time.monotonic()) caps timeouts, rate-limit and slot waits, and retries.
+        method = method.upper()
+        op = op or method.lower()
+        timeout = kwargs.pop("timeout", self.timeout)
+        if not isinstance(timeout, tuple):
+            timeout = (timeout, timeout)
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        retries = self.config["retries"]
+
+        attempt = 0
+        while True:
+            remaining = self._remaining(deadline, op)
+            if self.breaker:
+                self.breaker.before_call()
+            pool = admission.get_pool(self.slots) if self.slots else None
+            slot = None
+            try:
+                if self.limiter:
+                    if remaining is None:
+                        self.limiter.acquire(url)
+                    else:
+                        self.limiter.acquire(url, max_wait=self._queue_budget(deadline))
+                if pool:
+                    slot = pool.acquire(None if deadline is None else self._queue_budget(deadline))
+            except BaseException:
+                # RateLimitTimeout / Overloaded (or anything else) before the call went out
+                if self.breaker:
+                    self.breaker.release()
+                raise
+            if deadline is not None:
+                # Both waits above stop short of the deadline, so this stays positive
+                left = max(deadline - time.monotonic(), DEADLINE_MIN_CALL_SECONDS)
+                kwargs["timeout"] = (min(timeout[0], left), min(timeout[1], left))
+            else:
+                kwargs["timeout"] = timeout
+            # A timeout only says the caller ran out of time if the deadline left
+            # less than the slow-call threshold before the call even started
+            judged = all(cut >= min(full, BREAKER_SLOW_CALL_SECONDS)
+                         for cut, full in zip(kwargs["timeout"], timeout))
+
+            self.counters["requests"] += 1
+            try:
+                with track_upstream(self.service, op) as tracked:
+                    try:
+                        resp = self.session.request(method, url, **kwargs)
+                    finally:
+                        if slot is not None:
+                            pool.release(slot)
+                    tracked["status"] = resp.status_code
+            except EmptyPoolError as e:
+                # Every pooled connection stayed busy: local saturation, not an upstream fault
+                self.counters["pool_timeouts"] += 1
+                if self.breaker:
+                    self.breaker.release()
+                if deadline is not None:
+                    self.counters["deadline_exceeded"] += 1
+                    raise DeadlineExceeded(f"{self.service} {op}: no free connection before the deadline") from e
+                raise
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self.counters["errors"] += 1
+                if self.breaker:
+                    if not judged and isinstance(e, requests.Timeout):
+                        self.breaker.release()
+                    else:
+                        self.breaker.record_failure()
+                if deadline is not None and isinstance(e, requests.Timeout) \
+                        and deadline - time.monotonic() < DEADLINE_MIN_CALL_SECONDS:
+                    self.counters["deadline_exceeded"] += 1
+                    raise DeadlineExceeded(f"{self.service} {op}: timed out at the deadline") from e
+                if not idempotent or attempt >= retries:
+                    raise
+                delay = backoff_delay(attempt)
+            except BaseException as e:
+                # Every before_call() gets a verdict. A response that broke mid-body
+                # (ChunkedEncodingError, ContentDecodingError) is the upstream's
+                # fault; bad arguments (InvalidURL is a ValueError) and a killed
+                # greenlet are not.
+                if isinstance(e, requests.RequestException) and not isinstance(e, ValueError):
+                    self.counters["errors"] += 1
+                    if self.breaker:
+                        self.breaker.record_failure()
+                elif self.breaker:
+                    self.breaker.release()
+                raise
+            else:
+                if self.breaker:
+                    if self._is_failure(resp.status_code):
+                        self.breaker.record_failure()
+                    elif resp.status_code == 429:
+                        self.breaker.release()
+                    else:
+                        self.breaker.record_success()
+                # A 429 was rejected before any work was done, so it is safe to
+                # replay even for POST; other failures only for idempotent calls.
+                throttled = resp.status_code == 429
+                retryable = throttled or (idempotent and resp.status_code in RETRY_STATUSES)
+                if not retryable or attempt >= retries:
+                    return resp
+                retry_after = resp.headers.get("Retry-After")
+                if throttled and self.limiter:
+                    # The shared limiter holds every worker back; no extra sleep here
+                    self.limiter.penalize(url, retry_after)
+                    delay = 0
+                else:
+                    delay = backoff_delay(attempt, retry_after)
+                if deadline is not None and time.monotonic() + delay + DEADLINE_MIN_CALL_SECONDS > deadline:
+                    # No time for another attempt; the caller gets this response
+                    return resp
+                resp.close()
+
+            attempt += 1
+            self.counters["retries"] += 1
+            if delay:
+                time.sleep(delay)
+
+    def get(self, url: str, **kwargs) -> "requests.Response":
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> "requests.Response":
+        return self.request("POST", url, **kwargs)
+
+    def patch(self, url: str, **kwargs) -> "requests.Response":
+        return self.request("PATCH", url, **kwargs)
+
+    def put(self, url: str, **kwargs) -> "requests.Response":
+        return self.request("PUT", url, **kwargs)
+
+    def stats(self) -> dict:
+        pools = {}
+        if self._session is not None:
+            for adapter in set(self._session.adapters.values()):
+                manager = adapter.poolmanager
+                for key in manager.pools.keys():
+                    pool = manager.pools[key]
+                    opened = pool.num_connections
+                    served = pool.num_requests
+                    pools[f"{pool.scheme}://{pool.host}"] = {
+                        "connections_opened": opened,
+                        "requests": served,
+                        "reused": max(served - opened, 0),
+                    }
+        stats = {**self.counters, "pools": pools}
+        if self.limiter:
+            stats["limiter"] = self.limiter.stats()
+        if self.breaker:
+            stats["breaker"] = self.breaker.stats()
+        return stats
+
+
+def _breaker(service: str) -> CircuitBreaker | None:
+    return CircuitBreaker(service) if BREAKER_ENABLED else None
+
+
+airtable = ServiceClient("airtable", limiter=AirtableRateLimiter(), breaker=_breaker("airtable"),
+                         slots="airtable")
+ghl = ServiceClient("ghl", breaker=_breaker("ghl"), slots="ghl")
+
+
+def pool_stats() -> dict:
+    return {c.service: c.stats() for c in (airtable, ghl)}
+
+
+def breaker_stats() -> dict:
+    return {c.service: {**c.breaker.stats(), "deadline_exceeded": c.counters["deadline_exceeded"]}
+            for c in (airtable, ghl) if c.breaker}
@@ -0,0 +1,146 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from contextlib import nullcontext
+from pathlib import Path
+
+# ---------------------- CONFIG ---------------------- #
+
+DATA_DIR = Path(os.getenv("DATA_DIR") or "data")
+
+IDEMPOTENCY_DB_PATH = Path(os.getenv("IDEMPOTENCY_DB_PATH") or DATA_DIR / "idempotency.sqlite3")
+# How long a finished response is replayed for the same key
+IDEMPOTENCY_WINDOW_SECONDS = float(os.getenv("IDEMPOTENCY_WINDOW_SECONDS", "600"))
+# An in-flight claim older than this is assumed dead (worker killed) and can be retaken
+IDEMPOTENCY_LEASE_SECONDS = float(os.getenv("IDEMPOTENCY_LEASE_SECONDS", "60"))
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "30"))
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS idempotency (
+    key         TEXT PRIMARY KEY,
+    state       TEXT NOT NULL,
+    status_code INTEGER,
+    response    TEXT,
+    updated_at  REAL NOT NULL
+);
+"""
+
+
+def derive_key(email: str, answers: list) -> str:
+    payload = json.dumps({"email": email.strip().lower(), "answers": answers},
+                         sort_keys=True, ensure_ascii=False)
+    return "derived:" + hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# ---------------------- STORE ---------------------- #
+
+class IdempotencyStore:
+    # SQLite file shared by every gunicorn worker. The first request for a
+    # key claims it; duplicates either replay the stored response or wait
+    # for the owner to finish.
+
+    def __init__(self, path: Path | str = IDEMPOTENCY_DB_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self.counters = {"executed": 0, "replayed": 0, "coalesced": 0, "wait_timeouts": 0}
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # No fsync per commit: a power cut can only forget recent keys,
+            # and claim() runs on every /submit
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def claim(self, key: str) -> tuple[str, tuple | None]:
+        # -> ("owner", None) | ("done", (response, status)) | ("busy", None)
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT state, status_code, response, updated_at FROM idempotency WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                state, status_code, response, updated_at = row
+                if state == "done" and now - updated_at < IDEMPOTENCY_WINDOW_SECONDS:
+                    conn.execute("COMMIT")
+                    return "done", (json.loads(response), status_code)
+                if state == "in_flight" and now - updated_at < IDEMPOTENCY_LEASE_SECONDS:
+                    conn.execute("COMMIT")
+                    return "busy", None
+            conn.execute(
+                "INSERT OR REPLACE INTO idempotency (key, state, updated_at) VALUES (?, 'in_flight', ?)",
+                (key, now),
+            )
+            conn.execute("COMMIT")
+            return "owner", None
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def finish(self, key: str, response: dict, status_code: int):
+        self._conn().execute(
+            "UPDATE idempotency SET state = 'done', status_code = ?, response = ?, updated_at = ?"
+            " WHERE key = ?",
+            (status_code, json.dumps(response), time.time(), key),
+        )
+
+    def release(self, key: str):
+        # Failed executions are not remembered, so the client can retry
+        self._conn().execute("DELETE FROM idempotency WHERE key = ? AND state = 'in_flight'", (key,))
+
+    def prune(self):
+        self._conn().execute(
+            "DELETE FROM idempotency WHERE updated_at < ?",
+            (time.time() - max(IDEMPOTENCY_WINDOW_SECONDS, IDEMPOTENCY_LEASE_SECONDS),),
+        )
+
+    def run(self, key: str, fn, wait: float = IDEMPOTENCY_WAIT_SECONDS, gate=None) -> tuple[dict, int]:
+        # Execute fn() -> (response, status) at most once per key within the window.
+        # gate() (a context manager, e.g. an admission slot) is only entered by
+        # the owner of the key; replays and waiters never take it.
+        deadline = time.monotonic() + wait
+        delay = 0.05
+        waited = False
+        while True:
+            state, stored = self.claim(key)
+            if state == "done":
+                self.counters["coalesced" if waited else "replayed"] += 1
+                return stored
+            if state == "owner":
+                break
+            if time.monotonic() >= deadline:
+                self.counters["wait_timeouts"] += 1
+                return {"error": "duplicate submission still in progress"}, 409
+            waited = True
+            time.sleep(delay)
+            delay = min(delay * 2, 0.5)
+
+        try:
+            with gate() if gate else nullcontext():
+                response, status_code = fn()
+        except Exception:
+            self.release(key)
+            raise
+
+        if status_code < 500:
+            self.finish(key, response, status_code)
+        else:
+            self.release(key)
+        self.counters["executed"] += 1
+        if self.counters["executed"] % 100 == 0:
+            self.prune()
+        return response, status_code
+
+    def stats(self) -> dict:
+        return dict(self.counters)
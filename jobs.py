@@ -0,0 +1,302 @@
+import os
+import json
+import time
+import uuid
+import random
+import sqlite3
+import threading
+from pathlib import Path
+
+import logs
+
+log = logs.get_logger("jobs")
+
+# ---------------------- CONFIG ---------------------- #
+
+DATA_DIR = Path(os.getenv("DATA_DIR") or "data")
+
+JOBS_DB_PATH = Path(os.getenv("JOBS_DB_PATH") or DATA_DIR / "jobs.sqlite3")
+
+# How long a claimed job may go without a heartbeat before another worker is
+# allowed to take it over; WorkerPool renews the lease of running jobs
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "120"))
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", str(JOB_LEASE_SECONDS / 4)))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "6"))
+JOB_RETRY_BASE_SECONDS = float(os.getenv("JOB_RETRY_BASE_SECONDS", "2"))
+JOB_RETRY_MAX_SECONDS = float(os.getenv("JOB_RETRY_MAX_SECONDS", "300"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "0.5"))
+# Finished (done/failed) jobs are kept this long for status lookups
+JOB_RETENTION_DAYS = float(os.getenv("JOB_RETENTION_DAYS", "7"))
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id          TEXT PRIMARY KEY,
+    kind        TEXT NOT NULL,
+    payload     TEXT NOT NULL,
+    status      TEXT NOT NULL,
+    priority    INTEGER NOT NULL DEFAULT 0,
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    run_after   REAL NOT NULL,
+    lease_until REAL,
+    result      TEXT,
+    error       TEXT,
+    created_at  REAL NOT NULL,
+    updated_at  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, priority DESC, run_after);
+"""
+
+
+def retry_delay(attempt: int) -> float:
+    # Full-jitter exponential backoff
+    cap = min(JOB_RETRY_MAX_SECONDS, JOB_RETRY_BASE_SECONDS * (2 ** max(attempt - 1, 0)))
+    return random.uniform(cap / 2, cap)
+
+
+# ---------------------- QUEUE ---------------------- #
+
+class JobQueue:
+    # SQLite in WAL mode is the durable store; every gunicorn worker opens the
+    # same file, and claims are made atomic with BEGIN IMMEDIATE.
+
+    def __init__(self, path: Path | str = JOBS_DB_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def enqueue(self, kind: str, payload: dict, priority: int = 0,
+                max_attempts: int = JOB_MAX_ATTEMPTS, job_id: str | None = None) -> str:
+        job_id = job_id or uuid.uuid4().hex
+        now = time.time()
+        self._conn().execute(
+            "INSERT INTO jobs (id, kind, payload, status, priority, attempts, max_attempts,"
+            " run_after, created_at, updated_at) VALUES (?, ?, ?, 'queued', ?, 0, ?, ?, ?, ?)",
+            (job_id, kind, json.dumps(payload, sort_keys=True), priority, max_attempts, now, now, now),
+        )
+        return job_id
+
+    def enqueue_once(self, kind: str, payload: dict, priority: int = 0,
+                     max_attempts: int = JOB_MAX_ATTEMPTS) -> tuple[str, bool]:
+        # -> (job_id, created). A queued or running job with the same payload is
+        # reused instead of adding a duplicate; a queued one is bumped to the
+        # higher of the two priorities.
+        encoded = json.dumps(payload, sort_keys=True)
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT id, status, priority FROM jobs WHERE kind = ? AND payload = ?"
+                " AND status IN ('queued', 'running') LIMIT 1",
+                (kind, encoded),
+            ).fetchone()
+            if row is not None:
+                if row["status"] == "queued" and priority > row["priority"]:
+                    conn.execute("UPDATE jobs SET priority = ?, updated_at = ? WHERE id = ?",
+                                 (priority, time.time(), row["id"]))
+                conn.execute("COMMIT")
+                return row["id"], False
+            job_id = uuid.uuid4().hex
+            now = time.time()
+            conn.execute(
+                "INSERT INTO jobs (id, kind, payload, status, priority, attempts, max_attempts,"
+                " run_after, created_at, updated_at) VALUES (?, ?, ?, 'queued', ?, 0, ?, ?, ?, ?)",
+                (job_id, kind, encoded, priority, max_attempts, now, now, now),
+            )
+            conn.execute("COMMIT")
+            return job_id, True
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def claim(self, kinds: list[str] | None = None) -> dict | None:
+        now = time.time()
+        kind_sql = ""
+        params: list = [now, now]
+        if kinds:
+            kind_sql = f" AND kind IN ({','.join('?' for _ in kinds)})"
+            params.extend(kinds)
+
+        ready_sql = ("SELECT * FROM jobs WHERE ((status = 'queued' AND run_after <= ?)"
+                     " OR (status = 'running' AND lease_until < ?))" + kind_sql)
+        conn = self._conn()
+        # Every worker of every process polls; a WAL read doesn't take the write
+        # lock, so idle polls never queue behind (or block) real writes
+        if conn.execute(ready_sql + " LIMIT 1", params).fetchone() is None:
+            return None
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(ready_sql + " ORDER BY priority DESC, run_after LIMIT 1", params).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1,"
+                " lease_until = ?, updated_at = ? WHERE id = ?",
+                (now + JOB_LEASE_SECONDS, now, row["id"]),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        job = dict(row)
+        job["attempts"] += 1
+        job["payload"] = json.loads(job["payload"])
+        return job
+
+    # Every claim bumps attempts, so (id, attempts) names one lease: a worker
+    # whose lease expired and was taken over can no longer renew or finish it.
+
+    def renew(self, job_id: str, attempts: int) -> bool:
+        return self._conn().execute(
+            "UPDATE jobs SET lease_until = ? WHERE id = ? AND status = 'running' AND attempts = ?",
+            (time.time() + JOB_LEASE_SECONDS, job_id, attempts),
+        ).rowcount == 1
+
+    def complete(self, job_id: str, result: dict | None, attempts: int) -> bool:
+        return self._conn().execute(
+            "UPDATE jobs SET status = 'done', result = ?, error = NULL, lease_until = NULL,"
+            " updated_at = ? WHERE id = ? AND status = 'running' AND attempts = ?",
+            (json.dumps(result), time.time(), job_id, attempts),
+        ).rowcount == 1
+
+    def fail(self, job_id: str, error: str, attempts: int, max_attempts: int) -> str | None:
+        # -> the new status, or None if the lease was lost
+        now = time.time()
+        if attempts >= max_attempts:
+            status, run_after = "failed", now
+        else:
+            status, run_after = "queued", now + retry_delay(attempts)
+        updated = self._conn().execute(
+            "UPDATE jobs SET status = ?, error = ?, run_after = ?, lease_until = NULL,"
+            " updated_at = ? WHERE id = ? AND status = 'running' AND attempts = ?",
+            (status, error, run_after, now, job_id, attempts),
+        ).rowcount
+        return status if updated else None
+
+    def get(self, job_id: str) -> dict | None:
+        row = self._conn().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def counts(self) -> dict:
+        rows = self._conn().execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status")
+        return {r["status"]: r["n"] for r in rows}
+
+    def stats(self, kinds: list[str] | None = None) -> dict:
+        # Depth per status plus the age of the oldest queued/running job
+        kind_sql, params = "", []
+        if kinds:
+            kind_sql = f" WHERE kind IN ({','.join('?' for _ in kinds)})"
+            params = list(kinds)
+        now = time.time()
+        depth, oldest = {}, {}
+        for r in self._conn().execute(
+            "SELECT status, COUNT(*) AS n, MIN(created_at) AS oldest FROM jobs" + kind_sql +
+            " GROUP BY status", params,
+        ):
+            depth[r["status"]] = r["n"]
+            if r["status"] in ("queued", "running"):
+                oldest[r["status"]] = round(now - r["oldest"], 1)
+        return {"depth": depth, "oldest_seconds": oldest}
+
+    def prune(self, older_than_days: float = JOB_RETENTION_DAYS) -> int:
+        return self._conn().execute(
+            "DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?",
+            (time.time() - older_than_days * 86400,),
+        ).rowcount
+
+
+# ---------------------- WORKER POOL ---------------------- #
+
+class WorkerPool:
+    def __init__(self, queue: JobQueue, handlers: dict, concurrency: int = 2,
+                 name: str = "jobs"):
+        self.queue = queue
+        self.handlers = handlers
+        self.concurrency = concurrency
+        self.name = name
+        self._stop = threading.Event()
+        self._threads: list[threading.Thread] = []
+        # job id -> attempts, for the jobs this pool is running right now
+        self._running: dict[str, int] = {}
+        self._running_lock = threading.Lock()
+
+    def start(self):
+        if self._threads:
+            return
+        for i in range(self.concurrency):
+            t = threading.Thread(target=self._run, name=f"{self.name}-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        t = threading.Thread(target=self._heartbeat, name=f"{self.name}-heartbeat", daemon=True)
+        t.start()
+        self._threads.append(t)
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+
+    def run_once(self) -> bool:
+        job = self.queue.claim(list(self.handlers))
+        if job is None:
+            return False
+
+        handler = self.handlers[job["kind"]]
+        with self._running_lock:
+            self._running[job["id"]] = job["attempts"]
+        with logs.context(job_id=job["id"], job_kind=job["kind"]):
+            try:
+                result = handler(**job["payload"])
+            except Exception as e:
+                status = self.queue.fail(job["id"], str(e), job["attempts"], job["max_attempts"])
+                log.warning("Job attempt failed", extra={"attempt": job["attempts"], "error": str(e),
+                                                         "status": status or "lease_lost"})
+            else:
+                if not self.queue.complete(job["id"], result, job["attempts"]):
+                    log.warning("Job finished after losing its lease", extra={"attempt": job["attempts"]})
+            finally:
+                with self._running_lock:
+                    self._running.pop(job["id"], None)
+        return True
+
+    def _heartbeat(self):
+        while not self._stop.wait(JOB_HEARTBEAT_SECONDS):
+            with self._running_lock:
+                running = list(self._running.items())
+            for job_id, attempts in running:
+                try:
+                    if not self.queue.renew(job_id, attempts):
+                        log.warning("Job lease lost", extra={"job_id": job_id, "attempt": attempts})
+                except Exception as e:
+                    log.error("Job heartbeat error", extra={"job_id": job_id, "error": str(e)})
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                if not self.run_once():
+                    self._stop.wait(JOB_POLL_SECONDS)
+            except Exception as e:
+                log.error("Job worker error", extra={"error": str(e)})
+                self._stop.wait(JOB_POLL_SECONDS)
@@ -0,0 +1,262 @@
+import os
+import sys
+import json
+import time
+import atexit
+import random
+import logging
+import datetime
+import importlib
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# ---------------------- CONFIG ---------------------- #
+# Callers only append the record to an in-memory queue; one background thread
+# formats it and writes it to stdout. Under gevent that thread is a real OS
+# thread, so a slow stdout pipe never holds up the hub (and every request).
+
+LOG_LEVEL = (os.getenv("LOG_LEVEL") or "INFO").upper()
+# "json" (one object per line) or "text" for reading locally
+LOG_FORMAT = (os.getenv("LOG_FORMAT") or "json").lower()
+# Past this many unwritten records new ones are dropped (and counted), never waited on
+LOG_QUEUE_MAX = int(os.getenv("LOG_QUEUE_MAX", "10000"))
+# Lines per minute per message text, per process; the rest are counted and
+# reported as "suppressed" on the next line that gets through
+LOG_RATE_LIMIT_PER_MINUTE = float(os.getenv("LOG_RATE_LIMIT_PER_MINUTE", "600"))
+# Fraction of routine INFO/DEBUG lines kept, by message text: "msg=rate,msg=rate"
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES") or "GHL contact found=0.1,GHL contact updated=0.1"
+LOG_EXIT_SECONDS = float(os.getenv("LOG_EXIT_SECONDS", "2"))
+
+
+def _parse_rates(spec: str) -> dict[str, float]:
+    rates = {}
+    for item in spec.split(","):
+        message, _, rate = item.rpartition("=")
+        if message.strip():
+            rates[message.strip()] = float(rate)
+    return rates
+
+
+def _native(module: str, name: str):
+    # The unpatched object when gevent has monkey-patched the module
+    monkey = sys.modules.get("gevent.monkey")
+    if monkey is not None:
+        return monkey.get_original(module, name)
+    return getattr(importlib.import_module(module), name)
+
+
+# ---------------------- CONTEXT ---------------------- #
+# Fields (request_id, job_id, record_id...) added to every line logged while
+# they are bound. Each greenlet/thread has its own; pool tasks need wrap().
+
+_context: contextvars.ContextVar = contextvars.ContextVar("log_context", default={})
+
+
+def push(**fields) -> contextvars.Token:
+    return _context.set({**_context.get(), **fields})
+
+
+def pop(token: contextvars.Token):
+    _context.reset(token)
+
+
+@contextmanager
+def context(**fields):
+    token = push(**fields)
+    try:
+        yield
+    finally:
+        pop(token)
+
+
+def current() -> dict:
+    return _context.get()
+
+
+def wrap(fn):
+    # Run fn (e.g. on a thread pool) with the caller's bound fields
+    ctx = contextvars.copy_context()
+    return lambda *args, **kwargs: ctx.run(fn, *args, **kwargs)
+
+
+# ---------------------- FORMATTERS ---------------------- #
+
+_RESERVED = set(logging.LogRecord("", 0, "", 0, "", (), None).__dict__) | {"message", "asctime", "log_context"}
+
+
+def _extra(record: logging.LogRecord) -> dict:
+    return {k: v for k, v in record.__dict__.items() if k not in _RESERVED}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc)
+                          .isoformat(timespec="milliseconds"),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "pid": record.process,
+            **getattr(record, "log_context", {}),
+            **_extra(record),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s [%(name)s] %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = {**getattr(record, "log_context", {}), **_extra(record)}
+        line = super().format(record)
+        if fields:
+            line += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        return line
+
+
+# ---------------------- HANDLER ---------------------- #
+
+class QueueLogHandler(logging.Handler):
+    # Runs in the caller: sampling, rate limiting and one non-blocking put.
+
+    def __init__(self, stream=None, formatter: logging.Formatter | None = None,
+                 max_queue: int = LOG_QUEUE_MAX,
+                 rate_per_minute: float = LOG_RATE_LIMIT_PER_MINUTE,
+                 sample_rates: dict[str, float] | None = None):
+        super().__init__()
+        self.stream = stream or sys.stdout
+        self.setFormatter(formatter or (TextFormatter() if LOG_FORMAT == "text" else JsonFormatter()))
+        self.max_queue = max_queue
+        self.rate_per_minute = rate_per_minute
+        self.sample_rates = _parse_rates(LOG_SAMPLE_RATES) if sample_rates is None else sample_rates
+        self._buckets: dict[str, list] = {}  # message -> [tokens, last refill, suppressed]
+        self._bucket_lock = threading.Lock()
+        self.counters = {"queued": 0, "written": 0, "dropped": 0, "suppressed": 0, "sampled_out": 0}
+        self._start_writer()
+
+    # ---- caller side ---- #
+
+    def _sampled_out(self, record: logging.LogRecord) -> bool:
+        rate = self.sample_rates.get(record.msg) if record.levelno < logging.WARNING else None
+        if rate is None:
+            return False
+        if random.random() >= rate:
+            self.counters["sampled_out"] += 1
+            return True
+        record.sample_rate = rate
+        return False
+
+    def _rate_limited(self, record: logging.LogRecord) -> bool:
+        # Token bucket per message text (before %-args), so one noisy call site
+        # can't crowd out the rest
+        now = time.monotonic()
+        with self._bucket_lock:
+            bucket = self._buckets.get(record.msg)
+            if bucket is None:
+                if len(self._buckets) > 10000:
+                    self._buckets.clear()
+                bucket = self._buckets[record.msg] = [self.rate_per_minute, now, 0]
+            bucket[0] = min(self.rate_per_minute, bucket[0] + (now - bucket[1]) * self.rate_per_minute / 60)
+            bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                self.counters["suppressed"] += 1
+                return True
+            bucket[0] -= 1
+            if bucket[2]:
+                record.suppressed = bucket[2]
+                bucket[2] = 0
+        return False
+
+    def emit(self, record: logging.LogRecord):
+        if self._sampled_out(record) or self._rate_limited(record):
+            return
+        if self._queue.qsize() >= self.max_queue:
+            self.counters["dropped"] += 1
+            return
+        record.log_context = _context.get()
+        self._queue.put(record)
+        self.counters["queued"] += 1
+
+    # ---- writer thread ---- #
+
+    def _start_writer(self):
+        # Native queue and thread: put() never yields to gevent, get() blocks only the writer
+        self._queue = _native("queue", "SimpleQueue")()
+        self._stopped = _native("_thread", "allocate_lock")()
+        self._stopped.acquire()
+        self._writer_pid = os.getpid()
+        _native("_thread", "start_new_thread")(self._run, ())
+
+    def _run(self):
+        while True:
+            record = self._queue.get()
+            if record is None:
+                break
+            try:
+                self.stream.write(self.format(record) + "\n")
+                self.counters["written"] += 1
+                # One flush per burst rather than per line
+                if self._queue.empty():
+                    self.stream.flush()
+            except Exception:
+                pass
+        try:
+            self.stream.flush()
+        finally:
+            self._stopped.release()
+
+    def close_writer(self, timeout: float = LOG_EXIT_SECONDS):
+        # Write what's queued, waiting at most timeout seconds
+        if self._writer_pid != os.getpid() or not self._stopped.locked():
+            return
+        self._queue.put(None)
+        self._stopped.acquire(True, timeout)
+
+    def after_fork(self):
+        # The writer thread doesn't exist in a forked child
+        self._start_writer()
+
+    def stats(self) -> dict:
+        return {**self.counters, "pending": self._queue.qsize(), "max_queue": self.max_queue,
+                "format": LOG_FORMAT}
+
+
+# ---------------------- SETUP ---------------------- #
+
+_handler: QueueLogHandler | None = None
+_setup_lock = threading.Lock()
+
+
+def setup() -> QueueLogHandler:
+    global _handler
+    if _handler is None:
+        with _setup_lock:
+            if _handler is None:
+                handler = QueueLogHandler()
+                root = logging.getLogger()
+                root.addHandler(handler)
+                root.setLevel(LOG_LEVEL)
+                os.register_at_fork(after_in_child=handler.after_fork)
+                atexit.register(flush)
+                _handler = handler
+    return _handler
+
+
+def get_logger(name: str) -> logging.Logger:
+    setup()
+    return logging.getLogger(name)
+
+
+def flush(timeout: float = LOG_EXIT_SECONDS):
+    # Process exit (atexit, gunicorn's worker_exit): drain the queue and stop the writer
+    if _handler is not None:
+        _handler.close_writer(timeout)
+
+
+def stats() -> dict:
+    return _handler.stats() if _handler else {"enabled": False}
@@ -0,0 +1,342 @@
+import os
+import json
+import time
+import fcntl
+import atexit
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+import logs
+
+log = logs.get_logger("metrics")
+
+# ---------------------- CONFIG ---------------------- #
+
+DATA_DIR = Path(os.getenv("DATA_DIR") or "data")
+METRICS_DIR = Path(os.getenv("METRICS_DIR") or DATA_DIR / "metrics")
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "5"))
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+# ---------------------- METRIC TYPES ---------------------- #
+# Each process keeps its own values in memory and periodically writes them to
+# METRICS_DIR/metrics-<pid>.json. /metrics merges every file, so counters and
+# histograms add up across gunicorn workers (and the report worker), and
+# gauges are summed over processes that are still alive.
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values: dict[tuple, object] = {}
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(label, "")) for label in self.labels)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {json.dumps(k): (list(v) if isinstance(v, list) else v) for k, v in self._values.items()}
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    @contextmanager
+    def track(self, **labels):
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: tuple = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            # [per-bucket counts..., +Inf count, sum]
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[i] += 1
+                    break
+            else:
+                entry[len(self.buckets)] += 1
+            entry[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, **labels)
+
+
+# ---------------------- REGISTRY ---------------------- #
+
+_registry: dict[str, _Metric] = {}
+_registry_lock = threading.Lock()
+
+
+def _register(metric: _Metric) -> _Metric:
+    with _registry_lock:
+        return _registry.setdefault(metric.name, metric)
+
+
+def counter(name: str, help_text: str, labels: tuple = ()) -> Counter:
+    return _register(Counter(name, help_text, labels))
+
+
+def gauge(name: str, help_text: str, labels: tuple = ()) -> Gauge:
+    return _register(Gauge(name, help_text, labels))
+
+
+def histogram(name: str, help_text: str, labels: tuple = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+    return _register(Histogram(name, help_text, labels, buckets))
+
+
+def _local_snapshot() -> dict:
+    with _registry_lock:
+        metrics = list(_registry.values())
+    return {
+        m.name: {
+            "kind": m.kind,
+            "help": m.help,
+            "labels": list(m.labels),
+            "buckets": list(getattr(m, "buckets", ())),
+            "values": m.snapshot(),
+        }
+        for m in metrics
+    }
+
+
+# ---------------------- MULTI-PROCESS FILES ---------------------- #
+
+_flusher = None
+_flusher_pid = None
+
+
+def _pid_file(pid: int) -> Path:
+    return METRICS_DIR / f"metrics-{pid}.json"
+
+
+def flush():
+    METRICS_DIR.mkdir(parents=True, exist_ok=True)
+    path = _pid_file(os.getpid())
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(_local_snapshot()))
+    os.replace(tmp, path)
+
+
+def start_flusher(interval: float = METRICS_FLUSH_SECONDS):
+    global _flusher, _flusher_pid
+    if _flusher is not None and _flusher_pid == os.getpid():
+        return
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                flush()
+            except Exception as e:
+                log.error("Metrics flush failed", extra={"error": str(e)})
+
+    _flusher_pid = os.getpid()
+    _flusher = threading.Thread(target=run, name="metrics-flush", daemon=True)
+    _flusher.start()
+    atexit.register(flush)
+
+
+def _after_fork_in_child():
+    # A forked worker (gunicorn --preload) would otherwise re-report the
+    # parent's values under its own pid, and the flusher thread didn't survive
+    global _flusher
+    with _registry_lock:
+        for m in _registry.values():
+            m._lock = threading.Lock()
+            m._values.clear()
+    if _flusher is not None:
+        _flusher = None
+        start_flusher()
+
+
+os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+
+def _merge(into: dict, snap: dict, include_gauges: bool = True):
+    for name, m in snap.items():
+        if m["kind"] == "gauge" and not include_gauges:
+            continue
+        target = into.setdefault(name, {**m, "values": {}})
+        for key, value in m["values"].items():
+            if isinstance(value, list):
+                current = target["values"].get(key)
+                target["values"][key] = value if current is None else [a + b for a, b in zip(current, value)]
+            else:
+                target["values"][key] = target["values"].get(key, 0) + value
+
+
+def _fold_dead_workers():
+    # Counters from exited workers are folded into one archive file so totals
+    # never go backwards and the directory doesn't grow with every restart.
+    archive_path = METRICS_DIR / "metrics-archive.json"
+    with open(METRICS_DIR / ".lock", "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        archive = json.loads(archive_path.read_text()) if archive_path.exists() else {}
+        changed = False
+        for path in METRICS_DIR.glob("metrics-*.json"):
+            pid = path.stem.split("-", 1)[1]
+            if not pid.isdigit() or _alive(int(pid)):
+                continue
+            try:
+                _merge(archive, json.loads(path.read_text()), include_gauges=False)
+            except (OSError, ValueError):
+                pass
+            path.unlink(missing_ok=True)
+            changed = True
+        if changed:
+            archive_path.write_text(json.dumps(archive))
+
+
+def collect() -> dict:
+    METRICS_DIR.mkdir(parents=True, exist_ok=True)
+    _fold_dead_workers()
+
+    merged: dict = {}
+    me = os.getpid()
+    for path in METRICS_DIR.glob("metrics-*.json"):
+        pid = path.stem.split("-", 1)[1]
+        if pid == str(me):
+            continue  # use the live in-memory values instead
+        try:
+            _merge(merged, json.loads(path.read_text()), include_gauges=pid.isdigit())
+        except (OSError, ValueError):
+            continue
+    _merge(merged, _local_snapshot())
+    return merged
+
+
+# ---------------------- EXPOSITION ---------------------- #
+
+def _fmt_labels(names: list, values: list, extra: str = "") -> str:
+    parts = [f'{n}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+             for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def render_prometheus() -> str:
+    lines = []
+    for name, m in sorted(collect().items()):
+        lines.append(f"# HELP {name} {m['help']}")
+        lines.append(f"# TYPE {name} {m['kind']}")
+        for key, value in sorted(m["values"].items()):
+            label_values = json.loads(key)
+            if m["kind"] == "histogram":
+                cumulative = 0
+                for bound, count in zip(m["buckets"] + ["+Inf"], value[:-1]):
+                    cumulative += count
+                    le = f'le="{bound}"'
+                    lines.append(f"{name}_bucket{_fmt_labels(m['labels'], label_values, le)} {cumulative}")
+                lines.append(f"{name}_sum{_fmt_labels(m['labels'], label_values)} {value[-1]}")
+                lines.append(f"{name}_count{_fmt_labels(m['labels'], label_values)} {cumulative}")
+            else:
+                lines.append(f"{name}{_fmt_labels(m['labels'], label_values)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+# ---------------------- SHARED INSTRUMENTS ---------------------- #
+
+UPSTREAM_LATENCY = histogram(
+    "upstream_request_duration_seconds",
+    "Latency of calls to Airtable, GHL and OpenAI",
+    ("upstream", "operation"),
+)
+UPSTREAM_ERRORS = counter(
+    "upstream_errors_total",
+    "Failed upstream calls by status code (or 'exception')",
+    ("upstream", "operation", "status"),
+)
+UPSTREAM_IN_FLIGHT = gauge(
+    "upstream_in_flight",
+    "Upstream calls currently waiting on the network",
+    ("upstream",),
+)
+STAGE_LATENCY = histogram(
+    "pipeline_stage_duration_seconds",
+    "Latency of submit and report pipeline stages",
+    ("pipeline", "stage"),
+)
+STAGE_IN_FLIGHT = gauge(
+    "pipeline_in_flight",
+    "Pipeline runs currently executing",
+    ("pipeline",),
+)
+
+
+@contextmanager
+def track_upstream(upstream: str, operation: str):
+    # Yields a dict; set result["status"] to record the response status code
+    result = {}
+    t0 = time.perf_counter()
+    UPSTREAM_IN_FLIGHT.inc(upstream=upstream)
+    try:
+        yield result
+    except Exception as e:
+        # SDK errors (openai.APIStatusError) carry the HTTP status
+        status = getattr(e, "status_code", None) or "exception"
+        UPSTREAM_ERRORS.inc(upstream=upstream, operation=operation, status=str(status))
+        raise
+    finally:
+        UPSTREAM_IN_FLIGHT.dec(upstream=upstream)
+        UPSTREAM_LATENCY.observe(time.perf_counter() - t0, upstream=upstream, operation=operation)
+    status = result.get("status")
+    if status is not None and status >= 400:
+        UPSTREAM_ERRORS.inc(upstream=upstream, operation=operation, status=str(status))
@@ -0,0 +1,126 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+
+import logs
+
+log = logs.get_logger("operator_directory")
+
+# ---------------------- CONFIG ---------------------- #
+
+OPERATOR_CACHE_TTL = float(os.getenv("OPERATOR_CACHE_TTL", "600"))
+OPERATOR_CACHE_MAX_ENTRIES = int(os.getenv("OPERATOR_CACHE_MAX_ENTRIES", "5000"))
+
+OPERATOR_FIELDS = ["GHL User ID", "Legacy Code", "Email"]
+
+
+def _formula_str(value: str) -> str:
+    # Same quoting as app.py / reports.py
+    return "'" + str(value).replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+
+# ---------------------- DIRECTORY ---------------------- #
+
+class OperatorDirectory:
+    # In-process copy of the Users table keyed by GHL User ID.
+    # fetch(params) must return one decoded Airtable list-records page.
+
+    def __init__(self, fetch, ttl: float = OPERATOR_CACHE_TTL,
+                 max_entries: int = OPERATOR_CACHE_MAX_ENTRIES):
+        self.fetch = fetch
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple] = OrderedDict()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self.loaded_at = None
+        self.counters = {"hits": 0, "misses": 0, "refreshes": 0, "refresh_errors": 0}
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="operator-directory", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                self.counters["refresh_errors"] += 1
+                log.error("Operator directory refresh failed", extra={"error": str(e)})
+            self._wake.wait(self.ttl)
+            self._wake.clear()
+
+    # ---- loading ---- #
+
+    @staticmethod
+    def _entry(fields: dict) -> tuple:
+        return fields.get("Legacy Code"), fields.get("Email")
+
+    def refresh(self):
+        entries: OrderedDict[str, tuple] = OrderedDict()
+        offset = None
+        while True:
+            params = [("pageSize", 100)] + [("fields[]", f) for f in OPERATOR_FIELDS]
+            if offset:
+                params.append(("offset", offset))
+            page = self.fetch(params)
+            for rec in page.get("records", []):
+                fields = rec.get("fields", {})
+                user_id = fields.get("GHL User ID")
+                if user_id and len(entries) < self.max_entries:
+                    entries[user_id] = self._entry(fields)
+            offset = page.get("offset")
+            if not offset:
+                break
+
+        with self._lock:
+            self._entries = entries
+            self.loaded_at = time.time()
+        self.counters["refreshes"] += 1
+
+    def _fetch_one(self, ghl_user_id: str) -> tuple:
+        formula = f"{{GHL User ID}} = {_formula_str(ghl_user_id)}"
+        page = self.fetch([("filterByFormula", formula), ("maxRecords", 1)]
+                          + [("fields[]", f) for f in OPERATOR_FIELDS])
+        records = page.get("records") or []
+        if records:
+            return self._entry(records[0].get("fields", {}))
+        return None, None
+
+    # ---- lookups ---- #
+
+    def get(self, ghl_user_id: str) -> tuple:
+        with self._lock:
+            entry = self._entries.get(ghl_user_id)
+            if entry is not None:
+                self._entries.move_to_end(ghl_user_id)
+                self.counters["hits"] += 1
+                return entry
+            self.counters["misses"] += 1
+
+        # Misses are cached too (as (None, None)) until the next full refresh
+        entry = self._fetch_one(ghl_user_id)
+        with self._lock:
+            self._entries[ghl_user_id] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, ghl_user_id: str | None = None):
+        with self._lock:
+            if ghl_user_id is None:
+                self._entries.clear()
+                self.loaded_at = None
+            else:
+                self._entries.pop(ghl_user_id, None)
+        if ghl_user_id is None and self._thread is not None:
+            self._wake.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = len(self._entries)
+        age = time.time() - self.loaded_at if self.loaded_at else None
+        return {**self.counters, "size": size, "max_entries": self.max_entries, "age_seconds": age}
@@ -0,0 +1,170 @@
+import os
+import asyncio
+import threading
+from pathlib import Path
+
+# ---------------------- CONFIG ---------------------- #
+
+# Pages rendered at once inside the shared browser
+PDF_RENDER_CONCURRENCY = int(os.getenv("REPORTS_PDF_CONCURRENCY", "2"))
+# Relaunch Chromium after this many jobs, or once its processes pass this RSS
+PDF_BROWSER_MAX_JOBS = int(os.getenv("PDF_BROWSER_MAX_JOBS", "200"))
+PDF_BROWSER_MAX_RSS_MB = float(os.getenv("PDF_BROWSER_MAX_RSS_MB", "600"))
+PDF_RENDER_TIMEOUT_SECONDS = float(os.getenv("PDF_RENDER_TIMEOUT_SECONDS", "60"))
+
+
+def _children_rss_mb() -> float:
+    # Resident memory of every descendant process (Chromium and its helpers).
+    # Linux-only; elsewhere this reports 0 and only the job limit applies.
+    try:
+        parents = {}
+        rss = {}
+        page_kb = os.sysconf("SC_PAGE_SIZE") / 1024
+        for pid in os.listdir("/proc"):
+            if not pid.isdigit():
+                continue
+            try:
+                with open(f"/proc/{pid}/stat") as fh:
+                    fields = fh.read().rsplit(")", 1)[1].split()
+            except OSError:
+                continue
+            parents[int(pid)] = int(fields[1])
+            rss[int(pid)] = int(fields[21]) * page_kb / 1024
+
+        me = os.getpid()
+        total, frontier = 0.0, {me}
+        while frontier:
+            frontier = {pid for pid, ppid in parents.items() if ppid in frontier}
+            total += sum(rss[pid] for pid in frontier)
+        return total
+    except (OSError, ValueError, IndexError):
+        return 0.0
+
+
+# ---------------------- RENDERER ---------------------- #
+
+class PdfRenderer:
+    # Playwright objects are bound to the event loop that created them, so the
+    # browser lives on one background thread with its own loop and callers
+    # hand jobs over with run_coroutine_threadsafe. Every job gets a fresh
+    # browser context, so nothing leaks between prospects.
+
+    def __init__(self, concurrency: int = PDF_RENDER_CONCURRENCY,
+                 max_jobs: int = PDF_BROWSER_MAX_JOBS,
+                 max_rss_mb: float = PDF_BROWSER_MAX_RSS_MB):
+        self.concurrency = concurrency
+        self.max_jobs = max_jobs
+        self.max_rss_mb = max_rss_mb
+        self._loop = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._playwright = None
+        self._browser = None
+        self._slots = None
+        self._recycle_lock = None
+        self._in_flight = 0
+        self._jobs_since_launch = 0
+        self.counters = {"jobs": 0, "errors": 0, "launches": 0, "recycles": 0}
+
+    # ---- lifecycle ---- #
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=self._loop.run_forever, name="pdf-renderer", daemon=True)
+            self._thread.start()
+            asyncio.run_coroutine_threadsafe(self._setup(), self._loop).result()
+
+    async def _setup(self):
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._recycle_lock = asyncio.Lock()
+        # Imported here so loading reports.py doesn't pull in Playwright
+        from playwright.async_api import async_playwright
+
+        self._playwright = await async_playwright().start()
+
+    async def _browser_ready(self):
+        async with self._recycle_lock:
+            if self._browser is not None and self._needs_recycle():
+                # New jobs queue on the lock while the current ones finish
+                while self._in_flight:
+                    await asyncio.sleep(0.05)
+                await self._browser.close()
+                self._browser = None
+                self.counters["recycles"] += 1
+            if self._browser is None or not self._browser.is_connected():
+                self._browser = await self._playwright.chromium.launch()
+                self._jobs_since_launch = 0
+                self.counters["launches"] += 1
+            return self._browser
+
+    def _needs_recycle(self) -> bool:
+        if self._jobs_since_launch >= self.max_jobs:
+            return True
+        return bool(self.max_rss_mb) and _children_rss_mb() > self.max_rss_mb
+
+    def close(self):
+        if self._loop is None:
+            return
+
+        async def shutdown():
+            if self._browser is not None:
+                await self._browser.close()
+            if self._playwright is not None:
+                await self._playwright.stop()
+
+        asyncio.run_coroutine_threadsafe(shutdown(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(5)
+        self._loop = self._thread = self._browser = self._playwright = None
+
+    # ---- rendering ---- #
+
+    async def _render(self, html: str, output_path: Path):
+        async with self._slots:
+            browser = await self._browser_ready()
+            self._in_flight += 1
+            try:
+                context = await browser.new_context()
+                try:
+                    page = await context.new_page()
+                    # The HTML is self-contained, so there is no network to wait for
+                    await page.set_content(html, wait_until="load")
+                    await page.pdf(path=str(output_path), format="A4", print_background=True)
+                finally:
+                    await context.close()
+            finally:
+                self._in_flight -= 1
+                self._jobs_since_launch += 1
+
+    def render_many(self, jobs: list[tuple[str, Path]],
+                    timeout: float = PDF_RENDER_TIMEOUT_SECONDS):
+        self._ensure_started()
+        for _, output_path in jobs:
+            output_path.parent.mkdir(parents=True, exist_ok=True)
+
+        futures = [asyncio.run_coroutine_threadsafe(self._render(html, path), self._loop)
+                   for html, path in jobs]
+        try:
+            for f in futures:
+                f.result(timeout)
+            self.counters["jobs"] += len(jobs)
+        except Exception:
+            self.counters["errors"] += 1
+            for f in futures:
+                f.cancel()
+            raise
+
+    def render(self, html: str, output_path: Path, timeout: float = PDF_RENDER_TIMEOUT_SECONDS):
+        self.render_many([(html, output_path)], timeout)
+
+    def stats(self) -> dict:
+        return {**self.counters, "jobs_since_launch": self._jobs_since_launch,
+                "in_flight": self._in_flight, "browser_up": self._browser is not None}
+
+
+renderer = PdfRenderer()
@@ -0,0 +1,138 @@
+import os
+import json
+import time
+import fcntl
+import threading
+import urllib.parse
+from pathlib import Path
+
+# ---------------------- CONFIG ---------------------- #
+
+DATA_DIR = Path(os.getenv("DATA_DIR") or "data")
+RATE_LIMIT_DIR = Path(os.getenv("RATE_LIMIT_DIR") or DATA_DIR / "ratelimit")
+
+# Airtable allows 5 requests/second per base, and asks for a 30 s pause after a 429
+AIRTABLE_RATE_LIMIT_RPS = float(os.getenv("AIRTABLE_RATE_LIMIT_RPS", "5"))
+AIRTABLE_RATE_LIMIT_BURST = float(os.getenv("AIRTABLE_RATE_LIMIT_BURST", "2"))
+AIRTABLE_429_PAUSE_SECONDS = float(os.getenv("AIRTABLE_429_PAUSE_SECONDS", "30"))
+
+# Callers that would have to queue longer than this get RateLimitTimeout instead
+RATE_LIMIT_MAX_WAIT_SECONDS = float(os.getenv("RATE_LIMIT_MAX_WAIT_SECONDS", "60"))
+
+
+class RateLimitTimeout(Exception):
+    pass
+
+
+# ---------------------- TOKEN BUCKET ---------------------- #
+
+class FileTokenBucket:
+    # Token bucket whose state lives in a small file guarded by flock, so every
+    # gunicorn worker on the box draws from the same budget.
+    #
+    # Callers reserve a token up front and the balance may go negative; each
+    # caller then sleeps for its own deficit. That makes waiting FIFO in order
+    # of arrival instead of a retry free-for-all.
+
+    def __init__(self, path: Path, rate: float, burst: float):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.rate = rate
+        self.burst = burst
+        self._local_lock = threading.Lock()
+        self.counters = {"acquired": 0, "waited": 0, "wait_seconds": 0.0,
+                         "max_wait_seconds": 0.0, "penalties": 0, "timeouts": 0}
+
+    def _update(self, fn):
+        with self._local_lock, open(self.path, "a+") as fh:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                fh.seek(0)
+                raw = fh.read()
+                now = time.time()
+                state = json.loads(raw) if raw else {"tokens": self.burst, "ts": now, "blocked_until": 0}
+                # Refill since the last update, never above the burst size
+                state["tokens"] = min(self.burst, state["tokens"] + (now - state["ts"]) * self.rate)
+                state["ts"] = now
+                result = fn(state, now)
+                fh.seek(0)
+                fh.truncate()
+                fh.write(json.dumps(state))
+                fh.flush()
+                return result
+            finally:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def reserve(self, max_wait: float = RATE_LIMIT_MAX_WAIT_SECONDS) -> float:
+        def take(state, now):
+            blocked = max(state["blocked_until"] - now, 0)
+            wait = max(blocked, (1 - state["tokens"]) / self.rate if state["tokens"] < 1 else 0)
+            if wait > max_wait:
+                return None
+            state["tokens"] -= 1
+            return wait
+
+        wait = self._update(take)
+        if wait is None:
+            self.counters["timeouts"] += 1
+            raise RateLimitTimeout(f"rate limit queue for {self.path.name} exceeds {max_wait:.0f}s")
+        return wait
+
+    def acquire(self, max_wait: float = RATE_LIMIT_MAX_WAIT_SECONDS) -> float:
+        wait = self.reserve(max_wait)
+        if wait > 0:
+            time.sleep(wait)
+            self.counters["waited"] += 1
+            self.counters["wait_seconds"] += wait
+            self.counters["max_wait_seconds"] = max(self.counters["max_wait_seconds"], wait)
+        self.counters["acquired"] += 1
+        return wait
+
+    def penalize(self, seconds: float):
+        def block(state, now):
+            state["blocked_until"] = max(state["blocked_until"], now + seconds)
+            state["tokens"] = min(state["tokens"], 0)
+
+        self._update(block)
+        self.counters["penalties"] += 1
+
+    def stats(self) -> dict:
+        return {**self.counters, "rate": self.rate, "burst": self.burst}
+
+
+# ---------------------- AIRTABLE ---------------------- #
+
+class AirtableRateLimiter:
+    # One bucket per Airtable base, picked from /v0/{base}/... in the URL
+
+    def __init__(self, rate: float = AIRTABLE_RATE_LIMIT_RPS, burst: float = AIRTABLE_RATE_LIMIT_BURST,
+                 pause: float = AIRTABLE_429_PAUSE_SECONDS):
+        self.rate = rate
+        self.burst = burst
+        self.pause = pause
+        self._buckets: dict[str, FileTokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, url: str) -> FileTokenBucket:
+        parts = [p for p in urllib.parse.urlsplit(url).path.split("/") if p]
+        base = parts[1] if len(parts) > 1 else "default"
+        with self._lock:
+            if base not in self._buckets:
+                self._buckets[base] = FileTokenBucket(
+                    RATE_LIMIT_DIR / f"airtable-{base}.bucket", self.rate, self.burst
+                )
+            return self._buckets[base]
+
+    def acquire(self, url: str, max_wait: float = RATE_LIMIT_MAX_WAIT_SECONDS) -> float:
+        return self.bucket(url).acquire(max(max_wait, 0))
+
+    def penalize(self, url: str, retry_after: str | None = None):
+        try:
+            seconds = float(retry_after) if retry_after else self.pause
+        except ValueError:
+            seconds = self.pause
+        self.bucket(url).penalize(seconds)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {base: b.stats() for base, b in self._buckets.items()}
@@ -0,0 +1,178 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+
+import metrics
+
+# ---------------------- CONFIG ---------------------- #
+
+DATA_DIR = Path(os.getenv("DATA_DIR") or "data")
+
+REPORT_CACHE_PATH = Path(os.getenv("REPORT_CACHE_PATH") or DATA_DIR / "report_cache.sqlite3")
+REPORT_CACHE_MAX_AGE_DAYS = float(os.getenv("REPORT_CACHE_MAX_AGE_DAYS", "30"))
+REPORT_CACHE_MAX_MB = float(os.getenv("REPORT_CACHE_MAX_MB", "200"))
+REPORT_CACHE_ENABLED = (os.getenv("REPORT_CACHE_ENABLED") or "1") not in ("0", "false", "no")
+
+
+CACHE_EVENTS = metrics.counter(
+    "report_cache_events_total",
+    "Report text cache hits, misses, bypasses, writes and evictions",
+    ("event",),
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS completions (
+    key         TEXT PRIMARY KEY,
+    text        TEXT NOT NULL,
+    size        INTEGER NOT NULL,
+    created_at  REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS completions_accessed ON completions (accessed_at);
+"""
+
+
+def cache_key(model: str, temperature: float, messages: list[dict]) -> str:
+    payload = json.dumps(
+        {"model": model, "temperature": temperature, "messages": messages},
+        sort_keys=True, ensure_ascii=False, separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# ---------------------- CACHE ---------------------- #
+
+class ReportCache:
+    # Completed model output keyed by a hash of everything that determines it.
+    # Entries older than max_age are dropped; past max_bytes the least
+    # recently used entries go first.
+
+    def __init__(self, path: Path | str = REPORT_CACHE_PATH,
+                 max_age_days: float = REPORT_CACHE_MAX_AGE_DAYS,
+                 max_mb: float = REPORT_CACHE_MAX_MB):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_age = max_age_days * 86400
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._local = threading.local()
+        self.counters = {"hits": 0, "misses": 0, "bypassed": 0, "writes": 0, "evictions": 0}
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def count(self, event: str, n: int = 1):
+        # Per-process numbers for /health, summed across processes on /metrics
+        self.counters[event] += n
+        if n:
+            CACHE_EVENTS.inc(n, event=event)
+
+    def get(self, key: str) -> str | None:
+        now = time.time()
+        row = self._conn().execute(
+            "SELECT text, created_at FROM completions WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or now - row[1] > self.max_age:
+            self.count("misses")
+            return None
+        self._conn().execute("UPDATE completions SET accessed_at = ? WHERE key = ?", (now, key))
+        self.count("hits")
+        return row[0]
+
+    def put(self, key: str, text: str):
+        now = time.time()
+        self._conn().execute(
+            "INSERT OR REPLACE INTO completions (key, text, size, created_at, accessed_at)"
+            " VALUES (?, ?, ?, ?, ?)",
+            (key, text, len(text.encode("utf-8")), now, now),
+        )
+        self.count("writes")
+        self.evict()
+
+    # ---- incremental writes (streaming generation) ---- #
+    # A streamed completion is built under a private key and only becomes
+    # visible to get() once commit() renames it, so a broken stream never
+    # leaves a truncated report in the cache.
+
+    @staticmethod
+    def _partial(key: str) -> str:
+        return f"{key}:partial"
+
+    def begin(self, key: str):
+        now = time.time()
+        self._conn().execute(
+            "INSERT OR REPLACE INTO completions (key, text, size, created_at, accessed_at)"
+            " VALUES (?, '', 0, ?, ?)",
+            (self._partial(key), now, now),
+        )
+
+    def append(self, key: str, text: str):
+        self._conn().execute(
+            "UPDATE completions SET text = text || ?, size = size + ? WHERE key = ?",
+            (text, len(text.encode("utf-8")), self._partial(key)),
+        )
+
+    def commit(self, key: str):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+        conn.execute("UPDATE completions SET key = ? WHERE key = ?", (key, self._partial(key)))
+        conn.execute("COMMIT")
+        self.count("writes")
+        self.evict()
+
+    def abort(self, key: str):
+        self._conn().execute("DELETE FROM completions WHERE key = ?", (self._partial(key),))
+
+    def evict(self):
+        conn = self._conn()
+        removed = conn.execute(
+            "DELETE FROM completions WHERE created_at < ?", (time.time() - self.max_age,)
+        ).rowcount
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM completions").fetchone()[0]
+        if total > self.max_bytes:
+            for key, size in conn.execute(
+                "SELECT key, size FROM completions ORDER BY accessed_at"
+            ).fetchall():
+                conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+                removed += 1
+                total -= size
+                if total <= self.max_bytes:
+                    break
+        self.count("evictions", removed)
+
+    def stats(self) -> dict:
+        entries, size = self._conn().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM completions"
+        ).fetchone()
+        lookups = self.counters["hits"] + self.counters["misses"]
+        return {
+            **self.counters,
+            "hit_rate": round(self.counters["hits"] / lookups, 3) if lookups else None,
+            "entries": entries,
+            "bytes": size,
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> ReportCache | None:
+    global _cache
+    if not REPORT_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ReportCache()
+    return _cache
@@ -0,0 +1,50 @@
+import os
+import threading
+
+from jobs import JobQueue
+
+# ---------------------- CONFIG ---------------------- #
+# Enqueue side of report generation; report_worker.py runs the jobs. Kept
+# free of OpenAI/Playwright imports so the web process can use it.
+
+REPORT_JOB_KIND = "report"
+REPORT_JOB_MAX_ATTEMPTS = int(os.getenv("REPORT_JOB_MAX_ATTEMPTS", "4"))
+
+# Fresh submissions jump ahead of backfills and manual re-runs
+REPORT_PRIORITY_FRESH = 10
+REPORT_PRIORITY_BACKFILL = 0
+REPORT_PRIORITIES = {"fresh": REPORT_PRIORITY_FRESH, "backfill": REPORT_PRIORITY_BACKFILL}
+
+# Queue a report automatically after every successful /submit
+REPORTS_AUTO_ENQUEUE = (os.getenv("REPORTS_AUTO_ENQUEUE") or "0") in ("1", "true", "yes")
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_report_queue() -> JobQueue:
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue()
+    return _queue
+
+
+def enqueue_report(prospect_email: str | None = None,
+                   legacy_code: str | None = None,
+                   force_regenerate: bool = False,
+                   priority: int = REPORT_PRIORITY_BACKFILL) -> tuple[str, bool]:
+    # -> (job_id, created); a pending job for the same prospect is reused
+    payload = {
+        "prospect_email": prospect_email,
+        "legacy_code": legacy_code,
+        "force_regenerate": force_regenerate,
+    }
+    return get_report_queue().enqueue_once(
+        REPORT_JOB_KIND, payload, priority=priority, max_attempts=REPORT_JOB_MAX_ATTEMPTS
+    )
+
+
+def report_queue_stats() -> dict:
+    return get_report_queue().stats([REPORT_JOB_KIND])
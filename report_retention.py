@@ -0,0 +1,85 @@
+import os
+import time
+import threading
+from pathlib import Path
+
+import logs
+
+log = logs.get_logger("report_retention")
+
+# ---------------------- CONFIG ---------------------- #
+
+REPORTS_DIR = Path(os.getenv("REPORTS_DIR") or "reports")
+REPORTS_MAX_AGE_DAYS = float(os.getenv("REPORTS_MAX_AGE_DAYS", "30"))
+REPORTS_MAX_TOTAL_MB = float(os.getenv("REPORTS_MAX_TOTAL_MB", "1024"))
+REPORTS_RETENTION_INTERVAL_SECONDS = float(os.getenv("REPORTS_RETENTION_INTERVAL_SECONDS", "3600"))
+
+
+# ---------------------- PRUNING ---------------------- #
+
+def prune_reports(reports_dir: Path = REPORTS_DIR,
+                  max_age_days: float = REPORTS_MAX_AGE_DAYS,
+                  max_total_mb: float = REPORTS_MAX_TOTAL_MB) -> dict:
+    # Drop PDFs older than max_age_days, then the oldest ones until the
+    # directory fits in max_total_mb. Safe to run from several workers at once.
+    stats = {"removed_age": 0, "removed_budget": 0, "freed_bytes": 0, "kept": 0, "kept_bytes": 0}
+    if not reports_dir.is_dir():
+        return stats
+
+    files = []
+    for path in reports_dir.glob("*.pdf"):
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            continue
+        files.append((st.st_mtime, st.st_size, path))
+    files.sort()
+
+    def remove(path: Path, size: int, reason: str):
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            return
+        stats[reason] += 1
+        stats["freed_bytes"] += size
+
+    cutoff = time.time() - max_age_days * 86400
+    kept = []
+    for mtime, size, path in files:
+        if mtime < cutoff:
+            remove(path, size, "removed_age")
+        else:
+            kept.append((mtime, size, path))
+
+    budget = max_total_mb * 1024 * 1024
+    total = sum(size for _, size, _ in kept)
+    while kept and total > budget:
+        _, size, path = kept.pop(0)
+        remove(path, size, "removed_budget")
+        total -= size
+
+    stats["kept"] = len(kept)
+    stats["kept_bytes"] = total
+    return stats
+
+
+_thread = None
+
+
+def start_retention_thread(interval: float = REPORTS_RETENTION_INTERVAL_SECONDS):
+    global _thread
+    if _thread is not None:
+        return
+
+    def run():
+        while True:
+            try:
+                stats = prune_reports()
+                if stats["removed_age"] or stats["removed_budget"]:
+                    log.info("Reports pruned", extra=stats)
+            except Exception as e:
+                log.error("Report retention failed", extra={"error": str(e)})
+            time.sleep(interval)
+
+    _thread = threading.Thread(target=run, name="report-retention", daemon=True)
+    _thread.start()
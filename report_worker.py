@@ -0,0 +1,110 @@
+"""
+Runs queued report jobs (see report_jobs.py) outside the web process.
+
+    python report_worker.py
+
+gunicorn.conf.py starts one next to the web workers so both share DATA_DIR;
+run it by hand only on a host that sees the same DATA_DIR.
+
+Resource limits, all per worker process:
+    REPORT_WORKER_CONCURRENCY   reports in progress at once (default 2)
+    REPORTS_OPENAI_CONCURRENCY  concurrent OpenAI calls (reports.py)
+    REPORTS_PDF_CONCURRENCY     Chromium pages (pdf_renderer.py)
+    AIRTABLE_RATE_LIMIT_RPS     Airtable requests, shared with the web workers
+"""
+import os
+import time
+import signal
+import threading
+
+import metrics
+import reports
+import airtable_outbox
+import logs
+from jobs import WorkerPool
+from pdf_renderer import renderer
+from report_jobs import REPORT_JOB_KIND, get_report_queue
+from survey_mirror import get_mirror
+
+log = logs.get_logger("report_worker")
+
+# ---------------------- CONFIG ---------------------- #
+
+REPORT_WORKER_CONCURRENCY = int(os.getenv("REPORT_WORKER_CONCURRENCY", "2"))
+REPORT_WORKER_STATS_SECONDS = float(os.getenv("REPORT_WORKER_STATS_SECONDS", "15"))
+
+QUEUE_DEPTH = metrics.gauge(
+    "report_queue_depth", "Report jobs by status", ("status",)
+)
+QUEUE_OLDEST = metrics.gauge(
+    "report_queue_oldest_seconds", "Age of the oldest queued/running report job", ("status",)
+)
+
+
+class ReportFailed(Exception):
+    pass
+
+
+def run_report_job(prospect_email: str | None = None,
+                   legacy_code: str | None = None,
+                   force_regenerate: bool = False) -> dict:
+    result = reports.generate_reports_for_email_or_legacy_code(
+        prospect_email=prospect_email,
+        legacy_code=legacy_code,
+        force_regenerate=force_regenerate,
+    )
+    # A missing row won't appear by retrying; anything else (model, PDF) might
+    if not result.get("ok") and result.get("reason") != "no_record":
+        raise ReportFailed(result.get("reason") or "error")
+    return result
+
+
+def publish_queue_stats(queue) -> dict:
+    stats = queue.stats([REPORT_JOB_KIND])
+    for status in ("queued", "running", "done", "failed"):
+        QUEUE_DEPTH.set(stats["depth"].get(status, 0), status=status)
+    for status in ("queued", "running"):
+        QUEUE_OLDEST.set(stats["oldest_seconds"].get(status, 0), status=status)
+    return stats
+
+
+def main():
+    queue = get_report_queue()
+    pool = WorkerPool(queue, {REPORT_JOB_KIND: run_report_job},
+                      concurrency=REPORT_WORKER_CONCURRENCY, name="report")
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+
+    metrics.start_flusher()
+    pool.start()
+    if get_mirror():
+        get_mirror().start()
+    if airtable_outbox.get_outbox():
+        airtable_outbox.get_outbox().start()
+    # Load the OpenAI SDK in the background so the first job doesn't wait on it
+    threading.Thread(target=reports.get_openai_client, name="openai-warmup", daemon=True).start()
+    log.info("Report worker started", extra={"concurrency": REPORT_WORKER_CONCURRENCY})
+
+    last_prune = 0.0
+    while not stop.is_set():
+        try:
+            stats = publish_queue_stats(queue)
+            if stats["depth"].get("queued") or stats["depth"].get("running"):
+                log.info("Report queue", extra=stats)
+            if time.time() - last_prune > 3600:
+                queue.prune()
+                last_prune = time.time()
+        except Exception as e:
+            log.error("Report queue stats failed", extra={"error": str(e)})
+        stop.wait(REPORT_WORKER_STATS_SECONDS)
+
+    log.info("Report worker stopping")
+    pool.stop(timeout=30)
+    airtable_outbox.flush_on_exit()
+    renderer.close()
+    metrics.flush()
+
+
+if __name__ == "__main__":
+    main()
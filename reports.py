@@ -1,28 +1,31 @@
 import os
 import json
+import time
+import queue
 import datetime
+import functools
+import threading
 import urllib.parse
+from contextlib import contextmanager
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
 
-import requests
-from playwright.sync_api import sync_playwright
+import admission
+import http_client
+import logs
+import metrics
+from airtable_outbox import get_outbox
+from pdf_renderer import renderer
+from report_cache import cache_key, get_cache
+from survey_mirror import get_mirror
 
-# AGGRESSIVE proxy removal - remove EVERYTHING proxy-related
-import os as _os
-for key in list(_os.environ.keys()):
-    if 'proxy' in key.lower() or 'PROXY' in key:
-        del _os.environ[key]
-
-# Set NO_PROXY to prevent any proxy usage
-_os.environ['NO_PROXY'] = '*'
-_os.environ['no_proxy'] = '*'
-
-from openai import OpenAI
+log = logs.get_logger("reports")
 
 # ---------------------- CONFIG ---------------------- #
 
 AIRTABLE_API_KEY = os.getenv("AIRTABLE_API_KEY")
 AIRTABLE_BASE_ID = os.getenv("AIRTABLE_BASE_ID")
+AIRTABLE_API_URL = os.getenv("AIRTABLE_API_URL") or "https://api.airtable.com/v0"
 
 SURVEY_TABLE = os.getenv("AIRTABLE_PROSPECTS_TABLE") or "Survey Responses"
 
@@ -30,13 +33,67 @@ PUBLIC_BASE_URL = os.getenv("PUBLIC_BASE_URL")
 
 OPENAI_MODEL = os.getenv("OPENAI_MODEL") or "gpt-4o-mini"
 
-# Force simple initialization
-try:
-    client = OpenAI()  # Let it use OPENAI_API_KEY env var directly
-except Exception as e:
-    print(f"Warning: OpenAI init issue: {e}")
-    # Fallback - import without client if needed
-    client = None
+# Per-process cap on concurrent OpenAI calls; Chromium pages are capped by
+# REPORTS_PDF_CONCURRENCY inside pdf_renderer
+REPORTS_OPENAI_CONCURRENCY = int(os.getenv("REPORTS_OPENAI_CONCURRENCY", "4"))
+OPENAI_CALL_TIMEOUT_SECONDS = float(os.getenv("OPENAI_CALL_TIMEOUT_SECONDS", "90"))
+# How long call_openai_many lets a call wait for a slot before giving up on it
+OPENAI_QUEUE_WAIT_SECONDS = float(os.getenv("OPENAI_QUEUE_WAIT_SECONDS", "60"))
+# Typical report length, used only to turn streamed characters into a progress %
+REPORT_EXPECTED_CHARS = int(os.getenv("REPORT_EXPECTED_CHARS", "5000"))
+
+# Rows fetched by one find_survey_row call to rank email/code matches locally
+SURVEY_LOOKUP_MAX_RECORDS = int(os.getenv("SURVEY_LOOKUP_MAX_RECORDS", "20"))
+# Keys per OR formula in find_survey_rows; keeps the URL well under Airtable's limit
+SURVEY_LOOKUP_BATCH_KEYS = int(os.getenv("SURVEY_LOOKUP_BATCH_KEYS", "50"))
+
+class ModelError(Exception):
+    # A generation that produced no usable text; the report is not rendered
+    pass
+
+
+_openai_slots = threading.BoundedSemaphore(REPORTS_OPENAI_CONCURRENCY)
+_openai_pool = ThreadPoolExecutor(max_workers=REPORTS_OPENAI_CONCURRENCY, thread_name_prefix="openai")
+
+# The OpenAI SDK takes most of a second to import, so the client is built on
+# first use; processes that never call the model never pay for it.
+_client = None
+_client_ready = False
+_client_lock = threading.Lock()
+
+
+def get_openai_client():
+    global _client, _client_ready
+    if _client_ready:
+        return _client
+    with _client_lock:
+        if _client_ready:
+            return _client
+
+        # AGGRESSIVE proxy removal - remove EVERYTHING proxy-related
+        for key in list(os.environ.keys()):
+            if 'proxy' in key.lower() or 'PROXY' in key:
+                del os.environ[key]
+
+        # Set NO_PROXY to prevent any proxy usage
+        os.environ['NO_PROXY'] = '*'
+        os.environ['no_proxy'] = '*'
+
+        # Force simple initialization
+        try:
+            from openai import OpenAI
+
+            _openai_cfg = http_client.SERVICES["openai"]
+            _client = OpenAI(  # Let it use OPENAI_API_KEY env var directly
+                timeout=_openai_cfg["read_timeout"],
+                max_retries=_openai_cfg["retries"],
+            )
+        except Exception as e:
+            log.warning("OpenAI client init failed", extra={"error": str(e)})
+            # Fallback - import without client if needed
+            _client = None
+        _client_ready = True
+    return _client
 
 
 def _airtable_headers():
@@ -47,7 +104,7 @@ def _airtable_headers():
 
 
 def _airtable_url(table: str, record_id: str | None = None, params: dict | None = None) -> str:
-    base = f"https://api.airtable.com/v0/{AIRTABLE_BASE_ID}/{urllib.parse.quote(table)}"
+    base = f"{AIRTABLE_API_URL}/{AIRTABLE_BASE_ID}/{urllib.parse.quote(table)}"
     if record_id:
         return f"{base}/{record_id}"
     if params:
@@ -57,38 +114,120 @@ def _airtable_url(table: str, record_id: str | None = None, params: dict | None
 
 # ---------------------- AIRTABLE LOOKUP ---------------------- #
 
+def _formula_str(value: str) -> str:
+    return "'" + str(value).replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+
+def _match_rank(record: dict, prospect_email: str | None, legacy_code: str | None) -> tuple:
+    # Same precedence the old one-query-per-key lookup had: both keys > email > code
+    fields = record.get("fields", {})
+    email_hit = bool(prospect_email) and fields.get("Prospect Email") == prospect_email
+    code_hit = bool(legacy_code) and fields.get("Legacy Code") == legacy_code
+    return (email_hit and code_hit, email_hit, code_hit)
+
+
 def find_survey_row(prospect_email: str | None = None,
                     legacy_code: str | None = None) -> dict | None:
     if not prospect_email and not legacy_code:
-        print("⚠️ find_survey_row: no email or legacy_code provided.")
+        log.warning("find_survey_row called without email or legacy_code")
         return None
 
-    formulas = []
+    mirror = get_mirror()
+    if mirror:
+        try:
+            record = mirror.find(prospect_email, legacy_code)
+            if record:
+                return record
+        except Exception as e:
+            log.warning("Survey mirror lookup failed", extra={"error": str(e)})
 
-    if prospect_email and legacy_code:
-        formulas.append(f"AND({{Prospect Email}} = '{prospect_email}', {{Legacy Code}} = '{legacy_code}')")
+    # One request for every candidate row; the best match is picked locally
+    clauses = []
     if prospect_email:
-        formulas.append(f"{{Prospect Email}} = '{prospect_email}'")
+        clauses.append(f"{{Prospect Email}} = {_formula_str(prospect_email)}")
     if legacy_code:
-        formulas.append(f"{{Legacy Code}} = '{legacy_code}'")
+        clauses.append(f"{{Legacy Code}} = {_formula_str(legacy_code)}")
+    formula = clauses[0] if len(clauses) == 1 else f"OR({', '.join(clauses)})"
 
-    for formula in formulas:
-        url = _airtable_url(
-            SURVEY_TABLE,
-            params={"filterByFormula": formula, "maxRecords": 1, "pageSize": 1},
-        )
+    url = _airtable_url(
+        SURVEY_TABLE,
+        params={"filterByFormula": formula, "maxRecords": SURVEY_LOOKUP_MAX_RECORDS,
+                "pageSize": SURVEY_LOOKUP_MAX_RECORDS},
+    )
+    try:
+        r = http_client.airtable.get(url, headers=_airtable_headers(), op="find_survey_row")
+        r.raise_for_status()
+        records = r.json().get("records", [])
+    except Exception as e:
+        log.error("Airtable survey lookup failed", extra={"formula": formula, "error": str(e)})
+        records = []
+
+    if records:
+        # max() keeps the first of equally good rows, i.e. Airtable's order
+        best = max(records, key=lambda rec: _match_rank(rec, prospect_email, legacy_code))
+        if mirror:
+            mirror.write_through(best)
+        return best
+
+    log.info("No Survey Responses row for keys", extra={"email": prospect_email, "legacy_code": legacy_code})
+    return None
+
+
+def find_survey_rows(prospect_emails=(), legacy_codes=()) -> dict[str, dict]:
+    # Bulk form of find_survey_row: -> {email or legacy code: record} for the
+    # keys that were found. Mirror first, then a few paginated OR queries.
+    wanted = {"Prospect Email": set(filter(None, prospect_emails)),
+              "Legacy Code": set(filter(None, legacy_codes))}
+    found: dict[str, dict] = {}
+
+    mirror = get_mirror()
+    if mirror:
         try:
-            r = requests.get(url, headers=_airtable_headers(), timeout=20)
-            r.raise_for_status()
-            data = r.json()
-            records = data.get("records", [])
-            if records:
-                return records[0]
+            found.update(mirror.find_many(wanted["Prospect Email"], wanted["Legacy Code"]))
         except Exception as e:
-            print(f"❌ Airtable lookup error with formula [{formula}]: {e}")
+            log.warning("Survey mirror lookup failed", extra={"error": str(e)})
+
+    clauses = [f"{{{field}}} = {_formula_str(key)}"
+               for field, keys in wanted.items() for key in sorted(keys) if key not in found]
+    for i in range(0, len(clauses), SURVEY_LOOKUP_BATCH_KEYS):
+        chunk = clauses[i:i + SURVEY_LOOKUP_BATCH_KEYS]
+        formula = chunk[0] if len(chunk) == 1 else f"OR({', '.join(chunk)})"
+        pulled = []
+        for record in iter_survey_rows(formula):
+            pulled.append(record)
+            fields = record.get("fields", {})
+            for field, keys in wanted.items():
+                key = fields.get(field)
+                # First row per key wins, as in the single lookup
+                if key in keys and key not in found:
+                    found[key] = record
+        if mirror and pulled:
+            mirror.write_through({"records": pulled})
+
+    return found
+
+
+def iter_survey_rows(formula: str | None = None, page_size: int = 100,
+                     fields: list[str] | None = None):
+    offset = None
+    while True:
+        params = [("pageSize", page_size)]
+        if formula:
+            params.append(("filterByFormula", formula))
+        for f in fields or []:
+            params.append(("fields[]", f))
+        if offset:
+            params.append(("offset", offset))
+
+        r = http_client.airtable.get(_airtable_url(SURVEY_TABLE, params=params), headers=_airtable_headers(),
+                                     op="list_survey_rows")
+        r.raise_for_status()
+        data = r.json()
+        yield from data.get("records", [])
 
-    print("⚠️ No Survey Responses row found for given keys.")
-    return None
+        offset = data.get("offset")
+        if not offset:
+            return
 
 
 def extract_q_block(fields: dict) -> dict:
@@ -106,23 +245,173 @@ def extract_q_block(fields: dict) -> dict:
     return q_data
 
 
+@contextmanager
+def _stage(stage: str):
+    # /metrics histogram plus one log line per stage, tagged with the record/job being built
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - t0
+        metrics.STAGE_LATENCY.observe(elapsed, pipeline="report", stage=stage)
+        log.info("Report stage finished", extra={"stage": stage, "duration_ms": round(elapsed * 1000, 1)})
+
+
 # ---------------------- OPENAI HELPERS ---------------------- #
 
-def call_openai(messages: list[dict], temperature: float = 0.7) -> str:
+def call_openai(messages: list[dict], temperature: float = 0.7,
+                timeout: float | None = None, use_cache: bool = True, on_start=None,
+                retries: int | None = None) -> str:
+    # use_cache=False skips the lookup (forced regeneration) but still stores
+    # the fresh result for the next run. on_start() fires once the call holds
+    # its slots and goes out to the model; raising from it aborts the call.
+    # retries overrides the client's max_retries. Raises ModelError on failure.
+    cache = get_cache()
+    key = cache_key(OPENAI_MODEL, temperature, messages)
+    if cache:
+        if use_cache:
+            cached = cache.get(key)
+            if cached is not None:
+                return cached
+        else:
+            cache.count("bypassed")
+
+    client = get_openai_client()
     if not client:
-        print("❌ OpenAI client not initialized")
-        return "Report generation failed. (Client initialization error.)"
-    
+        log.error("OpenAI client not initialized")
+        raise ModelError("client initialization error")
+    if retries is not None:
+        client = client.with_options(max_retries=retries)
+
     try:
-        resp = client.chat.completions.create(
-            model=OPENAI_MODEL,
-            messages=messages,
-            temperature=temperature,
-        )
-        return resp.choices[0].message.content.strip()
+        # Per-process cap, then the box-wide one shared with other report processes
+        with _openai_slots, admission.admit("openai"), metrics.track_upstream("openai", "chat_completion"):
+            if on_start:
+                on_start()
+            resp = client.chat.completions.create(
+                model=OPENAI_MODEL,
+                messages=messages,
+                temperature=temperature,
+                timeout=timeout or OPENAI_CALL_TIMEOUT_SECONDS,
+            )
+        text = resp.choices[0].message.content.strip()
+    except admission.Overloaded:
+        # Fail the report job so it's retried later, rather than render an error PDF
+        raise
     except Exception as e:
-        print(f"❌ OpenAI error: {e}")
-        return "Report generation failed. (Model error.)"
+        log.error("OpenAI call failed", extra={"error": str(e)})
+        raise ModelError(str(e)) from e
+
+    if cache:
+        cache.put(key, text)
+    return text
+
+
+def call_openai_many(calls: list[tuple[list[dict], float]],
+                     timeout: float | None = None, use_cache: bool = True) -> list[str | None]:
+    # Runs independent generations side by side; total wall time is roughly the
+    # slowest call. Concurrency across the whole process is capped by
+    # REPORTS_OPENAI_CONCURRENCY. A failed or timed-out call comes back as None.
+    timeout = timeout or OPENAI_CALL_TIMEOUT_SECONDS
+    started = {}
+    abandoned = set()
+
+    def on_start(i):
+        # A call we already gave up on frees its slot instead of running
+        if i in abandoned:
+            raise ModelError("abandoned while waiting for a slot")
+        started[i] = time.monotonic()
+
+    # No SDK retries: a timed-out call ends at its timeout and frees its slot
+    futures = [
+        _openai_pool.submit(logs.wrap(call_openai), messages, temperature, timeout, use_cache,
+                            functools.partial(on_start, i), 0)
+        for i, (messages, temperature) in enumerate(calls)
+    ]
+
+    # Each call gets its timeout (plus slack) from the moment it starts; time
+    # queued behind other calls doesn't count against it, but the batch as a
+    # whole stops waiting OPENAI_QUEUE_WAIT_SECONDS after that
+    give_up_at = time.monotonic() + OPENAI_QUEUE_WAIT_SECONDS + timeout + 5
+    results = []
+    for i, f in enumerate(futures):
+        while True:
+            start = started.get(i)
+            until = give_up_at if start is None else min(start + timeout + 5, give_up_at)
+            try:
+                results.append(f.result(max(until - time.monotonic(), 0)))
+            except FuturesTimeout:
+                if start is None and i in started:
+                    continue  # started while we waited; its own timeout applies now
+                abandoned.add(i)
+                f.cancel()
+                log.error("OpenAI call timed out",
+                          extra={"timeout_seconds": timeout, "started": start is not None})
+                results.append(None)
+            except ModelError:
+                results.append(None)
+            break
+    return results
+
+
+def stream_openai_sections(messages: list[dict], temperature: float = 0.7,
+                           timeout: float | None = None, use_cache: bool = True):
+    # Yields the completion one finished section (blank-line separated block)
+    # at a time while tokens are still arriving; only the section being
+    # written is buffered.
+    cache = get_cache()
+    key = cache_key(OPENAI_MODEL, temperature, messages)
+    if cache:
+        if use_cache:
+            cached = cache.get(key)
+            if cached is not None:
+                yield from (p for p in cached.split("\n\n") if p.strip())
+                return
+        else:
+            cache.count("bypassed")
+
+    client = get_openai_client()
+    if not client:
+        log.error("OpenAI client not initialized")
+        raise ModelError("client initialization error")
+
+    buffer = ""
+    first = True
+    try:
+        with _openai_slots, admission.admit("openai"), \
+                metrics.track_upstream("openai", "chat_completion_stream"):
+            stream = client.chat.completions.create(
+                model=OPENAI_MODEL,
+                messages=messages,
+                temperature=temperature,
+                timeout=timeout or OPENAI_CALL_TIMEOUT_SECONDS,
+                stream=True,
+            )
+            if cache:
+                cache.begin(key)
+            for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if not delta:
+                    continue
+                buffer += delta
+                while "\n\n" in buffer:
+                    section, buffer = buffer.split("\n\n", 1)
+                    if section.strip():
+                        if cache:
+                            cache.append(key, ("" if first else "\n\n") + section.strip())
+                        first = False
+                        yield section
+        if buffer.strip():
+            if cache:
+                cache.append(key, ("" if first else "\n\n") + buffer.strip())
+            yield buffer
+        if cache:
+            cache.commit(key)
+    except Exception as e:
+        log.error("OpenAI call failed", extra={"error": str(e)})
+        if cache:
+            cache.abort(key)
+        raise ModelError(str(e)) from e
 
 
 def build_prospect_prompt(meta: dict, q_data: dict) -> list[dict]:
@@ -274,25 +563,21 @@ def html_shell(title: str, legacy_code: str | None, body_html: str) -> str:
     )
 
 
+def markdownish_section_to_html(section: str) -> str:
+    p = section.strip()
+    if p.startswith("# "):
+        return f"<h2>{p[2:].strip()}</h2>"
+    return f"<p>{p}</p>"
+
+
 def markdownish_to_html(text: str) -> str:
     paragraphs = [p.strip() for p in text.split("\n\n") if p.strip()]
-    html_parts = []
-    for p in paragraphs:
-        if p.startswith("# "):
-            html_parts.append(f"<h2>{p[2:].strip()}</h2>")
-        else:
-            html_parts.append(f"<p>{p}</p>")
-    return "\n".join(html_parts)
+    return "\n".join(markdownish_section_to_html(p) for p in paragraphs)
 
 
 def html_to_pdf(html: str, output_path: Path):
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    with sync_playwright() as p:
-        browser = p.chromium.launch()
-        page = browser.new_page()
-        page.set_content(html, wait_until="networkidle")
-        page.pdf(path=str(output_path), format="A4", print_background=True)
-        browser.close()
+    # Rendered in the long-lived shared browser; see pdf_renderer.py
+    renderer.render(html, output_path)
 
 
 # ---------------------- ATTACH TO AIRTABLE ---------------------- #
@@ -301,8 +586,8 @@ def attach_pdfs_to_airtable(record_id: str,
                             prospect_pdf_url: str | None,
                             coach_pdf_url: str | None):
     if not (prospect_pdf_url or coach_pdf_url):
-        print("⚠️ No PDF URLs to attach.")
-        return
+        log.warning("No PDF URLs to attach", extra={"record_id": record_id})
+        return False
 
     fields = {}
     if prospect_pdf_url:
@@ -311,31 +596,48 @@ def attach_pdfs_to_airtable(record_id: str,
         fields["Consultation Briefing PDF"] = [{"url": coach_pdf_url}]
 
     try:
-        r = requests.patch(
+        mirror = get_mirror()
+        outbox = get_outbox()
+        if outbox:
+            # Sent within AIRTABLE_OUTBOX_FLUSH_SECONDS, batched with other writes
+            outbox.queue(SURVEY_TABLE, record_id, fields)
+            if mirror:
+                mirror.apply_fields(record_id, fields)
+            log.info("PDF attachment queued", extra={"record_id": record_id})
+            return True
+
+        r = http_client.airtable.patch(
             _airtable_url(SURVEY_TABLE, record_id),
             headers=_airtable_headers(),
             json={"fields": fields},
-            timeout=20,
+            idempotent=True,
+            op="attach_pdfs",
         )
         r.raise_for_status()
-        print(f"✅ Attached PDFs to Airtable record {record_id}")
+        if mirror:
+            mirror.write_through(r.json())
+        log.info("PDFs attached", extra={"record_id": record_id})
+        return True
     except Exception as e:
-        print(f"❌ Failed to attach PDFs to Airtable: {e}")
+        log.error("PDF attach failed", extra={"record_id": record_id, "error": str(e)})
+        return False
 
 
 # ---------------------- PUBLIC ENTRYPOINT ---------------------- #
 
 def generate_reports_for_email_or_legacy_code(prospect_email: str | None = None,
                                               legacy_code: str | None = None,
-                                              public_base_url: str | None = None) -> dict:
-    result = {"ok": False, "reason": None}
-
-    record = find_survey_row(prospect_email, legacy_code)
+                                              public_base_url: str | None = None,
+                                              force_regenerate: bool = False) -> dict:
+    with _stage("lookup"):
+        record = find_survey_row(prospect_email, legacy_code)
     if not record:
-        result["reason"] = "no_record"
-        return result
+        return {"ok": False, "reason": "no_record"}
+
+    return generate_reports_for_record(record, legacy_code, public_base_url, force_regenerate)
 
-    record_id = record["id"]
+
+def _prepare_report(record: dict, legacy_code: str | None) -> dict:
     fields = record.get("fields", {})
 
     legacy_code_val = fields.get("Legacy Code") or legacy_code
@@ -348,14 +650,21 @@ def generate_reports_for_email_or_legacy_code(prospect_email: str | None = None,
 
     q_data = extract_q_block(fields)
 
-    prospect_messages = build_prospect_prompt(meta, q_data)
-    coach_messages = build_coach_prompt(meta, q_data)
+    return {
+        "record_id": record["id"],
+        "legacy_code": legacy_code_val,
+        "prospect_email": fields.get("Prospect Email"),
+        "prospect_messages": build_prospect_prompt(meta, q_data),
+        "coach_messages": build_coach_prompt(meta, q_data),
+    }
 
-    prospect_text = call_openai(prospect_messages, temperature=0.65)
-    coach_text = call_openai(coach_messages, temperature=0.55)
 
-    prospect_html_body = markdownish_to_html(prospect_text)
-    coach_html_body = markdownish_to_html(coach_text)
+def _finish_report(prep: dict, prospect_html_body: str, coach_html_body: str,
+                   public_base_url: str | None = None, on_stage=None) -> dict:
+    on_stage = on_stage or (lambda stage, **info: None)
+    result = {"ok": False, "reason": None}
+    record_id = prep["record_id"]
+    legacy_code_val = prep["legacy_code"]
 
     prospect_html = html_shell("90-Day Business Blueprint", legacy_code_val, prospect_html_body)
     coach_html = html_shell("Consultation Briefing", legacy_code_val, coach_html_body)
@@ -363,6 +672,7 @@ def generate_reports_for_email_or_legacy_code(prospect_email: str | None = None,
     reports_dir = Path(os.getenv("REPORTS_DIR") or "reports")
     timestamp = datetime.datetime.utcnow().strftime("%Y%m%d-%H%M%S")
 
+    prospect_email = prep["prospect_email"]
     safe_suffix = legacy_code_val or (prospect_email or "prospect").replace("@", "_at_")
     safe_suffix = "".join(c for c in safe_suffix if c.isalnum() or c in ("-", "_"))
 
@@ -372,30 +682,143 @@ def generate_reports_for_email_or_legacy_code(prospect_email: str | None = None,
     prospect_pdf_path = reports_dir / prospect_pdf_name
     coach_pdf_path = reports_dir / coach_pdf_name
 
+    on_stage("rendering_pdf")
     try:
-        html_to_pdf(prospect_html, prospect_pdf_path)
-        html_to_pdf(coach_html, coach_pdf_path)
+        with _stage("pdf_render"):
+            renderer.render_many([
+                (prospect_html, prospect_pdf_path),
+                (coach_html, coach_pdf_path),
+            ])
     except Exception as e:
-        print(f"❌ PDF generation error: {e}")
+        log.error("PDF render failed", extra={"error": str(e)})
         result["reason"] = "pdf_error"
         return result
+    on_stage("pdf_ready", prospect_pdf=prospect_pdf_name, coach_pdf=coach_pdf_name)
 
     base_url = (public_base_url or PUBLIC_BASE_URL or "").rstrip("/")
     if base_url:
         prospect_url = f"{base_url}/reports/{prospect_pdf_name}"
         coach_url = f"{base_url}/reports/{coach_pdf_name}"
     else:
-        print("⚠️ No PUBLIC_BASE_URL set; PDFs will not be attached.")
+        log.warning("No PUBLIC_BASE_URL set; PDFs will not be attached")
         prospect_url = coach_url = None
 
-    attach_pdfs_to_airtable(record_id, prospect_url, coach_url)
+    with _stage("attach"):
+        attached = attach_pdfs_to_airtable(record_id, prospect_url, coach_url)
+    on_stage("attached" if attached else "not_attached")
 
     result.update(
         {
             "ok": True,
+            "attached": attached,
             "record_id": record_id,
             "prospect_pdf": prospect_pdf_name,
             "coach_pdf": coach_pdf_name,
         }
     )
     return result
+
+
+def generate_reports_for_record(record: dict,
+                                legacy_code: str | None = None,
+                                public_base_url: str | None = None,
+                                force_regenerate: bool = False) -> dict:
+    with logs.context(record_id=record["id"]), metrics.STAGE_IN_FLIGHT.track(pipeline="report"), \
+            _stage("total"):
+        prep = _prepare_report(record, legacy_code)
+
+        # Unchanged answers hit the text cache, so a retry after a PDF or attach
+        # failure skips the model calls entirely
+        with _stage("generate_text"):
+            prospect_text, coach_text = call_openai_many([
+                (prep["prospect_messages"], 0.65),
+                (prep["coach_messages"], 0.55),
+            ], use_cache=not force_regenerate)
+        if prospect_text is None or coach_text is None:
+            # Nothing rendered or attached; the job (or batch) retries it
+            return {"ok": False, "reason": "model_error", "record_id": prep["record_id"]}
+
+        return _finish_report(
+            prep,
+            markdownish_to_html(prospect_text),
+            markdownish_to_html(coach_text),
+            public_base_url,
+        )
+
+
+# ---------------------- STREAMING ENTRYPOINT ---------------------- #
+
+def generate_reports_streaming(prospect_email: str | None = None,
+                               legacy_code: str | None = None,
+                               public_base_url: str | None = None,
+                               force_regenerate: bool = False):
+    # Same pipeline as generate_reports_for_email_or_legacy_code, but yields
+    # progress events as it goes: {"stage": ..., ...}. Both generations
+    # stream side by side; each finished section is converted to HTML and
+    # sent straight away.
+    yield {"stage": "lookup"}
+    with _stage("lookup"):
+        record = find_survey_row(prospect_email, legacy_code)
+    if not record:
+        yield {"stage": "done", "ok": False, "reason": "no_record"}
+        return
+
+    prep = _prepare_report(record, legacy_code)
+    events: queue.Queue = queue.Queue()
+    # Sections go to the client as they arrive, but bodies still holds the
+    # full HTML of both documents until the end: the PDFs are rendered from
+    # the complete text, so peak memory per report is not reduced by streaming
+    bodies = {"prospect": [], "coach": []}
+    failed = []
+
+    def run_stream(doc: str, messages: list[dict], temperature: float):
+        chars = 0
+        try:
+            for section in stream_openai_sections(messages, temperature, use_cache=not force_regenerate):
+                html_part = markdownish_section_to_html(section)
+                bodies[doc].append(html_part)
+                chars += len(section)
+                pct = min(99, int(chars * 100 / REPORT_EXPECTED_CHARS))
+                events.put({"stage": f"{doc}_text", "pct": pct, "html": html_part})
+            events.put({"stage": f"{doc}_text", "pct": 100})
+        except ModelError:
+            failed.append(doc)
+        finally:
+            events.put(None)
+
+    _openai_pool.submit(logs.wrap(run_stream), "prospect", prep["prospect_messages"], 0.65)
+    _openai_pool.submit(logs.wrap(run_stream), "coach", prep["coach_messages"], 0.55)
+
+    pending = 2
+    while pending:
+        event = events.get()
+        if event is None:
+            pending -= 1
+            continue
+        yield event
+
+    if failed:
+        yield {"stage": "done", "ok": False, "reason": "model_error", "record_id": prep["record_id"]}
+        return
+
+    # PDF render + attach run on a helper thread so their stages are reported live
+    def finish():
+        try:
+            result = _finish_report(
+                prep,
+                "\n".join(bodies["prospect"]),
+                "\n".join(bodies["coach"]),
+                public_base_url,
+                on_stage=lambda stage, **info: events.put({"stage": stage, **info}),
+            )
+        except Exception as e:
+            log.error("Report finish failed", extra={"error": str(e)}, exc_info=True)
+            result = {"ok": False, "reason": "error"}
+        events.put({"stage": "done", **result})
+
+    threading.Thread(target=logs.wrap(finish), name="report-finish", daemon=True).start()
+    while True:
+        event = events.get()
+        yield event
+        if event["stage"] == "done":
+            return
@@ -0,0 +1,384 @@
+"""
+Local SQLite copy of the Survey Responses table.
+
+    python survey_mirror.py            # pull rows modified since the last sync
+    python survey_mirror.py --full     # re-read the whole table, drop deleted rows
+    python survey_mirror.py --stats
+
+Every process that imports it keeps the mirror current in the background:
+incremental pulls filtered on LAST_MODIFIED_TIME(), plus write-through of
+the records Airtable returns from our own PATCHes. Only one process pulls
+at a time (a lease row in the same database), and its pages are spaced out
+(SURVEY_MIRROR_MAX_PAGES_PER_SECOND) so live requests keep most of the
+Airtable rate limit.
+
+Lookups serve a mirrored row only while it is fresher than
+SURVEY_MIRROR_MAX_STALENESS_SECONDS; misses always fall through to Airtable.
+Deleted rows only disappear on a full resync.
+"""
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import datetime
+import threading
+import urllib.parse
+from pathlib import Path
+
+import http_client
+import logs
+
+log = logs.get_logger("survey_mirror")
+
+# ---------------------- CONFIG ---------------------- #
+
+DATA_DIR = Path(os.getenv("DATA_DIR") or "data")
+
+AIRTABLE_API_KEY = os.getenv("AIRTABLE_API_KEY")
+AIRTABLE_BASE_ID = os.getenv("AIRTABLE_BASE_ID")
+AIRTABLE_API_URL = os.getenv("AIRTABLE_API_URL") or "https://api.airtable.com/v0"
+SURVEY_TABLE = os.getenv("AIRTABLE_PROSPECTS_TABLE") or "Survey Responses"
+
+SURVEY_MIRROR_PATH = Path(os.getenv("SURVEY_MIRROR_PATH") or DATA_DIR / "survey_mirror.sqlite3")
+SURVEY_MIRROR_ENABLED = (os.getenv("SURVEY_MIRROR_ENABLED") or "1") not in ("0", "false", "no")
+# How often some process pulls changed rows
+SURVEY_MIRROR_SYNC_SECONDS = float(os.getenv("SURVEY_MIRROR_SYNC_SECONDS", "60"))
+# Rows not confirmed by a pull or write-through for this long are not served
+SURVEY_MIRROR_MAX_STALENESS_SECONDS = float(os.getenv("SURVEY_MIRROR_MAX_STALENESS_SECONDS", "900"))
+# Each incremental pull reaches back this far to cover clock skew and rows
+# that changed while the previous pull was paging
+SURVEY_MIRROR_OVERLAP_SECONDS = float(os.getenv("SURVEY_MIRROR_OVERLAP_SECONDS", "120"))
+SURVEY_MIRROR_FULL_SYNC_HOURS = float(os.getenv("SURVEY_MIRROR_FULL_SYNC_HOURS", "24"))
+# Pulls share the Airtable bucket with live traffic; pages are spaced so a sync
+# takes at most this many requests/second (1 of the default 5), however big the table
+SURVEY_MIRROR_MAX_PAGES_PER_SECOND = float(os.getenv("SURVEY_MIRROR_MAX_PAGES_PER_SECOND", "1"))
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    id           TEXT PRIMARY KEY,
+    email        TEXT,
+    legacy_code  TEXT,
+    created_time TEXT,
+    fields       TEXT NOT NULL,
+    synced_at    REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS records_email ON records (email);
+CREATE INDEX IF NOT EXISTS records_legacy_code ON records (legacy_code);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+"""
+
+
+def _airtable_headers():
+    return {
+        "Authorization": f"Bearer {AIRTABLE_API_KEY}",
+        "Content-Type": "application/json",
+    }
+
+
+def _airtable_url(params) -> str:
+    base = f"{AIRTABLE_API_URL}/{AIRTABLE_BASE_ID}/{urllib.parse.quote(SURVEY_TABLE)}"
+    return f"{base}?{urllib.parse.urlencode(params)}"
+
+
+def _fetch_page(params) -> dict:
+    r = http_client.airtable.get(_airtable_url(params), headers=_airtable_headers(), op="mirror_sync")
+    r.raise_for_status()
+    return r.json()
+
+
+def _iso(ts: float) -> str:
+    dt = datetime.datetime.fromtimestamp(ts, datetime.timezone.utc)
+    return dt.strftime("%Y-%m-%dT%H:%M:%S.") + f"{dt.microsecond // 1000:03d}Z"
+
+
+# ---------------------- MIRROR ---------------------- #
+
+class SurveyMirror:
+    # fetch(params) must return one decoded Airtable list-records page
+
+    def __init__(self, path: Path | str = SURVEY_MIRROR_PATH, fetch=_fetch_page,
+                 max_staleness: float = SURVEY_MIRROR_MAX_STALENESS_SECONDS):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.fetch = fetch
+        self.max_staleness = max_staleness
+        self._local = threading.local()
+        self._thread = None
+        self.counters = {"hits": 0, "misses": 0, "stale": 0, "written_through": 0,
+                         "syncs": 0, "full_syncs": 0, "rows_pulled": 0, "sync_errors": 0}
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # Airtable is the source of truth; losing the last commits only
+            # means re-pulling them
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _meta(self, key: str) -> float | None:
+        row = self._conn().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value: float):
+        self._conn().execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    # ---- writes ---- #
+
+    def store(self, records: list[dict], synced_at: float | None = None):
+        # Full records as Airtable returns them from list, get and PATCH
+        synced_at = synced_at or time.time()
+        rows = []
+        for rec in records:
+            if not rec or "id" not in rec:
+                continue
+            fields = rec.get("fields", {})
+            rows.append((rec["id"], fields.get("Prospect Email"), fields.get("Legacy Code"),
+                         rec.get("createdTime"), json.dumps(fields), synced_at))
+        if rows:
+            self._conn().executemany(
+                "INSERT OR REPLACE INTO records (id, email, legacy_code, created_time, fields, synced_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+        return len(rows)
+
+    def write_through(self, response_json: dict):
+        # Body of a PATCH/upsert response: one record or {"records": [...]}
+        try:
+            records = response_json.get("records") or [response_json]
+            self.counters["written_through"] += self.store(records)
+        except Exception as e:
+            log.warning("Survey mirror write-through failed", extra={"error": str(e)})
+
+    def apply_fields(self, record_id: str, fields: dict):
+        # A write we've queued but not sent yet (airtable_outbox.py); readers
+        # see it now, and the next pull or write-through confirms it
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT fields FROM records WHERE id = ?", (record_id,)).fetchone()
+            if row:
+                merged = {**json.loads(row[0]), **fields}
+                conn.execute(
+                    "UPDATE records SET fields = ?, email = ?, legacy_code = ? WHERE id = ?",
+                    (json.dumps(merged), merged.get("Prospect Email"), merged.get("Legacy Code"), record_id),
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    # ---- lookups ---- #
+
+    def find(self, prospect_email: str | None = None, legacy_code: str | None = None) -> dict | None:
+        # Same precedence as the Airtable lookup: both keys, then email, then code
+        clauses = []
+        if prospect_email and legacy_code:
+            clauses.append(("email = ? AND legacy_code = ?", (prospect_email, legacy_code)))
+        if prospect_email:
+            clauses.append(("email = ?", (prospect_email,)))
+        if legacy_code:
+            clauses.append(("legacy_code = ?", (legacy_code,)))
+
+        last_sync = self._meta("last_sync_at") or 0
+        for where, args in clauses:
+            row = self._conn().execute(
+                f"SELECT id, created_time, fields, synced_at FROM records WHERE {where}"
+                " ORDER BY created_time, id LIMIT 1",
+                args,
+            ).fetchone()
+            if row is None:
+                continue
+            rec_id, created_time, fields, synced_at = row
+            if time.time() - max(synced_at, last_sync) > self.max_staleness:
+                self.counters["stale"] += 1
+                return None
+            self.counters["hits"] += 1
+            return {"id": rec_id, "createdTime": created_time, "fields": json.loads(fields)}
+
+        self.counters["misses"] += 1
+        return None
+
+    def find_many(self, emails, legacy_codes) -> dict[str, dict]:
+        # -> {email or legacy code: record} for fresh rows; first row per key wins
+        found: dict[str, dict] = {}
+        seen: set[str] = set()
+        cutoff = time.time() - self.max_staleness
+        fresh_sync = (self._meta("last_sync_at") or 0) >= cutoff
+        for column, keys in (("email", list(emails)), ("legacy_code", list(legacy_codes))):
+            # Stay under SQLite's bound-parameter limit
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                rows = self._conn().execute(
+                    f"SELECT id, created_time, fields, synced_at, {column} FROM records"
+                    f" WHERE {column} IN ({', '.join('?' * len(chunk))}) ORDER BY created_time, id",
+                    chunk,
+                ).fetchall()
+                for rec_id, created_time, fields, synced_at, key in rows:
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    if fresh_sync or synced_at >= cutoff:
+                        found[key] = {"id": rec_id, "createdTime": created_time, "fields": json.loads(fields)}
+        self.counters["hits"] += len(found)
+        self.counters["stale"] += len(seen) - len(found)
+        self.counters["misses"] += len(set(emails)) + len(set(legacy_codes)) - len(seen)
+        return found
+
+    # ---- syncing ---- #
+
+    def _claim_sync(self, lease: float) -> bool:
+        # One puller across all processes; a crashed one loses the lease after `lease` seconds
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            held_until = self._meta("sync_lease_until") or 0
+            if held_until > now:
+                conn.execute("COMMIT")
+                return False
+            self._set_meta("sync_lease_until", now + lease)
+            conn.execute("COMMIT")
+            return True
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _release_sync(self):
+        self._set_meta("sync_lease_until", 0)
+
+    def _pull(self, formula: str | None, started: float, lease: float) -> int:
+        pulled = 0
+        offset = None
+        interval = 1 / SURVEY_MIRROR_MAX_PAGES_PER_SECOND if SURVEY_MIRROR_MAX_PAGES_PER_SECOND > 0 else 0
+        while True:
+            page_started = time.monotonic()
+            params = [("pageSize", 100)]
+            if formula:
+                params.append(("filterByFormula", formula))
+            if offset:
+                params.append(("offset", offset))
+            page = self.fetch(params)
+            pulled += self.store(page.get("records", []), synced_at=started)
+            offset = page.get("offset")
+            if not offset:
+                return pulled
+            # A paced full sync can outlast the lease; keep it while pages arrive
+            self._set_meta("sync_lease_until", time.time() + lease)
+            time.sleep(max(interval - (time.monotonic() - page_started), 0))
+
+    def sync(self, full: bool = False, lease: float = 600) -> dict | None:
+        # -> summary, or None when another process is already pulling
+        if not self._claim_sync(lease):
+            return None
+        started = time.time()
+        try:
+            since = self._meta("watermark")
+            full = full or since is None
+            formula = None
+            if not full:
+                since -= SURVEY_MIRROR_OVERLAP_SECONDS
+                formula = f"IS_AFTER(LAST_MODIFIED_TIME(), DATETIME_PARSE('{_iso(since)}'))"
+
+            pulled = self._pull(formula, started, lease)
+
+            removed = 0
+            if full:
+                # Anything neither pulled nor written through since we started is gone upstream
+                removed = self._conn().execute(
+                    "DELETE FROM records WHERE synced_at < ?", (started,)
+                ).rowcount
+                self._set_meta("last_full_sync_at", started)
+                self.counters["full_syncs"] += 1
+
+            self._set_meta("watermark", started)
+            self._set_meta("last_sync_at", started)
+            self.counters["syncs"] += 1
+            self.counters["rows_pulled"] += pulled
+            return {"full": full, "pulled": pulled, "removed": removed,
+                    "seconds": round(time.time() - started, 2)}
+        finally:
+            self._release_sync()
+
+    def maybe_sync(self) -> dict | None:
+        now = time.time()
+        last_sync = self._meta("last_sync_at") or 0
+        if now - last_sync < SURVEY_MIRROR_SYNC_SECONDS:
+            return None
+        last_full = self._meta("last_full_sync_at") or 0
+        return self.sync(full=now - last_full > SURVEY_MIRROR_FULL_SYNC_HOURS * 3600)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="survey-mirror", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.maybe_sync()
+            except Exception as e:
+                self.counters["sync_errors"] += 1
+                log.warning("Survey mirror sync failed", extra={"error": str(e)})
+            time.sleep(SURVEY_MIRROR_SYNC_SECONDS / 2)
+
+    def stats(self) -> dict:
+        rows = self._conn().execute("SELECT COUNT(*) FROM records").fetchone()[0]
+        now = time.time()
+        last_sync = self._meta("last_sync_at")
+        last_full = self._meta("last_full_sync_at")
+        lookups = self.counters["hits"] + self.counters["misses"] + self.counters["stale"]
+        return {
+            **self.counters,
+            "hit_rate": round(self.counters["hits"] / lookups, 3) if lookups else None,
+            "rows": rows,
+            "sync_age_seconds": round(now - last_sync, 1) if last_sync else None,
+            "full_sync_age_seconds": round(now - last_full, 1) if last_full else None,
+            "max_staleness_seconds": self.max_staleness,
+        }
+
+
+_mirror = None
+_mirror_lock = threading.Lock()
+
+
+def get_mirror() -> SurveyMirror | None:
+    global _mirror
+    if not SURVEY_MIRROR_ENABLED:
+        return None
+    if _mirror is None:
+        with _mirror_lock:
+            if _mirror is None:
+                _mirror = SurveyMirror()
+    return _mirror
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Sync the local Survey Responses mirror")
+    parser.add_argument("--full", action="store_true", help="re-read the whole table")
+    parser.add_argument("--stats", action="store_true", help="print mirror stats and exit")
+    args = parser.parse_args(argv)
+
+    mirror = SurveyMirror()
+    if not args.stats:
+        result = mirror.sync(full=args.full)
+        if result is None:
+            print("Another process is syncing the mirror; try again shortly")
+            return 1
+        print(json.dumps(result))
+    print(json.dumps(mirror.stats(), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())